@@ -0,0 +1,38 @@
+""" Start the galaxy-exporter server
+"""
+
+import argparse
+import os
+from typing import List, Optional
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """ Serve galaxy-exporter with uvicorn
+
+    Args:
+        argv: Optional command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(prog='galaxy-exporter',
+                                     description='Prometheus exporter of Ansible Galaxy metrics')
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'),
+                        help='Address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 9654)),
+                        help='Port to listen on (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WORKERS', 1)),
+                        help='Number of worker processes (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    # Imported once the arguments are valid, keeping '--help' fast
+    # pylint: disable=import-outside-toplevel
+    import uvicorn  # type: ignore
+    if args.workers > 1:
+        # Worker processes import the application themselves
+        uvicorn.run('galaxy_exporter.galaxy_exporter:app', host=args.host, port=args.port,
+                    workers=args.workers)
+    else:
+        from galaxy_exporter.galaxy_exporter import app
+        uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,499 @@
+""" Caches and limiters of Ansible Galaxy data and calls. They are configured
+by their callers, which also provide the callbacks counting their activity
+"""
+
+from array import array
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+from fastapi.logger import logger as fastapi_logger
+
+if TYPE_CHECKING:
+    import sqlite3
+    from galaxy_exporter.galaxy_exporter import GalaxyData
+
+
+class SampleRing:
+    """Fixed size ring buffer of timestamped samples of Galaxy values, kept
+    in a flat 'array' of doubles. A sample recorded less than 'interval'
+    seconds after the one before the newest replaces the newest sample, so
+    the kept samples span at least ('size' - 2) * 'interval' seconds
+
+    Args:
+        fields (tuple): Names of the values of each sample
+        size (int): Maximum number of samples
+        interval (float): Minimum seconds between kept samples
+        coverage (float): Fraction of a rate's window the samples must span
+            before the rate is computed
+
+    Attributes:
+        fields (tuple): 'timestamp' followed by the names of the values of
+            each sample
+        size (int): Maximum number of samples
+        interval (float): Minimum seconds between kept samples
+        coverage (float): Fraction of a rate's window the samples must span
+            before the rate is computed
+        count (int): Number of samples kept so far, including samples the
+            buffer no longer holds
+    """
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, fields: tuple, size: int, interval: float, coverage: float) -> None:
+        self.fields = ('timestamp',) + tuple(fields)
+        self.size = max(2, size)
+        self.interval = interval
+        self.coverage = coverage
+        self.count = 0
+        self._offsets = {field: offset for offset, field in enumerate(self.fields)}
+        # Grows to 'size' samples, then the oldest samples are overwritten
+        self._samples = array('d')
+        # Maps windows to the sample their rate starts from, advanced as
+        # samples arrive
+        self._starts: Dict[float, int] = dict()
+
+    def __len__(self) -> int:
+        return min(self.count, self.size)
+
+    def value(self, index: int, field: str) -> float:
+        """ Value of a sample
+
+        Args:
+            index: Number of the sample, counting every sample kept so far
+            field: Name of the value
+
+        Returns:
+            float value
+        """
+        return self._samples[(index % self.size) * len(self.fields) + self._offsets[field]]
+
+    def append(self, timestamp: float, values) -> None:
+        """ Record a sample
+
+        Args:
+            timestamp: Epoch seconds of the sample, not older than the newest
+                sample
+            values: Iterable of floats, one per field after 'timestamp'
+        """
+        sample = array('d', (timestamp, *values))
+        if self.count >= 2 and timestamp - self.value(self.count - 2, 'timestamp') < \
+                self.interval:
+            index = self.count - 1
+        else:
+            index = self.count
+            self.count += 1
+        offset = (index % self.size) * len(self.fields)
+        if offset == len(self._samples):
+            self._samples.extend(sample)
+        else:
+            self._samples[offset:offset + len(self.fields)] = sample
+
+    def rate(self, field: str, window: float) -> Optional[float]:
+        """ Increase of a value over 'window' seconds, from the newest
+        sample back to the newest sample at least 'window' seconds older, or
+        the oldest sample, extrapolated to 'window' seconds
+
+        Args:
+            field: Name of the value
+            window: Seconds the rate is computed over
+
+        Returns:
+            float increase per 'window' seconds, None while the samples span
+            less than 'coverage' of 'window'
+        """
+        if len(self) < 2:
+            return None
+        newest = self.count - 1
+        start = max(self._starts.get(window, 0), self.count - len(self))
+        cutoff = self.value(newest, 'timestamp') - window
+        while start + 1 < newest and self.value(start + 1, 'timestamp') <= cutoff:
+            start += 1
+        self._starts[window] = start
+        elapsed = self.value(newest, 'timestamp') - self.value(start, 'timestamp')
+        if elapsed <= 0 or elapsed < window * self.coverage:
+            return None
+        return (self.value(newest, field) - self.value(start, field)) / elapsed * window
+
+
+class TargetCache:
+    """Least recently used cache of collection or role instances. Entries
+    beyond 'max_entries' and entries not requested for 'idle_seconds' are
+    evicted, releasing their data and Prometheus registries.
+
+    Args:
+        module (str): One of 'collection' or 'role'
+        max_entries (int): Maximum number of cached entries, 0 is unlimited
+        idle_seconds (int): Seconds an entry may go unrequested before it is
+            evicted, 0 disables idle expiry
+        on_evict (callable): Optional function called with the module and
+            the reason, 'lru' or 'idle', of each eviction
+
+    Attributes:
+        module (str): One of 'collection' or 'role'
+        max_entries (int): Maximum number of cached entries, 0 is unlimited
+        idle_seconds (int): Seconds an entry may go unrequested before it is
+            evicted, 0 disables idle expiry
+    """
+    def __init__(self, module: str, max_entries: int = 0, idle_seconds: int = 0,
+                 on_evict: Optional[Callable[[str, str], None]] = None) -> None:
+        self.module = module
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self._on_evict = on_evict
+        # Maps names to (instance, monotonic time of last request), least
+        # recently requested first
+        self._entries: OrderedDict = OrderedDict()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def __getitem__(self, name: str):
+        instance, _ = self._entries[name]
+        self._entries[name] = (instance, time.monotonic())
+        self._entries.move_to_end(name)
+        return instance
+
+    def __setitem__(self, name: str, instance) -> None:
+        self._entries[name] = (instance, time.monotonic())
+        self._entries.move_to_end(name)
+        while self.max_entries and len(self._entries) > self.max_entries:
+            self._evict('lru')
+
+    def __delitem__(self, name: str) -> None:
+        del self._entries[name]
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({list(self._entries)!r})'
+
+    def get(self, name: str, default=None):
+        """ Fetch a cached instance, marking it as recently requested. Idle
+        entries are evicted first
+
+        Args:
+            name: The name of a collection or role
+            default: Value returned when 'name' isn't cached
+
+        Returns:
+            The cached instance or 'default'
+        """
+        self.expire()
+        if name not in self._entries:
+            return default
+        return self[name]
+
+    def values(self) -> list:
+        """ Cached instances, without marking them as requested
+
+        Returns:
+            list of cached instances, least recently requested first
+        """
+        return [instance for instance, _ in self._entries.values()]
+
+    def expire(self) -> None:
+        """ Evict entries that haven't been requested for 'idle_seconds'
+        """
+        if not self.idle_seconds:
+            return
+        cutoff = time.monotonic() - self.idle_seconds
+        # Entries are ordered by last request, so idle entries are first
+        while self._entries and next(iter(self._entries.values()))[1] < cutoff:
+            self._evict('idle')
+
+    def retained_bytes(self) -> int:
+        """ Estimate the memory retained by cached data
+
+        Returns:
+            int estimated bytes retained by cached data
+        """
+        return sum(instance.data_size for instance, _ in self._entries.values())
+
+    def _evict(self, reason: str) -> None:
+        # Dropping the instance releases its data and Prometheus registry
+        name, _ = self._entries.popitem(last=False)
+        fastapi_logger.info('Evicting %s "%s" from cache (%s)', self.module, name, reason)
+        if self._on_evict is not None:
+            self._on_evict(self.module, reason)
+
+
+class RateLimitTimeout(Exception):
+    """ No Galaxy call may be made before the caller's deadline """
+
+
+class SharedCache:
+    """Galaxy data shared by the worker processes of a node through a SQLite
+    database in WAL mode. Workers adopt data another worker fetched, a lease
+    per collection or role ensures only one worker fetches it from Galaxy at
+    a time. Queries may wait while another worker writes, so callers run
+    them in an executor
+
+    Args:
+        path (str): Path of the SQLite database
+
+    Attributes:
+        path (str): Path of the SQLite database
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # Connections aren't shared with forked worker processes
+        self._connection: Optional['sqlite3.Connection'] = None
+        self._pid: Optional[int] = None
+
+    def connection(self) -> 'sqlite3.Connection':
+        """ Fetch this process's database connection, creating the database
+        when necessary
+
+        Returns:
+            'sqlite3.Connection' in autocommit mode
+        """
+        if self._connection is None or self._pid != os.getpid():
+            # Imported on first use, only needed with 'SHARED_CACHE_PATH'
+            import sqlite3  # pylint: disable=import-outside-toplevel,redefined-outer-name
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS targets (module TEXT, name TEXT, '
+                               'fetched REAL, digest TEXT, etag TEXT, last_modified TEXT, '
+                               'record TEXT, PRIMARY KEY (module, name))')
+            connection.execute('CREATE TABLE IF NOT EXISTS leases (module TEXT, name TEXT, '
+                               'owner INTEGER, expires REAL, PRIMARY KEY (module, name))')
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def acquire(self, module: str, name: str, seconds: float) -> bool:
+        """ Take the lease to fetch a collection or role from Galaxy, unless
+        another worker holds an unexpired lease
+
+        Args:
+            module: One of 'collection' or 'role'
+            name: The name of the collection or role
+            seconds: Seconds until the lease expires
+
+        Returns:
+            bool: Was the lease taken
+        """
+        now = time.time()
+        cursor = self.connection().execute(
+            'INSERT INTO leases (module, name, owner, expires) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (module, name) DO UPDATE SET owner = excluded.owner, '
+            'expires = excluded.expires WHERE leases.expires < ? OR leases.owner = excluded.owner',
+            (module, name, os.getpid(), now + seconds, now))
+        return cursor.rowcount == 1
+
+    def release(self, module: str, name: str) -> None:
+        """ Release this worker's lease of a collection or role
+
+        Args:
+            module: One of 'collection' or 'role'
+            name: The name of the collection or role
+        """
+        self.connection().execute('DELETE FROM leases WHERE module = ? AND name = ? AND owner = ?',
+                                  (module, name, os.getpid()))
+
+    def store(self, instance: 'GalaxyData') -> None:
+        """ Share the data of a collection or role with the other workers
+
+        Args:
+            instance: 'Collection' or 'Role' instance, unshared while it has
+                no data
+        """
+        if instance.last_update is None or instance.data is None:
+            return
+        self.connection().execute(
+            'INSERT OR REPLACE INTO targets VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (instance.labels['category'], instance.name, instance.last_update.timestamp(),
+             instance.digest, instance.etag, instance.last_modified,
+             json.dumps(instance.data.to_dict())))
+
+    def lookup(self, module: str, name: str) -> Optional[tuple]:
+        """ Read the shared data of a collection or role
+
+        Args:
+            module: One of 'collection' or 'role'
+            name: The name of the collection or role
+
+        Returns:
+            tuple of the fetch time, digest, etag, last modified date and
+            json record, None when no worker shared the collection or role
+        """
+        return self.connection().execute(
+            'SELECT fetched, digest, etag, last_modified, record FROM targets '
+            'WHERE module = ? AND name = ?', (module, name)).fetchone()
+
+    @staticmethod
+    def apply(instance: 'GalaxyData', row: Optional[tuple], cache_seconds: float) -> bool:
+        """ Replace the data of a collection or role with shared data another
+        worker fetched more recently, within 'cache_seconds'
+
+        Args:
+            instance: 'Collection' or 'Role' instance
+            row: Shared data returned by 'lookup'
+            cache_seconds: Maximum allowed age of data cache
+
+        Returns:
+            bool: Was newer data adopted
+        """
+        if row is None or instance.record_class is None:
+            return False
+        fetched, digest, etag, last_modified, record = row
+        if instance.last_update is not None and fetched <= instance.last_update.timestamp():
+            return False
+        if time.time() - fetched > cache_seconds:
+            return False
+        instance.data = instance.record_class.from_dict(json.loads(record))
+        instance.digest = digest
+        instance.etag = etag
+        instance.last_modified = last_modified
+        instance.failure = None
+        instance.last_update = datetime.fromtimestamp(fetched)
+        instance.record_sample()
+        return True
+
+
+class RateLimiter:
+    """Token bucket limiting the rate and concurrency of Galaxy calls. Calls
+    throttled by Galaxy pause all calls for the 'Retry-After' period and halve
+    the rate, which recovers gradually as calls succeed.
+
+    Args:
+        rate (float): Calls per second, 0 is unlimited
+        burst (int): Maximum number of calls saved up while idle
+        concurrency (int): Maximum number of calls in flight, 0 is unlimited
+        on_wait (callable): Optional function called with the seconds each
+            call waited for a token and a free slot
+
+    Attributes:
+        rate (float): Configured calls per second, 0 is unlimited
+        burst (int): Maximum number of calls saved up while idle
+        concurrency (int): Maximum number of calls in flight, 0 is unlimited
+        current_rate (float): Calls per second after adapting to throttling
+        blocked_until (float): Monotonic time before which no call is made
+        waiting (int): Number of calls waiting for a token or a free slot
+    """
+    # pylint: disable=too-many-instance-attributes
+    # Lowest fraction of the configured rate throttling reduces the rate to
+    min_rate_fraction = 0.05
+
+    def __init__(self, rate: float, burst: int, concurrency: int,
+                 on_wait: Optional[Callable[[float], None]] = None) -> None:
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.concurrency = concurrency
+        self.current_rate = rate
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        # asyncio semaphores are bound to the event loop they are used in
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._on_wait = on_wait
+
+    def reserve(self) -> float:
+        """ Take a token, going into debt when none are left
+
+        Returns:
+            float seconds to wait before the token may be used
+        """
+        now = time.monotonic()
+        wait = max(0.0, self.blocked_until - now)
+        if self.current_rate > 0:
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._updated) * self.current_rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.current_rate)
+        return wait
+
+    def release(self) -> None:
+        """ Return a reserved token that wasn't used """
+        if self.current_rate > 0:
+            self._tokens += 1
+
+    def semaphore(self) -> Optional[asyncio.Semaphore]:
+        """ Fetch the semaphore limiting concurrency in the running event loop
+
+        Returns:
+            'asyncio.Semaphore', None when concurrency is unlimited
+        """
+        if self.concurrency <= 0:
+            return None
+        loop = asyncio.get_event_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None):
+        """ Wait for a token and a free slot, holding the slot while the
+        context is active
+
+        Args:
+            timeout: Optional maximum seconds to wait for a token and a slot
+
+        Raises:
+            RateLimitTimeout: When the token or a slot isn't available within
+            'timeout'
+        """
+        wait = self.reserve()
+        if timeout is not None and wait > timeout:
+            self.release()
+            raise RateLimitTimeout(f'Galaxy calls are limited for {wait:.1f} seconds')
+        semaphore = self.semaphore()
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if semaphore is not None:
+                if timeout is None or not semaphore.locked():
+                    await semaphore.acquire()
+                else:
+                    remaining = max(0.0, timeout - (time.monotonic() - started))
+                    try:
+                        await asyncio.wait_for(semaphore.acquire(), remaining)
+                    except asyncio.TimeoutError:
+                        raise RateLimitTimeout(f'All {self.concurrency} Galaxy call slots '
+                                               f'are busy') from None
+        except BaseException:
+            # The call won't be made, its token is returned
+            self.release()
+            raise
+        finally:
+            self.waiting -= 1
+            if self._on_wait is not None:
+                self._on_wait(time.monotonic() - started)
+        try:
+            yield
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    def throttle(self, retry_after: float) -> None:
+        """ Pause calls for 'retry_after' seconds and halve the rate
+
+        Args:
+            retry_after: Seconds Galaxy asked to wait before the next call
+        """
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        if self.rate > 0:
+            self.current_rate = max(self.rate * self.min_rate_fraction, self.current_rate / 2)
+
+    def success(self) -> None:
+        """ Recover the rate gradually after throttling """
+        if self.current_rate < self.rate:
+            self.current_rate = min(self.rate,
+                                    self.current_rate + self.rate * self.min_rate_fraction)
@@ -1,150 +1,584 @@
 """ Gather role statistics from Ansible Galaxy
 """
 
-# pylint: disable=R0201
+# pylint: disable=R0201,C0302
 
 import asyncio
-from datetime import datetime
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import functools
+import hashlib
+import io
 import json
+import math
 import os
+import random
 import re
-from typing import Dict, Optional
+import struct
+import sys
+import time
+from types import ModuleType
+from urllib.parse import urlencode
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Type, TypeVar, Union
 
 import aiohttp
-from dateutil.parser import parse as dateparse
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.logger import logger as fastapi_logger
-from fastapi.responses import HTMLResponse, PlainTextResponse
-from prometheus_client import CollectorRegistry  # type: ignore
-from prometheus_client import Counter, Gauge, Info
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge  # type: ignore
+from prometheus_client import Histogram, Info  # type: ignore
+from prometheus_client import multiprocess  # type: ignore
+from prometheus_client.metrics_core import CounterMetricFamily, GaugeMetricFamily  # type: ignore
+from prometheus_client.metrics_core import InfoMetricFamily  # type: ignore
 from prometheus_client.exposition import generate_latest  # type: ignore
-from tenacity import AsyncRetrying, RetryError, stop_after_delay
+from prometheus_client.exposition import choose_encoder  # type: ignore
 
 from galaxy_exporter import __version__
+from galaxy_exporter.cache import RateLimiter, RateLimitTimeout, SampleRing, SharedCache
+from galaxy_exporter.cache import TargetCache
+
+# Optional faster json decoding
+orjson: Optional[ModuleType]
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None
 
 if 'CACHE_SECONDS' in os.environ:
     CACHE_SECONDS = int(os.environ['CACHE_SECONDS'])
 else:
     CACHE_SECONDS = 15
 
+# Base URL of the Ansible Galaxy API
+GALAXY_URL = str(os.environ.get('GALAXY_URL', 'https://galaxy.ansible.com')).rstrip('/')
+
+# Serve expired cache data immediately while refreshing it in the background
+STALE_WHILE_REVALIDATE = str(os.environ.get('STALE_WHILE_REVALIDATE', '')).lower() in \
+    ('1', 'true', 'yes')
+
+# Shared HTTP connection pool settings
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+HTTP_DNS_CACHE_SECONDS = int(os.environ.get('HTTP_DNS_CACHE_SECONDS', 300))
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get('HTTP_KEEPALIVE_SECONDS', 60))
+HTTP_POOL_LIMIT = int(os.environ.get('HTTP_POOL_LIMIT', 100))
+HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get('HTTP_POOL_LIMIT_PER_HOST', 20))
+
+# Extract values from Galaxy responses while parsing, without decoding the
+# complete response. Requires the 'ijson' module
+JSON_STREAMING = str(os.environ.get('JSON_STREAMING', '')).lower() in ('1', 'true', 'yes')
+
+# Path of the cache snapshot written periodically and on shutdown, and loaded
+# on startup. Snapshots are disabled when unset
+SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH', '')
+SNAPSHOT_INTERVAL = int(os.environ.get('SNAPSHOT_INTERVAL', 300))
+# Format of snapshot files, snapshots in other formats are ignored
+SNAPSHOT_VERSION = 1
+
+# Path of a YAML or JSON file listing collections, namespaces and roles
+# fetched on startup, and the maximum number fetched at once and of random
+# seconds between fetches
+TARGETS_FILE = os.environ.get('TARGETS_FILE', '')
+PREFETCH_CONCURRENCY = int(os.environ.get('PREFETCH_CONCURRENCY', 4))
+PREFETCH_SPACING_SECONDS = float(os.environ.get('PREFETCH_SPACING_SECONDS', 0.5))
+
+# Maximum number of roles and collections fetched at once by batch probes
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 10))
+
+# Seconds the list of roles and collections of a namespace is cached, and
+# the number of roles and collections listed per Galaxy page
+NAMESPACE_CACHE_SECONDS = int(os.environ.get('NAMESPACE_CACHE_SECONDS', 3600))
+NAMESPACE_PAGE_SIZE = int(os.environ.get('NAMESPACE_PAGE_SIZE', 100))
+
+# Number of samples of Galaxy values kept per collection and role to compute
+# download rates, and the minimum seconds between kept samples
+RATE_SAMPLES = int(os.environ.get('RATE_SAMPLES', 145))
+RATE_SAMPLE_SECONDS = float(os.environ.get('RATE_SAMPLE_SECONDS', 600))
+# Fraction of a download rate's window the samples must span before the rate
+# is exported, shorter spans are too noisy to extrapolate from
+RATE_MIN_COVERAGE = float(os.environ.get('RATE_MIN_COVERAGE', 0.5))
+
+# Maximum number of cached roles and of cached collections, 0 is unlimited
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+# Seconds a cached role or collection may go unrequested before it is
+# dropped, 0 disables idle expiry
+CACHE_IDLE_SECONDS = int(os.environ.get('CACHE_IDLE_SECONDS', 86400))
+
+# Maximum rate of Galaxy calls per second and the number of calls that may be
+# saved up while idle, a rate of 0 is unlimited
+UPSTREAM_RATE_LIMIT = float(os.environ.get('UPSTREAM_RATE_LIMIT', 10))
+UPSTREAM_BURST = int(os.environ.get('UPSTREAM_BURST', 10))
+# Maximum number of Galaxy calls in flight, 0 is unlimited
+UPSTREAM_CONCURRENCY = int(os.environ.get('UPSTREAM_CONCURRENCY', 10))
+
+# Seconds a Galaxy fetch, including retries, may take and seconds a single
+# attempt may take
+UPSTREAM_DEADLINE_SECONDS = float(os.environ.get('UPSTREAM_DEADLINE_SECONDS', 5))
+UPSTREAM_ATTEMPT_TIMEOUT = float(os.environ.get('UPSTREAM_ATTEMPT_TIMEOUT', 3))
+# Initial and maximum seconds of the randomized exponential backoff between
+# attempts
+UPSTREAM_BACKOFF_SECONDS = float(os.environ.get('UPSTREAM_BACKOFF_SECONDS', 0.1))
+UPSTREAM_BACKOFF_MAX_SECONDS = float(os.environ.get('UPSTREAM_BACKOFF_MAX_SECONDS', 2))
+# Galaxy response statuses worth retrying, other error statuses are final
+RETRYABLE_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+
+# Seconds a collection or role Galaxy doesn't know, or that couldn't be
+# fetched, is answered with an error without asking Galaxy again
+NOT_FOUND_CACHE_SECONDS = int(os.environ.get('NOT_FOUND_CACHE_SECONDS', 300))
+FAILED_CACHE_SECONDS = int(os.environ.get('FAILED_CACHE_SECONDS', 30))
+# Seconds data may be served after refreshing it from Galaxy failed, 0 is
+# unlimited
+MAX_STALENESS_SECONDS = int(os.environ.get('MAX_STALENESS_SECONDS', 86400))
+
+# zlib compression level of gzip compressed metrics responses
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+
+# Path of a SQLite database sharing Galaxy data between the worker processes
+# of a node, the cache isn't shared when unset
+SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH', '')
+
+# prometheus_client aggregates metrics of all worker processes when its
+# multiprocess directory is set
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR') or
+                    os.environ.get('prometheus_multiproc_dir'))
+
 app = FastAPI()
 
+# Format of metrics responses: the function generating the exposition, its
+# content type and whether it is gzip compressed
+Encoding = namedtuple('Encoding', ['encoder', 'content_type', 'compress'])
+# Uncompressed Prometheus text format, used when the client has no preference
+TEXT_ENCODING = Encoding(*choose_encoder(''), False)
+# OpenMetrics expositions end with this line
+OPENMETRICS_EOF = b'# EOF\n'
+
+# Gzip header, raw deflate data ending in a sync flush, CRC32 and length of
+# the start of a compressed response, completed by 'gzip_finish'
+GzipPrefix = namedtuple('GzipPrefix', ['body', 'crc', 'size'])
+# Gzip header without file name or modification time
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+# Status, body and headers of an Ansible Galaxy response
+FetchResult = namedtuple('FetchResult', ['status', 'body', 'headers'])
+
+# Histogram buckets of operations taking microseconds to milliseconds
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                0.1)
+
+# Definition of a collection or role Prometheus metric. Live metrics change on
+# every scrape, so they are never cached
+MetricSpec = namedtuple('MetricSpec', ['name', 'documentation', 'kind', 'live'],
+                        defaults=['gauge', False])
+
+# Download rate metrics and the seconds they are computed over
+RATE_WINDOWS = dict(downloads_per_hour=3600, downloads_per_day=86400)
+
+
+class UpstreamStatusError(Exception):
+    """ Galaxy answered with a retryable error status
+
+    Args:
+        status (int): HTTP status of the response
+    """
+    def __init__(self, status: int) -> None:
+        super().__init__(f'Ansible Galaxy returned HTTP status {status}')
+        self.status = status
+
+
+class UpstreamThrottled(UpstreamStatusError):
+    """ Galaxy answered '429 Too Many Requests' """
+
+
+class NegativeCacheCollector:
+    """Prometheus collector listing negatively cached collections and roles
+    """
+    # pylint: disable=too-few-public-methods
+    def collect(self) -> List[GaugeMetricFamily]:
+        """ Generate the negatively cached collections and roles
+
+        Returns:
+            List containing a 'GaugeMetricFamily'
+        """
+        family = GaugeMetricFamily(
+            'ansible_galaxy_exporter_negative_cache_seconds',
+            'Seconds until a collection or role that was not found or failed is fetched again',
+            labels=['module', 'target', 'reason'])
+        for cache in (COLLECTIONS, ROLES):
+            for instance in cache.values():
+                remaining = instance.negative_cache_remaining()
+                if remaining:
+                    family.add_metric([cache.module, instance.name, instance.failure], remaining)
+        return [family]
+
+
+def count_eviction(module: str, reason: str) -> None:
+    """ Count a collection or role evicted from a 'TargetCache'
+
+    Args:
+        module: One of 'collection', 'namespace' or 'role'
+        reason: Why the entry was evicted, 'lru' or 'idle'
+    """
+    update_base_metrics()['cache_evictions'].labels(module=module, reason=reason).inc()
+
+
+def count_upstream_wait(seconds: float) -> None:
+    """ Count the seconds a Galaxy call waited for the 'RateLimiter'
+
+    Args:
+        seconds: Seconds the call waited
+    """
+    update_base_metrics()['upstream_wait_seconds'].inc(seconds)
+
+
 # Variables used for caching results
 METRICS = dict()
-ROLES = dict()
-COLLECTIONS = dict()
-
-# Root Collection HTML page
-COLLECTION_HTML = """<html>
-    <head>
-        <title>Ansible Galaxy collection {collection_name} statistics index</title>
-    </head>
-    <body>
-        <p>
-            <a href="/collection/{collection_name}/metrics">Prometheus Metrics for {collection_name}</a>
-        </p>
-        <p>
-            Simple metrics for {collection_name}
-            <ul>
-                <li>Raw <a href="/collection/{collection_name}/community_score">Community score </a> count</li>
-                <li>Raw <a href="/collection/{collection_name}/community_surveys">Community surveys</a> count</li>
-                <li>Raw <a href="/collection/{collection_name}/created">Created </a> epoch format datetime</li>
-                <li>Raw <a href="/collection/{collection_name}/dependencies">Dependencies </a> count</li>
-                <li>Raw <a href="/collection/{collection_name}/downloads">Download </a> count</li>
-                <li>Raw <a href="/collection/{collection_name}/modified">Modified </a> epoch format datetime</li>
-                <li>Raw <a href="/collection/{collection_name}/quality_score">Quality score </a> count</li>
-                <li>Raw <a href="/collection/{collection_name}/version">Version </a> current version</li>
-                <li>Raw <a href="/collection/{collection_name}/versions">Versions </a> count</li>
-            </ul>
-        </p>
-    </body>
-</html>
-"""
-# Root Role HTML page
-ROLE_HTML = """<html>
-    <head>
-        <title>Ansible Galaxy role {role_name} statistics index</title>
-    </head>
-    <body>
-        <p>
-            <a href="/role/{role_name}/metrics">Prometheus Metrics for {role_name}</a>
-        </p>
-        <p>
-            Simple metrics for {role_name}
-            <ul>
-                <li>Raw <a href="/role/{role_name}/community_score">Community score </a> count</li>
-                <li>Raw <a href="/role/{role_name}/community_surveys">Community surveys</a> count</li>
-                <li>Raw <a href="/role/{role_name}/created">Created </a> epoch format datetime</li>
-                <li>Raw <a href="/role/{role_name}/downloads">Download </a> count</li>
-                <li>Raw <a href="/role/{role_name}/forks">Forks </a> count</li>
-                <li>Raw <a href="/role/{role_name}/imported">Imported </a> epoch format datetime</li>
-                <li>Raw <a href="/role/{role_name}/modified">Modified </a> epoch format datetime</li>
-                <li>Raw <a href="/role/{role_name}/open_issues">Open Issues </a> count</li>
-                <li>Raw <a href="/role/{role_name}/quality_score">Quality score </a> count</li>
-                <li>Raw <a href="/role/{role_name}/stars">Star </a> count</li>
-                <li>Raw <a href="/role/{role_name}/version">Version </a> current version</li>
-                <li>Raw <a href="/role/{role_name}/versions">Versions </a> count</li>
-                <li>Raw <a href="/role/{role_name}/watchers">Watcher </a> count</li>
-            </ul>
-        </p>
-    </body>
-</html>
-"""
+ROLES = TargetCache('role', CACHE_MAX_ENTRIES, CACHE_IDLE_SECONDS, on_evict=count_eviction)
+COLLECTIONS = TargetCache('collection', CACHE_MAX_ENTRIES, CACHE_IDLE_SECONDS,
+                          on_evict=count_eviction)
+NAMESPACES = TargetCache('namespace', CACHE_MAX_ENTRIES, CACHE_IDLE_SECONDS,
+                         on_evict=count_eviction)
+# Shared aiohttp session, its connector and the event loop it is bound to
+HTTP_SESSION = dict()
+# Limits the rate and concurrency of all Galaxy calls
+RATE_LIMITER = RateLimiter(UPSTREAM_RATE_LIMIT, UPSTREAM_BURST, UPSTREAM_CONCURRENCY,
+                           on_wait=count_upstream_wait)
+# Galaxy data shared by the worker processes of a node
+SHARED_CACHE = SharedCache(SHARED_CACHE_PATH) if SHARED_CACHE_PATH else None
+# Gauges and the functions providing their values in multiprocess mode
+GAUGE_FUNCTIONS = list()
+# In-flight Galaxy lookups, keyed by module and target name
+INFLIGHT = dict()
+# Long running background tasks, keyed by name
+BACKGROUND_TASKS = dict()
 
 RE_SAFE = re.compile('[-.]')
-ROOT_HTML = f"""<html>
-    <head>
-        <title>Ansible Galaxy Exporter v{__version__} statistics index</title>
-    </head>
-    <body>
-        <h1>Usage</h1>
-        <p>
-            <a href="/metrics">Prometheus exporter process metrics</a>
-        </p>
-        <p>
-        All role and collection names must be in the format for AUTHOR.ROLE or AUTHOR.COLLECTION
-        </p>
-        <p>
-            Go to /role/ROLE_NAME/metrics for Prometheus Metrics
-        </p>
-        <p>
-            For simple metrics, go to:
-            <ul>
-                <li>/role/ROLE_NAME/community_score for a raw community score count</li>
-                <li>/role/ROLE_NAME/community_surveys for a raw community survey count</li>
-                <li>/role/ROLE_NAME/created for a raw created datetime in epoch format</li>
-                <li>/role/ROLE_NAME/downloads for a raw download count</li>
-                <li>/role/ROLE_NAME/forks for a raw forks count</li>
-                <li>/role/ROLE_NAME/imported for a raw imported datetime in epoch format</li>
-                <li>/role/ROLE_NAME/modified for a raw modified datetime in epoch format</li>
-                <li>/role/ROLE_NAME/open_issues for a raw open issues count</li>
-                <li>/role/ROLE_NAME/quality_score for a raw quality score count</li>
-                <li>/role/ROLE_NAME/stars for a raw stars count</li>
-                <li>/role/ROLE_NAME/version for a raw version number</li>
-                <li>/role/ROLE_NAME/versions for a raw version count</li>
-                <li>/role/ROLE_NAME/watchers for a raw watcher count</li>
-            </ul>
-        </p>
-        <p>
-            Go to /role/COLLECTION_NAME/metrics for Prometheus Metrics
-        </p>
-        <p>
-            For simple metrics, go to:
-            <ul>
-                <li>/role/COLLECTION_NAME/community_score for a raw community score count</li>
-                <li>/role/COLLECTION_NAME/community_surveys for a raw community survey count</li>
-                <li>/role/COLLECTION_NAME/created for a raw created datetime in epoch format</li>
-                <li>/role/COLLECTION_NAME/dependencies for a raw dependency count</li>
-                <li>/role/COLLECTION_NAME/downloads for a raw download count</li>
-                <li>/role/COLLECTION_NAME/modified for a raw modified datetime in epoch format</li>
-                <li>/role/COLLECTION_NAME/quality_score for a raw quality score count</li>
-                <li>/role/COLLECTION_NAME/version for a raw version number</li>
-                <li>/role/COLLECTION_NAME/versions for a raw version count</li>
-            </ul>
-        </p>
-    </body>
-</html>
-"""
+# Namespaces are named with letters, digits, underscores and hyphens
+RE_NAMESPACE = re.compile(r'[\w-]+')
+
+# Type of the records created by 'GalaxyRecord' class methods
+Record = TypeVar('Record', bound='GalaxyRecord')
+
+
+def __getattr__(name: str):
+    """ Provide the HTML pages, which are imported when first used
+
+    Args:
+        name: Name of a module attribute
+
+    Returns:
+        The HTML page named 'name'
+    """
+    if name in ('COLLECTION_HTML', 'ROLE_HTML', 'ROOT_HTML'):
+        from galaxy_exporter import pages  # pylint: disable=import-outside-toplevel
+        return getattr(pages, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def parse_epoch(value: str) -> int:
+    """ Convert an Ansible Galaxy timestamp to epoch seconds. ISO-8601
+    timestamps are parsed with the standard library, other formats fall back
+    to dateutil. Timestamps without a timezone are treated as UTC
+
+    Args:
+        value: Timestamp string, ie: '2020-06-27T20:21:34.467988Z'
+
+    Returns:
+        int epoch seconds
+
+    Raises:
+        TypeError: When 'value' isn't a string
+    """
+    if not isinstance(value, str):
+        raise TypeError(f'Timestamp {value!r} is not a string')
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        # Imported on demand, as it is rarely needed and slow to import
+        from dateutil.parser import parse as dateparse  # pylint: disable=import-outside-toplevel
+        parsed = dateparse(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+class GalaxyRecord:
+    """Base class for compact records of the Ansible Galaxy values used by
+    metrics. Records are extracted from Galaxy's json data when it arrives so
+    the json data itself can be dropped
+
+    Args:
+        **values: Record values, keyed by the names in '__slots__'
+    """
+    __slots__: tuple = ()
+    # Record values holding timestamps, converted to epoch seconds
+    timestamp_fields: tuple = ()
+    # Maps record values to their dotted json path and how the value at that
+    # path is read: 'value', 'count' of items or 'first' item value
+    stream_fields: Dict[str, tuple] = dict()
+
+    def __init__(self, **values) -> None:
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        values = ', '.join(f'{name}={value!r}' for name, value in self.to_dict().items())
+        return f'{self.__class__.__name__}({values})'
+
+    def to_dict(self) -> dict:
+        """ Record values
+
+        Returns:
+            dict mapping the names in '__slots__' to their values
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls: Type[Record], values: dict) -> Record:
+        """ Create a record from values returned by 'to_dict'
+
+        Args:
+            values: dict mapping every name in '__slots__' to its value
+
+        Raises:
+            KeyError: A value is missing
+            TypeError: 'values' isn't a dict or has unknown names
+
+        Returns:
+            Record instance
+        """
+        if not isinstance(values, dict):
+            raise TypeError(f'{cls.__name__} values must be a dict')
+        missing = set(cls.__slots__) - set(values)
+        if missing:
+            raise KeyError(', '.join(sorted(missing)))
+        unknown = set(values) - set(cls.__slots__)
+        if unknown:
+            raise TypeError(f'Unknown {cls.__name__} values {", ".join(sorted(unknown))}')
+        return cls(**values)
+
+    @classmethod
+    def from_data(cls: Type[Record], data: dict) -> Record:
+        """ Placeholder to be overridden by inheriting classes
+        """
+        # pylint: disable=unused-argument
+        return cls()
+
+    @classmethod
+    def from_values(cls: Type[Record], **values) -> Record:
+        """ Create a record from values read from Galaxy's json data,
+        converting timestamps to epoch seconds
+
+        Args:
+            **values: Record values, keyed by the names in '__slots__'
+
+        Returns:
+            Record instance
+        """
+        for name in cls.timestamp_fields:
+            values[name] = parse_epoch(values[name])
+        return cls(**values)
+
+    @classmethod
+    def stream_paths(cls) -> tuple:
+        """ Index 'stream_fields' by json path
+
+        Returns:
+            tuple of a dict mapping json paths to lists of (name, mode)
+            tuples, and a dict mapping names to the paths of the objects and
+            arrays their value is read from
+        """
+        paths: Dict[str, list] = dict()
+        required: Dict[str, list] = dict()
+        for name, (path, mode) in cls.stream_fields.items():
+            parts = path.split('.')
+            if mode == 'value':
+                paths.setdefault(path, []).append((name, mode))
+                parts.pop()
+            elif mode == 'count':
+                paths.setdefault(f'{path}.item', []).append((name, mode))
+                paths.setdefault(path, []).append((name, 'count_keys'))
+            else:
+                paths.setdefault(f'{path}.item', []).append((path, 'item'))
+                paths.setdefault(f'{path}.item.{mode}', []).append((name, 'first'))
+            required[name] = ['.'.join(parts[:depth]) for depth in range(1, len(parts) + 1)]
+        return paths, required
+
+    @classmethod
+    def from_stream(cls: Type[Record], body: bytes) -> Record:
+        """ Create a record while parsing Galaxy's json response, only the
+        values in 'stream_fields' are decoded and arrays are counted without
+        being built. Missing values raise the same errors as 'from_data'
+
+        Args:
+            body: Galaxy's json response
+
+        Returns:
+            Record instance
+
+        Raises:
+            KeyError: When a value or an object containing it is missing
+            IndexError: When the array a first item value is read from is
+                empty
+            TypeError: When an object containing a value, a counted value or
+                the array a first item value is read from has another type
+            ValueError: When 'body' isn't valid json
+        """
+        paths, required = cls.stream_paths()
+        values: Dict[str, Any] = {name: 0 for name, (_, mode) in cls.stream_fields.items()
+                                  if mode == 'count'}
+        # First event of each object and array values are read from, and the
+        # arrays first item values are read from that have items
+        containers: Dict[str, Optional[str]] = {
+            container: None for names_containers in required.values()
+            for container in names_containers}
+        filled = set()
+        for prefix, event, value in parse_stream(body):
+            if prefix in containers and containers[prefix] is None:
+                containers[prefix] = event
+            for name, mode in paths.get(prefix, ()):
+                if mode == 'count':
+                    if event not in ('end_map', 'end_array', 'map_key'):
+                        values[name] += 1
+                elif mode == 'count_keys':
+                    if event == 'map_key':
+                        values[name] += 1
+                elif mode == 'item':
+                    filled.add(name)
+                elif event not in ('start_map', 'start_array', 'end_map', 'end_array',
+                                   'map_key') and (mode == 'value' or name not in values):
+                    values[name] = value
+        cls.check_stream(values, required, containers, filled)
+        return cls.from_values(**values)
+
+    @classmethod
+    def check_stream(cls, values: dict, required: dict, containers: dict, filled: set) -> None:
+        """ Check that every value was found while streaming, raising the
+        error 'from_data' raises for the first missing value
+
+        Args:
+            values: Values found, keyed by the names in 'stream_fields'
+            required: Maps names to the paths of the objects and arrays their
+                value is read from
+            containers: Maps the paths of objects and arrays to their first
+                json event, None when missing
+            filled: Paths of the arrays first item values are read from that
+                have items
+        """
+        for name, (path, mode) in cls.stream_fields.items():
+            for container in required[name]:
+                if containers[container] is None:
+                    raise KeyError(container)
+                # Values are counted and first items read from arrays or
+                # objects, other values from objects
+                allowed = ('start_map', 'start_array') if container == path else ('start_map',)
+                if containers[container] not in allowed:
+                    raise TypeError(f'Unexpected {containers[container]} at {container}')
+            if name not in values:
+                if mode == 'value':
+                    raise KeyError(path)
+                if path not in filled:
+                    raise IndexError(path)
+                raise KeyError(f'{path}.item.{mode}')
+
+
+class CollectionRecord(GalaxyRecord):
+    """Values of an Ansible Galaxy collection used by metrics, timestamps
+    are stored as epoch seconds
+    """
+    __slots__ = ('community_score', 'community_surveys', 'created', 'dependencies',
+                 'downloads', 'modified', 'quality_score', 'version', 'versions')
+    timestamp_fields = ('created', 'modified')
+    stream_fields = dict(
+        community_score=('community_score', 'value'),
+        community_surveys=('community_survey_count', 'value'),
+        created=('created', 'value'),
+        dependencies=('latest_version.metadata.dependencies', 'count'),
+        downloads=('download_count', 'value'),
+        modified=('modified', 'value'),
+        quality_score=('latest_version.quality_score', 'value'),
+        version=('latest_version.version', 'value'),
+        versions=('all_versions', 'count'),
+    )
+
+    @classmethod
+    def from_data(cls, data: dict) -> 'CollectionRecord':
+        """ Extract a record from Galaxy's collection json data
+
+        Args:
+            data: Decoded json data of a collection
+
+        Returns:
+            'CollectionRecord' instance
+        """
+        latest_version = data['latest_version']
+        return cls.from_values(
+            community_score=data['community_score'],
+            community_surveys=data['community_survey_count'],
+            created=data['created'],
+            dependencies=len(latest_version['metadata']['dependencies']),
+            downloads=data['download_count'],
+            modified=data['modified'],
+            quality_score=latest_version['quality_score'],
+            version=latest_version['version'],
+            versions=len(data['all_versions']),
+        )
+
+
+class RoleRecord(GalaxyRecord):
+    """Values of an Ansible Galaxy role used by metrics, timestamps are
+    stored as epoch seconds
+    """
+    __slots__ = ('community_score', 'community_surveys', 'created', 'downloads', 'forks',
+                 'imported', 'modified', 'open_issues', 'quality_score', 'stars', 'version',
+                 'versions', 'watchers')
+    timestamp_fields = ('created', 'imported', 'modified')
+    stream_fields = dict(
+        community_score=('data.repository.community_score', 'value'),
+        community_surveys=('data.repository.community_survey_count', 'value'),
+        created=('data.repository.created', 'value'),
+        downloads=('data.repository.download_count', 'value'),
+        forks=('data.repository.forks_count', 'value'),
+        imported=('data.repository.summary_fields.latest_import.finished', 'value'),
+        modified=('data.repository.modified', 'value'),
+        open_issues=('data.repository.open_issues_count', 'value'),
+        quality_score=('data.repository.quality_score', 'value'),
+        stars=('data.repository.stargazers_count', 'value'),
+        version=('data.repository.summary_fields.versions', 'version'),
+        versions=('data.repository.summary_fields.versions', 'count'),
+        watchers=('data.repository.watchers_count', 'value'),
+    )
+
+    @classmethod
+    def from_data(cls, data: dict) -> 'RoleRecord':
+        """ Extract a record from Galaxy's role repository json data
+
+        Args:
+            data: Decoded json data of a role's repository
+
+        Returns:
+            'RoleRecord' instance
+        """
+        summary_fields = data['summary_fields']
+        return cls.from_values(
+            community_score=data['community_score'],
+            community_surveys=data['community_survey_count'],
+            created=data['created'],
+            downloads=data['download_count'],
+            forks=data['forks_count'],
+            imported=summary_fields['latest_import']['finished'],
+            modified=data['modified'],
+            open_issues=data['open_issues_count'],
+            quality_score=data['quality_score'],
+            stars=data['stargazers_count'],
+            version=summary_fields['versions'][0]['version'],
+            versions=len(summary_fields['versions']),
+            watchers=data['watchers_count'],
+        )
 
 
 class GalaxyData:
@@ -156,63 +590,249 @@ class GalaxyData:
     Attributes:
         name (str): Full name of collection or role.
         labels (dict): Mappings of Prometheus label names to label values
-        registry (prometheus_client.CollectorRegistry): Instance of Prometheus
-            client 'CollectorRegistry' for storing metrics
-        data (dict): Raw json data from Ansible Galaxy regarding collection or role
-        metrics (dict): Maps str names of Prometheus metrics to Prometheus client
-            metric instances
+        data (GalaxyRecord): Values from Ansible Galaxy regarding collection or
+            role. Json data assigned to 'data' is reduced to a 'record_class'
+            record
+        metrics (dict): Maps str names of Prometheus metrics to 'MetricSpec'
+            definitions, shared by all instances of a class
+        values (dict): Maps str names of Prometheus metrics to their current
+            values, None until metrics are set
         last_update (datetime): Datetime of last time Galaxy data was fetched
+        next_refresh (datetime): Earliest refresh of expired data loaded
+            from a snapshot, None refreshes once data expires
+        data_size (int): Estimated bytes of memory used by 'data'
+        digest (str): Hash of the Galaxy response 'data' was decoded from
+        expositions (dict): Maps content types to cached uncompressed bytes
+            of metrics without live metrics, empty when metrics must be
+            rendered again
+        gzip_expositions (dict): Maps content types to the cached
+            'GzipPrefix' of metrics without live metrics, empty when metrics
+            must be rendered again
+        metrics_digest (str): 'digest' of the data 'values' were last set
+            from
+        etag (str): 'ETag' validator of the last Galaxy response
+        last_modified (str): 'Last-Modified' validator of the last Galaxy
+            response
+        failure (str): Outcome of the last failed fetch, 'not_found' or
+            'failed', None when the last fetch succeeded
+        failure_time (float): Monotonic time of the last failed fetch
+        refresh_failures (int): Number of failed refreshes
+        samples (SampleRing): Recent samples of the 'sample_fields' values
+        rates (dict): Maps 'RATE_WINDOWS' metric names to download rates,
+            updated whenever a sample is recorded
     """
+    # pylint: disable=too-many-instance-attributes,too-many-public-methods
+    # Record values sampled to compute rates
+    sample_fields: tuple = ('downloads',)
+    # Metric definitions of each class, set up by its first instance
+    _metrics: Dict[str, MetricSpec] = dict()
+
     def __init__(self, name: str) -> None:
         self.name = name
         if not hasattr(self, 'labels'):
             self.labels: Dict[str, str] = dict()
-        self.registry = CollectorRegistry()
-        self.metrics = self._setup_metrics()
-        self.data: Dict[str, str] = dict()
-        self.last_update = None
+        # Metric definitions are identical for every instance of a class
+        if '_metrics' not in type(self).__dict__:
+            type(self)._metrics = self._setup_metrics()
+        self.metrics = type(self)._metrics
+        self.values: Optional[dict] = None
+        self._data = None
+        self.data_size = 0
+        self.digest: Optional[str] = None
+        self.expositions: Dict[str, bytes] = dict()
+        self.gzip_expositions: Dict[str, GzipPrefix] = dict()
+        self.metrics_digest: Optional[str] = None
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.failure: Optional[str] = None
+        self.failure_time = 0.0
+        self.refresh_failures = 0
+        self.samples = SampleRing(self.sample_fields, RATE_SAMPLES, RATE_SAMPLE_SECONDS,
+                                  RATE_MIN_COVERAGE)
+        self.rates: Dict[str, Optional[float]] = dict.fromkeys(RATE_WINDOWS)
+        self.last_update: Optional[datetime] = None
+        self.next_refresh: Optional[datetime] = None
+
+    # Class of the records json data is reduced to, None keeps json data
+    record_class: Optional[Type[GalaxyRecord]] = None
+
+    @property
+    def data(self):
+        """ Values from Ansible Galaxy regarding collection or role
+
+        Returns:
+            'record_class' record, None when no data is available
+        """
+        return self._data
+
+    @data.setter
+    def data(self, value) -> None:
+        if isinstance(value, dict) and self.record_class is not None:
+            value = self.record_class.from_data(value)
+        self._data = value
+        self.data_size = deep_sizeof(value)
 
     def _setup_metrics(self):
         """ Placeholder to be overridden by inheriting classes
         """
         return dict()
 
+    def record_sample(self, timestamp: Optional[float] = None) -> None:
+        """ Record the current data in 'samples' and update the download
+        rates
+
+        Args:
+            timestamp: Epoch seconds the data was fetched at, defaults to
+                'last_update'
+        """
+        if self.data is None:
+            return
+        if timestamp is None:
+            if self.last_update is None:
+                return
+            timestamp = self.last_update.timestamp()
+        self.samples.append(timestamp,
+                            [float(getattr(self.data, field) or 0)
+                             for field in self.sample_fields])
+        for key, seconds in RATE_WINDOWS.items():
+            self.rates[key] = self.samples.rate('downloads', seconds)
+
     def url(self) -> Optional[str]:
         """ Placeholder to be overridden by inheriting classes
         """
         return None
 
+    def set_metrics(self) -> None:
+        """ Placeholder to be overridden by inheriting classes
+        """
+
+    @property
+    def registry(self) -> 'GalaxyCollector':
+        """ Prometheus collector of this instance's metrics, usable wherever
+        a 'prometheus_client.CollectorRegistry' is expected
+
+        Returns:
+            'GalaxyCollector' of this instance
+        """
+        return GalaxyCollector([self])
+
+    def sync_metrics(self) -> None:
+        """ Set Prometheus metric values from this instance's data, unless
+        they were already set from identical Galaxy data
+        """
+        if self.digest is None or self.metrics_digest != self.digest:
+            with update_base_metrics()['set_metrics_seconds'].time():
+                self.set_metrics()
+            self.metrics_digest = self.digest
+            self.expositions = dict()
+            self.gzip_expositions = dict()
+
+    @property
+    def exposition(self) -> Optional[bytes]:
+        """ Cached uncompressed metrics in Prometheus' text format, without
+        live metrics
+
+        Returns:
+            bytes of metrics, None when metrics must be rendered again
+        """
+        return self.expositions.get(TEXT_ENCODING.content_type)
+
+    def render(self, encoding: Optional['Encoding'] = None) -> bytes:
+        """ Render this instance's metrics in Prometheus' exposition format.
+        The rendered metrics are cached per format and compression until
+        Galaxy returns different data
+
+        Args:
+            encoding: Optional 'Encoding' of the metrics, defaults to
+            uncompressed Prometheus text format
+
+        Returns:
+            bytes of metrics in the requested format
+        """
+        if encoding is None:
+            encoding = TEXT_ENCODING
+        self.sync_metrics()
+        with update_base_metrics()['render_seconds'].time():
+            # Live metrics change independently of Galaxy data and are never
+            # cached
+            live = encode(GalaxyCollector([self], live=True), encoding)
+            if encoding.compress:
+                prefix = self.gzip_expositions.get(encoding.content_type)
+                if prefix is None:
+                    prefix = gzip_start(encode(GalaxyCollector([self], live=False), encoding,
+                                               final=False))
+                    self.gzip_expositions[encoding.content_type] = prefix
+                return gzip_finish(prefix, live)
+            exposition = self.expositions.get(encoding.content_type)
+            if exposition is None:
+                exposition = encode(GalaxyCollector([self], live=False), encoding, final=False)
+                self.expositions[encoding.content_type] = exposition
+            return exposition + live
+
     def _setup_generic_metrics(self, metric_prefix: str) -> dict:
         return dict(
-            created=Gauge(f'{metric_prefix}created',
-                          'Created datetime in epoch format',
-                          self.labels.keys(), registry=self.registry),
-            community_score=Gauge(f'{metric_prefix}community_score',
-                                  'Community score',
-                                  self.labels.keys(), registry=self.registry),
-            community_survey=Gauge(f'{metric_prefix}community_surveys',
-                                   'Community surveys',
-                                   self.labels.keys(), registry=self.registry),
-            download=Gauge(f'{metric_prefix}downloads', 'Download count',
-                           self.labels.keys(), registry=self.registry),
-            modified=Gauge(f'{metric_prefix}modified',
-                           'Modified datetime in epoch format',
-                           self.labels.keys(), registry=self.registry),
-            quality_score=Gauge(f'{metric_prefix}quality_score', 'Quality score',
-                                self.labels.keys(), registry=self.registry),
-            version=Info(f'{metric_prefix}version', 'Current release version',
-                         self.labels.keys(), registry=self.registry),
-            versions=Gauge(f'{metric_prefix}versions', 'Version count',
-                           self.labels.keys(), registry=self.registry),
+            created=MetricSpec(f'{metric_prefix}created',
+                               'Created datetime in epoch format'),
+            community_score=MetricSpec(f'{metric_prefix}community_score',
+                                       'Community score'),
+            community_survey=MetricSpec(f'{metric_prefix}community_surveys',
+                                        'Community surveys'),
+            download=MetricSpec(f'{metric_prefix}downloads', 'Download count'),
+            modified=MetricSpec(f'{metric_prefix}modified',
+                                'Modified datetime in epoch format'),
+            quality_score=MetricSpec(f'{metric_prefix}quality_score', 'Quality score'),
+            version=MetricSpec(f'{metric_prefix}version', 'Current release version',
+                               kind='info'),
+            versions=MetricSpec(f'{metric_prefix}versions', 'Version count'),
+        )
+
+    def _setup_live_metrics(self, metric_prefix: str) -> dict:
+        return dict(
+            data_age=MetricSpec(f'{metric_prefix}data_age_seconds',
+                                'Seconds since data was fetched from Ansible Galaxy',
+                                live=True),
+            last_success=MetricSpec(f'{metric_prefix}last_success_timestamp',
+                                    'Last time data was fetched from Ansible Galaxy '
+                                    'in epoch format', live=True),
+            refresh_failures=MetricSpec(f'{metric_prefix}refresh_failures',
+                                        'Failed refreshes of data from Ansible Galaxy',
+                                        kind='counter', live=True),
+            downloads_per_hour=MetricSpec(f'{metric_prefix}downloads_per_hour',
+                                          'Downloads per hour, extrapolated from the '
+                                          'samples of up to the last hour', live=True),
+            downloads_per_day=MetricSpec(f'{metric_prefix}downloads_per_day',
+                                         'Downloads per day, extrapolated from the '
+                                         'samples of up to the last day', live=True),
         )
 
+    def live_value(self, key: str) -> Optional[float]:
+        """ Current value of a live metric
+
+        Args:
+            key: Key of the live metric in 'metrics'
+
+        Returns:
+            float value, None when the metric isn't exported
+        """
+        if key == 'data_age':
+            # Data only ages beyond 'CACHE_SECONDS' when stale data is served
+            return self.data_age() if STALE_WHILE_REVALIDATE else None
+        if key == 'last_success':
+            return self.last_update.timestamp() if self.last_update is not None else 0.0
+        if key == 'refresh_failures':
+            return float(self.refresh_failures)
+        if key in self.rates:
+            # Not exported until two samples are recorded
+            return self.rates[key]
+        return None
+
     def metric__community_score(self) -> str:
         """ Metric representing the community score of this software
 
         Returns:
             str float representing the community score of this software
         """
-        score = self.data['community_score']
+        score = self.data.community_score
         if score is None:
             return '0'
         return str(score)
@@ -223,7 +843,7 @@ class GalaxyData:
         Returns:
             str integer representing the software's community survey count
         """
-        return str(self.data['community_survey_count'])
+        return str(self.data.community_surveys)
 
     def metric__created(self) -> str:
         """ Metric representing the epoch time this software was created
@@ -231,7 +851,7 @@ class GalaxyData:
         Returns:
             str integer representing the epoch time software was created
         """
-        return str(dateparse(self.data['created']).strftime('%s'))
+        return str(self.data.created)
 
     def metric__downloads(self) -> str:
         """ Metric representing this software's download count
@@ -239,7 +859,7 @@ class GalaxyData:
         Returns:
             str integer representing the software's download count
         """
-        return str(self.data['download_count'])
+        return str(self.data.downloads)
 
     def metric__modified(self) -> str:
         """ Metric representing the epoch time this software was last modified
@@ -247,26 +867,138 @@ class GalaxyData:
         Returns:
             str integer representing the epoch time software was last modified
         """
-        return str(dateparse(self.data['modified']).strftime('%s'))
+        return str(self.data.modified)
 
     async def update(self):
-        """ Fetch and cache latest data from Galaxy
+        """ Fetch and cache latest data from Galaxy. When data is cached,
+        Galaxy is asked to only send data that has changed since
 
         Returns:
-            str of json data from Galaxy
+            Data decoded from Galaxy's json response, ready to be stored in
+            the 'data' attribute. The current data when it hasn't changed
         """
         fastapi_logger.info('Fetching %s "%s" metadata',
                             self.__class__.__name__, self.name)
-        # Ensure no two lookups occur at the same time
-        async with asyncio.Lock():
-            text = await fetch_from_url(self.url(), self.__class__.__name__,
-                                        self.name)
-            if text is None:
-                return None
-            jdata = json.loads(text)
+        headers = dict()
+        if self.data is not None:
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+        metrics = update_base_metrics(increment=True)
+        with metrics['upstream_latency'].time():
+            result = await fetch_from_url(self.url(), self.__class__.__name__,
+                                          self.name, headers=headers)
+        if result is None:
+            return self.fail('failed')
+        module = self.labels['category']
+        metrics['upstream_responses'].labels(module=module, status=str(result.status)).inc()
+        metrics['upstream_bytes'].labels(module=module).inc(transferred_bytes(result))
+        if result.status == 304 and self.data is not None:
+            self.failure = None
+            self.last_update = datetime.now()
+            return self.data
+        if result.status != 200:
+            fastapi_logger.error('Ansible Galaxy returned HTTP status %s for %s "%s"',
+                                 result.status, self.__class__.__name__, self.name)
+            return self.fail('not_found' if result.status in (404, 410) else 'failed')
+        try:
+            with metrics['decode_seconds'].time():
+                data = self.decode(result.body)
+        except (KeyError, IndexError, TypeError):
+            fastapi_logger.error('Ansible Galaxy has no data for %s "%s"',
+                                 self.__class__.__name__, self.name)
+            return self.fail('not_found')
+        except ValueError:
+            fastapi_logger.exception('Invalid Ansible Galaxy response for %s "%s"',
+                                     self.__class__.__name__, self.name)
+            return self.fail('failed')
+        self.failure = None
+        self.digest = hashlib.sha256(result.body).hexdigest()
+        self.etag = result.headers.get('ETag')
+        self.last_modified = result.headers.get('Last-Modified')
         self.last_update = datetime.now()
+        return data
+
+    def fail(self, failure: str) -> None:
+        """ Record a failed fetch, negatively caching this instance
+
+        Args:
+            failure: One of 'not_found' or 'failed'
+        """
+        self.failure = failure
+        self.failure_time = time.monotonic()
+
+    def failure_remaining(self) -> float:
+        """ Seconds until Galaxy is asked again after a failed fetch
+
+        Returns:
+            float seconds, 0 when the last fetch didn't fail
+        """
+        if self.failure is None:
+            return 0
+        ttl = NOT_FOUND_CACHE_SECONDS if self.failure == 'not_found' else FAILED_CACHE_SECONDS
+        return max(0.0, self.failure_time + ttl - time.monotonic())
+
+    def negative_cache_remaining(self) -> float:
+        """ Seconds this instance remains negatively cached after a failed
+        fetch, during which requests fail without asking Galaxy again
+
+        Returns:
+            float seconds, 0 when the last fetch didn't fail or usable data
+            from an earlier fetch is available
+        """
+        if self.is_usable():
+            return 0
+        return self.failure_remaining()
+
+    def is_usable(self) -> bool:
+        """ Check if this instance has data that may be served, data that
+        couldn't be refreshed for 'MAX_STALENESS_SECONDS' isn't
+
+        Returns:
+            bool: Is data available and not too stale
+        """
+        if self.data is None:
+            return False
+        return not MAX_STALENESS_SECONDS or self.data_age() <= MAX_STALENESS_SECONDS
+
+    def decode(self, body: bytes):
+        """ Decode Galaxy's json response. When 'JSON_STREAMING' is enabled
+        and 'ijson' is installed, only the values used by metrics are decoded
+
+        Args:
+            body: Galaxy's json response
+
+        Returns:
+            Data to store in the 'data' attribute
+        """
+        if JSON_STREAMING and self.record_class is not None and ijson_installed():
+            return self.record_class.from_stream(body)
+        return self.extract(decode_json(body))
+
+    def extract(self, jdata):
+        """ Select the data used by metrics from Galaxy's json response
+
+        Args:
+            jdata: Decoded json data from Galaxy
+
+        Returns:
+            The data to store in the 'data' attribute
+        """
         return jdata
 
+    async def refresh(self) -> None:
+        """ Fetch latest data from Galaxy and store it on this instance. When
+        fetching fails the last successfully fetched data is kept
+        """
+        data = await self.update()
+        if data is None:
+            self.refresh_failures += 1
+            return
+        self.data = data
+        self.record_sample()
+
     def needs_update(self, cache_seconds: int = CACHE_SECONDS) -> bool:
         """ Check if instance's data cache is out of date
 
@@ -278,10 +1010,23 @@ class GalaxyData:
         """
         if self.last_update is None:
             return True
-        if (datetime.now() - self.last_update).seconds > cache_seconds:
+        if self.next_refresh is not None and datetime.now() < self.next_refresh:
+            return False
+        if self.data_age() > cache_seconds:
             return True
         return False
 
+    def data_age(self) -> float:
+        """ Age of instance's data cache
+
+        Returns:
+            float seconds since data was last fetched from Galaxy, 0 when data
+            has never been fetched
+        """
+        if self.last_update is None:
+            return 0
+        return (datetime.now() - self.last_update).total_seconds()
+
 
 class Collection(GalaxyData):
     """Ansible Galaxy Collection data
@@ -292,13 +1037,17 @@ class Collection(GalaxyData):
     Attributes:
         name (str): Full name of collection or role.
         labels (dict): Mappings of Prometheus label names to label values
-        registry (prometheus_client.CollectorRegistry): Instance of Prometheus
-            client 'CollectorRegistry' for storing metrics
-        data (dict): Raw json data from Ansible Galaxy regarding collection or role
-        metrics (dict): Maps str names of Prometheus metrics to Prometheus client
-            metric instances
+        data (GalaxyRecord): Values from Ansible Galaxy regarding collection or
+            role. Json data assigned to 'data' is reduced to a 'record_class'
+            record
+        metrics (dict): Maps str names of Prometheus metrics to 'MetricSpec'
+            definitions, shared by all instances of a class
+        values (dict): Maps str names of Prometheus metrics to their current
+            values, None until metrics are set
         last_update (datetime): Datetime of last time Galaxy data was fetched
     """
+    record_class = CollectionRecord
+
     def __init__(self, name: str) -> None:
         self.maintainer, self.collection = name.split('.', 2)
         self.labels = dict(category='collection', maintainer=self.maintainer,
@@ -311,7 +1060,7 @@ class Collection(GalaxyData):
         Returns:
             str integer of the collection's number of dependencies
         """
-        return str(len(self.data['latest_version']['metadata']['dependencies']))
+        return str(self.data.dependencies)
 
     def metric__quality_score(self):
         """ Metric representing this collection's quality score number
@@ -319,18 +1068,23 @@ class Collection(GalaxyData):
         Returns:
             str float of the collection's quality score number
         """
-        score = self.data['latest_version']['quality_score']
+        score = self.data.quality_score
         if score is None:
             return '0'
         return str(score)
 
+    def set_metrics(self) -> None:
+        """ Set Prometheus metrics from this collection's data
+        """
+        set_collection_metrics(self)
+
     def url(self) -> str:
         """ URL of API data for this collection
 
         Returns:
             str URL for fetching API data
         """
-        return 'https://galaxy.ansible.com/api/internal/ui/collections/' \
+        return f'{GALAXY_URL}/api/internal/ui/collections/' \
             f'{self.maintainer}/{self.collection}/?format=json'
 
     def metric__version(self):
@@ -339,7 +1093,7 @@ class Collection(GalaxyData):
         Returns:
             str of the collection's current version
         """
-        return self.data['latest_version']['version']
+        return self.data.version
 
     def metric__versions(self) -> str:
         """ Metric representing this collection's total number of releases
@@ -348,25 +1102,25 @@ class Collection(GalaxyData):
         Returns:
             str integer representing the number of releases
         """
-        return str(len(self.data['all_versions']))
+        return str(self.data.versions)
 
     def _setup_metrics(self) -> dict:
         """ Configures Prometheus metrics for this collection.
-        Metrics should only be setup when this class is initialized. Metrics
-        are stored in the 'metrics' class attribute and can be updated over
-        time
+        Metrics are only setup when the first instance of this class is
+        initialized and are shared by all instances through the 'metrics'
+        attribute, metric values are stored in the 'values' attribute
 
         Returns:
-            Dict containing Prometheus metrics for this collection
+            Dict containing Prometheus metric definitions for collections
         """
         metric_prefix = 'ansible_galaxy_collection_'
         metrics = self._setup_generic_metrics(metric_prefix)
         metrics.update(
             dict(
-                dependency=Gauge(f'{metric_prefix}dependencies', 'Dependency count',
-                                 self.labels.keys(), registry=self.registry),
+                dependency=MetricSpec(f'{metric_prefix}dependencies', 'Dependency count'),
             )
         )
+        metrics.update(self._setup_live_metrics(metric_prefix))
         return metrics
 
 
@@ -379,55 +1133,73 @@ class Role(GalaxyData):
     Attributes:
         name (str): Full name of collection or role.
         labels (dict): Mappings of Prometheus label names to label values
-        registry (prometheus_client.CollectorRegistry): Instance of Prometheus
-            client 'CollectorRegistry' for storing metrics
-        data (dict): Raw json data from Ansible Galaxy regarding collection or role
-        metrics (dict): Maps str names of Prometheus metrics to Prometheus client
-            metric instances
+        data (GalaxyRecord): Values from Ansible Galaxy regarding collection or
+            role. Json data assigned to 'data' is reduced to a 'record_class'
+            record
+        metrics (dict): Maps str names of Prometheus metrics to 'MetricSpec'
+            definitions, shared by all instances of a class
+        values (dict): Maps str names of Prometheus metrics to their current
+            values, None until metrics are set
         last_update (datetime): Datetime of last time Galaxy data was fetched
     """
+    record_class = RoleRecord
+    sample_fields = ('downloads', 'stars')
+
     def __init__(self, name: str) -> None:
         self.maintainer, self.role = name.split('.', 2)
         self.labels = dict(category='role', maintainer=self.maintainer,
                            project=self.role)
         super().__init__(name)
 
+    def extract(self, jdata):
+        """ Select the repository data used by metrics from Galaxy's json
+        response
+
+        Args:
+            jdata: Decoded json data from Galaxy
+
+        Returns:
+            dict of role repository data
+        """
+        return jdata['data']['repository']
+
+    def set_metrics(self) -> None:
+        """ Set Prometheus metrics from this role's data
+        """
+        set_role_metrics(self)
+
     def url(self) -> str:
         """ URL of API data for this role
 
         Returns:
             str URL for fetching API data
         """
-        return 'https://galaxy.ansible.com/api/internal/ui/' \
+        return f'{GALAXY_URL}/api/internal/ui/' \
             'repo-or-collection-detail/?format=json&namespace=' \
             f'{self.maintainer}&name={self.role}'
 
     def _setup_metrics(self) -> dict:
         """ Configures Prometheus metrics for this role.
-        Metrics should only be setup when this class is initialized. Metrics
-        are stored in the 'metrics' class attribute and can be updated over
-        time
+        Metrics are only setup when the first instance of this class is
+        initialized and are shared by all instances through the 'metrics'
+        attribute, metric values are stored in the 'values' attribute
 
         Returns:
-            Dict containing Prometheus metrics for this role
+            Dict containing Prometheus metric definitions for roles
         """
         metric_prefix = 'ansible_galaxy_role_'
         metrics = self._setup_generic_metrics(metric_prefix)
         metrics.update(
             dict(
-                fork=Gauge(f'{metric_prefix}forks', 'Fork count',
-                           self.labels.keys(), registry=self.registry),
-                imported=Gauge(f'{metric_prefix}imported',
-                               'Imported datetime in epoch format',
-                               self.labels.keys(), registry=self.registry),
-                open_issue=Gauge(f'{metric_prefix}open_issues', 'Open Issues count',
-                                 self.labels.keys(), registry=self.registry),
-                star=Gauge(f'{metric_prefix}stars', 'Stars count',
-                           self.labels.keys(), registry=self.registry),
-                watchers=Gauge(f'{metric_prefix}watchers', 'Watcher count',
-                               self.labels.keys(), registry=self.registry),
+                fork=MetricSpec(f'{metric_prefix}forks', 'Fork count'),
+                imported=MetricSpec(f'{metric_prefix}imported',
+                                    'Imported datetime in epoch format'),
+                open_issue=MetricSpec(f'{metric_prefix}open_issues', 'Open Issues count'),
+                star=MetricSpec(f'{metric_prefix}stars', 'Stars count'),
+                watchers=MetricSpec(f'{metric_prefix}watchers', 'Watcher count'),
             )
         )
+        metrics.update(self._setup_live_metrics(metric_prefix))
         return metrics
 
     def metric__quality_score(self) -> str:
@@ -436,7 +1208,7 @@ class Role(GalaxyData):
         Returns:
             str float representing the Ansible Galaxy score
         """
-        score = self.data['quality_score']
+        score = self.data.quality_score
         if score is None:
             return '0'
         return str(score)
@@ -447,7 +1219,7 @@ class Role(GalaxyData):
         Returns:
             str integer representing the total number of Github forks
         """
-        return str(self.data['forks_count'])
+        return str(self.data.forks)
 
     def metric__imported(self):
         """ Metric representing the epoch time this role was last imported into
@@ -457,8 +1229,7 @@ class Role(GalaxyData):
             str integer representing the epoch time of last Ansible Galaxy
             import
         """
-        imported = dateparse(self.data['summary_fields']['latest_import']['finished'])
-        return str(imported.strftime('%s'))
+        return str(self.data.imported)
 
     def metric__open_issues(self) -> str:
         """ Metric representing the total number of Github open issues for this
@@ -467,7 +1238,7 @@ class Role(GalaxyData):
         Returns:
             str integer representing the total number of Github open issues
         """
-        return str(self.data['open_issues_count'])
+        return str(self.data.open_issues)
 
     def metric__stars(self) -> str:
         """ Metric representing the total number of Github stars for this role
@@ -475,7 +1246,7 @@ class Role(GalaxyData):
         Returns:
             str integer representing the total number of Github stars
         """
-        return str(self.data['stargazers_count'])
+        return str(self.data.stars)
 
     def metric__watchers(self) -> str:
         """ Metric representing the total Ansible Galaxy watchers for this role
@@ -483,7 +1254,7 @@ class Role(GalaxyData):
         Returns:
             str integer representing the total number Ansible Galaxy watchers
         """
-        return str(self.data['watchers_count'])
+        return str(self.data.watchers)
 
     def metric__version(self):
         """ Metric representing this role's current version
@@ -491,7 +1262,7 @@ class Role(GalaxyData):
         Returns:
             str of the role's current version
         """
-        return self.data['summary_fields']['versions'][0]['version']
+        return self.data.version
 
     def metric__versions(self):
         """ Metric representing this role's total number of releases (versions)
@@ -499,120 +1270,1057 @@ class Role(GalaxyData):
         Returns:
             str integer representing the number of releases
         """
-        return str(len(self.data['summary_fields']['versions']))
+        return str(self.data.versions)
 
 
-async def fetch_from_url(url: str, job: str, instance: str, retries: int = 5) -> Optional[str]:
-    """ Fetch content from specified URL
-    URL will be retried up to 'retries' times
+class Namespace:
+    """Ansible Galaxy namespace, listing the roles and collections it
+    publishes. Galaxy lists them in pages, the pages after the first are
+    fetched concurrently
 
     Args:
-        url: str URL to fetch
-        job: Class name or other description of download type, used when
-        logging
-        instance: Specific software instance being downloaded, used when
-        logging
-        retries: int specifying the number of times to retry URL
+        name (str): The name of a namespace, ie: 'mesaguy'
 
-    Returns:
-        The supplied 'Collection' class instance
+    Attributes:
+        name (str): The name of a namespace, ie: 'mesaguy'
+        collections (list): Names of the namespace's collections, in
+            author.project format
+        roles (list): Names of the namespace's roles, in author.project format
+        failure (str): 'not_found' when Galaxy doesn't know the namespace,
+            'failed' when the last listing couldn't be fetched, otherwise None
+        last_update (datetime): Datetime of last time the listing was fetched
     """
-    count = 0
-    try:
-        async for attempt in AsyncRetrying(stop=stop_after_delay(retries)):
-            with attempt:
-                count += 1
-                if count > 1:
-                    fastapi_logger.info('Fetching %s "%s" metadata (try %s)',
-                                        job, instance, count)
-                # Create HTTP session
-                async with aiohttp.ClientSession() as session:
-                    # Fetch latest JSON from Ansible Galaxy API
-                    async with session.get(url) as response:
-                        # Cache latest JSON
-                        return await response.text()
-    except RetryError:
-        fastapi_logger.exception('Error fetching %s "%s" URL %s', job,
-                                 instance, url)
-    return None
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.collections: List[str] = list()
+        self.roles: List[str] = list()
+        self.failure: Optional[str] = None
+        self.failure_time = 0.0
+        self.last_update: Optional[datetime] = None
 
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.name!r})'
 
-def set_collection_metrics(collection: Collection) -> Collection:
-    """ Set Prometheus metrics on the supplied 'Collection' instance based on
-    metrics defined within the 'Collection' instance
+    def url(self, page: int) -> str:
+        """ URL of a page of this namespace's roles and collections
 
-    Args:
-        collection: 'Collection' class instance
+        Args:
+            page: Number of the page, starting at 1
 
-    Returns:
-        The supplied 'Collection' class instance
-    """
-    collection.metrics['community_score'].labels(**collection.labels)\
-        .set(collection.metric__community_score())
-    collection.metrics['community_survey'].labels(**collection.labels)\
-        .set(collection.metric__community_surveys())
-    collection.metrics['created'].labels(**collection.labels).set(collection.metric__created())
-    collection.metrics['dependency'].labels(**collection.labels)\
-        .set(collection.metric__dependencies())
-    collection.metrics['download'].labels(**collection.labels).set(collection.metric__downloads())
-    collection.metrics['modified'].labels(**collection.labels).set(collection.metric__modified())
-    collection.metrics['quality_score'].labels(**collection.labels)\
-        .set(collection.metric__quality_score())
-    collection.metrics['version'].labels(**collection.labels)\
-        .info({'version': collection.metric__version()})
-    collection.metrics['versions'].labels(**collection.labels).set(collection.metric__versions())
-    return collection
+        Returns:
+            str URL for fetching API data
+        """
+        query = urlencode(dict(format='json', namespace=self.name, page=page,
+                               page_size=NAMESPACE_PAGE_SIZE))
+        return f'{GALAXY_URL}/api/internal/ui/repo-or-collection/?{query}'
 
+    def needs_update(self, cache_seconds: int = NAMESPACE_CACHE_SECONDS) -> bool:
+        """ Check if the listing is out of date
 
-def set_role_metrics(role: Role) -> Role:
-    """ Set Prometheus metrics on the supplied 'Role' instance based on metrics
-    defined within the 'Role' instance
+        Args:
+            cache_seconds: Maximum allowed age of the listing
 
-    Args:
-        role: 'Role' class instance
+        Returns:
+            bool: Is the listing sufficiently old that an update is required
+        """
+        if self.last_update is None:
+            return True
+        return (datetime.now() - self.last_update).total_seconds() > cache_seconds
 
-    Returns:
-        The supplied 'Role' class instance
-    """
-    role.metrics['community_score'].labels(**role.labels).set(role.metric__community_score())
-    role.metrics['community_survey'].labels(**role.labels).set(role.metric__community_surveys())
-    role.metrics['created'].labels(**role.labels).set(role.metric__created())
-    role.metrics['download'].labels(**role.labels).set(role.metric__downloads())
-    role.metrics['fork'].labels(**role.labels).set(role.metric__forks())
-    role.metrics['imported'].labels(**role.labels).set(role.metric__imported())
-    role.metrics['modified'].labels(**role.labels).set(role.metric__modified())
-    role.metrics['open_issue'].labels(**role.labels).set(role.metric__open_issues())
-    role.metrics['quality_score'].labels(**role.labels).set(role.metric__quality_score())
-    role.metrics['star'].labels(**role.labels).set(role.metric__stars())
-    role.metrics['version'].labels(**role.labels).info({'version': role.metric__version()})
-    role.metrics['versions'].labels(**role.labels).set(role.metric__versions())
-    role.metrics['watchers'].labels(**role.labels).set(role.metric__watchers())
-    return role
+    def fail(self, failure: str) -> None:
+        """ Record a failed listing, Galaxy isn't asked again until
+        'NOT_FOUND_CACHE_SECONDS' or 'FAILED_CACHE_SECONDS' pass
 
+        Args:
+            failure: One of 'not_found' or 'failed'
+        """
+        self.failure = failure
+        self.failure_time = time.monotonic()
 
-@app.get("/", response_class=HTMLResponse)
-async def root() -> str:
-    """ Generate root HTML page
+    def failure_remaining(self) -> float:
+        """ Seconds until Galaxy is asked again after a failed listing
 
-    Returns:
-        str HTML base index page
-    """
-    return ROOT_HTML
+        Returns:
+            float seconds, 0 when the last listing didn't fail
+        """
+        if self.failure is None:
+            return 0
+        ttl = NOT_FOUND_CACHE_SECONDS if self.failure == 'not_found' else FAILED_CACHE_SECONDS
+        return max(0.0, self.failure_time + ttl - time.monotonic())
 
+    def is_usable(self) -> bool:
+        """ Whether this namespace's roles and collections have been listed
 
-@app.get("/metrics", response_class=PlainTextResponse)
-async def process_metrics() -> str:
-    """ Fetch this exporter's own Prometheus metrics
+        Returns:
+            bool: True once a listing was fetched
+        """
+        return self.last_update is not None
 
-    Returns:
-        str in Prometheus' exporter format of this exporters metrics
-    """
-    update_base_metrics()
-    return generate_latest()
+    async def fetch_page(self, page: int) -> dict:
+        """ Fetch a page of this namespace's roles and collections
 
+        Args:
+            page: Number of the page, starting at 1
 
-@app.get('/collection/{collection_name}', response_class=HTMLResponse)
-async def collection_base(collection_name: str) -> str:
+        Returns:
+            dict mapping 'collection' and 'repository' to the count and
+            results of the page
+
+        Raises:
+            LookupError: When Galaxy doesn't know the namespace
+            RuntimeError: When the page couldn't be fetched or decoded
+        """
+        update_base_metrics(increment=True)
+        result = await fetch_from_url(self.url(page), self.__class__.__name__, self.name)
+        if result is None:
+            raise RuntimeError(f'Unable to fetch page {page}')
+        update_base_metrics()['upstream_responses'].labels(
+            module='namespace', status=str(result.status)).inc()
+        if result.status in (404, 410):
+            raise LookupError(self.name)
+        if result.status != 200:
+            raise RuntimeError(f'Page {page} returned HTTP status {result.status}')
+        try:
+            jdata = decode_json(result.body)
+            return {kind: dict(count=int(jdata[kind]['count']),
+                               results=[item['name'] for item in jdata[kind]['results']])
+                    for kind in ('collection', 'repository')}
+        except (KeyError, TypeError, ValueError) as error:
+            raise RuntimeError(f'Unable to decode page {page}') from error
+
+    async def refresh(self) -> None:
+        """ List this namespace's roles and collections. When listing fails,
+        the previous listing is kept
+        """
+        try:
+            first = await self.fetch_page(1)
+            count = max(first['collection']['count'], first['repository']['count'])
+            pages = [first] + list(await asyncio.gather(
+                *[self.fetch_page(page) for page in
+                  range(2, math.ceil(count / NAMESPACE_PAGE_SIZE) + 1)]))
+        except LookupError:
+            fastapi_logger.error('Ansible Galaxy doesn\'t know namespace "%s"', self.name)
+            self.fail('not_found')
+            return
+        except RuntimeError:
+            fastapi_logger.exception('Unable to list namespace "%s"', self.name)
+            self.fail('failed')
+            return
+        self.collections = [f'{self.name}.{name}' for page in pages
+                            for name in page['collection']['results']]
+        self.roles = [f'{self.name}.{name}' for page in pages
+                      for name in page['repository']['results']]
+        self.failure = None
+        self.last_update = datetime.now()
+
+
+def encode(collector, encoding: Encoding, final: bool = True) -> bytes:
+    """ Generate the uncompressed exposition of a collector's metrics
+
+    Args:
+        collector: Prometheus collector or registry
+        encoding: 'Encoding' of the exposition
+        final: Whether the exposition ends the response, otherwise the
+            OpenMetrics end marker is left out so more metrics can follow
+
+    Returns:
+        bytes of the encoded metrics
+    """
+    content = encoding.encoder(collector)
+    if not final and content.endswith(OPENMETRICS_EOF):
+        content = content[:-len(OPENMETRICS_EOF)]
+    return content
+
+
+def gzip_start(content: bytes) -> GzipPrefix:
+    """ Compress the start of a gzip response. The deflate stream ends in a
+    sync flush, so further data compressed independently can follow it
+
+    Args:
+        content: bytes starting the response
+
+    Returns:
+        'GzipPrefix' to complete with 'gzip_finish'
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = GZIP_HEADER + compressor.compress(content) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return GzipPrefix(body, zlib.crc32(content), len(content))
+
+
+def gzip_finish(prefix: GzipPrefix, content: bytes) -> bytes:
+    """ Complete a gzip response started by 'gzip_start'
+
+    Args:
+        prefix: 'GzipPrefix' of the start of the response
+        content: bytes ending the response
+
+    Returns:
+        bytes of a single member gzip file of both parts
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc = zlib.crc32(content, prefix.crc)
+    size = (prefix.size + len(content)) & 0xffffffff
+    return prefix.body + compressor.compress(content) + compressor.flush() + \
+        struct.pack('<II', crc, size)
+
+
+def gzip_accepted(accept_encoding: str) -> bool:
+    """ Check whether an 'Accept-Encoding' header allows gzip compressed
+    responses
+
+    Args:
+        accept_encoding: Value of the 'Accept-Encoding' header
+
+    Returns:
+        bool: Is 'gzip' accepted with a non-zero quality
+    """
+    for coding in accept_encoding.split(','):
+        name, _, parameters = coding.partition(';')
+        if name.strip().lower() not in ('gzip', 'x-gzip'):
+            continue
+        quality = parameters.strip().lower()
+        if not quality.startswith('q='):
+            return True
+        try:
+            return float(quality[2:]) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def negotiate(request: Request) -> Encoding:
+    """ Choose the format of a metrics response from the request's 'Accept'
+    and 'Accept-Encoding' headers. OpenMetrics is used when requested,
+    otherwise Prometheus' text format
+
+    Args:
+        request: FastAPI request
+
+    Returns:
+        'Encoding' of the response
+    """
+    encoder, content_type = choose_encoder(request.headers.get('accept', ''))
+    return Encoding(encoder, content_type,
+                    gzip_accepted(request.headers.get('accept-encoding', '')))
+
+
+def decode_json(body: bytes):
+    """ Decode json, using 'orjson' when it is installed
+
+    Args:
+        body: json document
+
+    Returns:
+        Decoded json data
+    """
+    if orjson is not None:
+        # pylint can't inspect compiled extensions
+        # pylint: disable=E1101
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def ijson_installed() -> bool:
+    """ Check whether 'ijson', used to decode json streams, is installed.
+    It is imported on first use, keeping startup fast
+
+    Returns:
+        bool: Is 'ijson' installed
+    """
+    # pylint: disable=import-outside-toplevel,unused-import
+    try:
+        import ijson  # type: ignore  # noqa: F401
+    except ImportError:  # pragma: no cover
+        return False
+    return True
+
+
+def parse_stream(body: bytes) -> Iterator[tuple]:
+    """ Parse a json document into 'ijson' events, importing 'ijson' on
+    first use
+
+    Args:
+        body: json document
+
+    Yields:
+        tuple of the prefix, event and value of each 'ijson' event
+
+    Raises:
+        ValueError: When 'body' isn't valid json
+    """
+    import ijson  # type: ignore  # pylint: disable=import-outside-toplevel
+    try:
+        yield from ijson.parse(io.BytesIO(body), use_float=True)
+    except ijson.JSONError as error:
+        raise ValueError(f'Invalid json: {error}') from error
+
+
+def deep_sizeof(obj) -> int:
+    """ Estimate the memory used by decoded json data or records
+
+    Args:
+        obj: Decoded json data or a 'GalaxyRecord' instance
+
+    Returns:
+        int estimated bytes used by 'obj' and everything it contains
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key) + deep_sizeof(value) for key, value in obj.items())
+    elif isinstance(obj, list):
+        size += sum(deep_sizeof(item) for item in obj)
+    elif isinstance(obj, GalaxyRecord):
+        size += sum(deep_sizeof(getattr(obj, name)) for name in obj.__slots__)
+    return size
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """ Fetch the process wide aiohttp session, creating it when necessary.
+    The session keeps connections alive between Galaxy calls and caches DNS
+    lookups, aiodns is used for resolving when it is installed
+
+    Returns:
+        Shared 'aiohttp.ClientSession' instance
+    """
+    loop = asyncio.get_event_loop()
+    session = HTTP_SESSION.get('session')
+    if session is not None and not session.closed and HTTP_SESSION['loop'] is loop:
+        return session
+    resolver: aiohttp.abc.AbstractResolver
+    try:
+        resolver = aiohttp.AsyncResolver()
+    except (ImportError, RuntimeError):
+        resolver = aiohttp.DefaultResolver()
+    connector = aiohttp.TCPConnector(
+        keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        resolver=resolver,
+        ttl_dns_cache=HTTP_DNS_CACHE_SECONDS,
+        use_dns_cache=True,
+    )
+    timeout = aiohttp.ClientTimeout(connect=HTTP_CONNECT_TIMEOUT,
+                                    sock_read=HTTP_READ_TIMEOUT)
+    session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    HTTP_SESSION.update(connector=connector, loop=loop, session=session)
+    return session
+
+
+async def close_http_session() -> None:
+    """ Close the process wide aiohttp session and its connection pool
+    """
+    session = HTTP_SESSION.pop('session', None)
+    HTTP_SESSION.clear()
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def http_pool_usage() -> Dict[str, int]:
+    """ Count connections held by the shared aiohttp connection pool
+
+    Returns:
+        Dict with the number of 'acquired' (in use) and 'idle' (kept alive)
+        connections
+    """
+    connector = HTTP_SESSION.get('connector')
+    if connector is None or connector.closed:
+        return dict(acquired=0, idle=0)
+    # aiohttp does not expose pool usage publicly
+    # pylint: disable=W0212
+    return dict(acquired=len(connector._acquired),
+                idle=sum(len(conns) for conns in connector._conns.values()))
+
+
+class GalaxyCollector:
+    """Prometheus collector generating the metrics of collections and roles
+    on demand from their metric values. One collector serves any number of
+    collections and roles, metric families shared by them are described once
+
+    Args:
+        instances (list): 'Collection' and 'Role' instances, or a function
+            returning them
+        live (bool): When False only cacheable metrics are generated, when
+            True only live metrics that change every scrape. Both are
+            generated when None
+
+    Attributes:
+        instances (list): 'Collection' and 'Role' instances, or a function
+            returning them
+        live (bool): When False only cacheable metrics are generated, when
+            True only live metrics that change every scrape. Both are
+            generated when None
+    """
+    def __init__(self, instances, live: Optional[bool] = None) -> None:
+        self.instances = instances
+        self.live = live
+
+    def collect(self):
+        """ Generate metric families of all instances with metric values.
+        Families are built one at a time as they are consumed
+
+        Yields:
+            'prometheus_client.Metric' instances
+        """
+        instances = self.instances() if callable(self.instances) else self.instances
+        by_class: Dict[type, list] = OrderedDict()
+        for instance in instances:
+            if instance.values is not None:
+                by_class.setdefault(type(instance), []).append(instance)
+        for members in by_class.values():
+            for key, spec in members[0].metrics.items():
+                if self.live is not None and spec.live != self.live:
+                    continue
+                family = self.family(members, key, spec)
+                if family is not None:
+                    yield family
+
+    @staticmethod
+    def family(members: list, key: str, spec: MetricSpec):
+        """ Build one metric family of instances of the same class
+
+        Args:
+            members: 'Collection' or 'Role' instances with metric values
+            key: Key of the metric in the instances' values
+            spec: 'MetricSpec' of the metric
+
+        Returns:
+            'prometheus_client.Metric' instance, None when no instance has a
+            live value
+        """
+        label_names = list(members[0].labels)
+        if spec.live:
+            values = [instance.live_value(key) for instance in members]
+            if all(value is None for value in values):
+                return None
+            family_class = CounterMetricFamily if spec.kind == 'counter' else GaugeMetricFamily
+            family = family_class(spec.name, spec.documentation, labels=label_names)
+            for instance, value in zip(members, values):
+                if value is not None:
+                    family.add_metric(list(instance.labels.values()), value)
+            return family
+        if spec.kind == 'info':
+            info = InfoMetricFamily(spec.name, spec.documentation, labels=label_names)
+            for instance in members:
+                info.add_metric(list(instance.labels.values()), {'version': instance.values[key]})
+            return info
+        gauge = GaugeMetricFamily(spec.name, spec.documentation, labels=label_names)
+        for instance in members:
+            gauge.add_metric(list(instance.labels.values()), instance.values[key])
+        return gauge
+
+
+class FamilyCollector:
+    """Prometheus collector returning already generated metric families
+
+    Args:
+        families (list): 'prometheus_client.Metric' instances
+
+    Attributes:
+        families (list): 'prometheus_client.Metric' instances
+    """
+    # pylint: disable=too-few-public-methods
+    def __init__(self, families: list) -> None:
+        self.families = families
+
+    def collect(self) -> list:
+        """ Return the metric families
+
+        Returns:
+            list of 'prometheus_client.Metric' instances
+        """
+        return self.families
+
+
+def transferred_bytes(result: FetchResult) -> int:
+    """ Size of a Galaxy response body as transferred. aiohttp decompresses
+    bodies as they are read, so compressed responses are measured by their
+    'Content-Length'
+
+    Args:
+        result: 'FetchResult' of the response
+
+    Returns:
+        int bytes of the body, the size of the decompressed body when Galaxy
+        sent no 'Content-Length'
+    """
+    try:
+        return int(result.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return len(result.body)
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """ Convert a 'Retry-After' header to seconds
+
+    Args:
+        value: Header value, either seconds or an HTTP date
+        default: Seconds returned when the header is missing or invalid
+
+    Returns:
+        float seconds to wait
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_until(deadline: float):
+    """ Randomized exponential backoff between attempts, never waiting past
+    'deadline'
+
+    Args:
+        deadline: Monotonic time attempts must finish by
+
+    Returns:
+        tenacity wait callable
+    """
+    from tenacity import wait_random_exponential  # pylint: disable=import-outside-toplevel
+    backoff = wait_random_exponential(multiplier=UPSTREAM_BACKOFF_SECONDS,
+                                      max=UPSTREAM_BACKOFF_MAX_SECONDS)
+
+    def wait(retry_state) -> float:
+        return min(backoff(retry_state), max(0.0, deadline - time.monotonic()))
+    return wait
+
+
+async def fetch_from_url(url: str, job: str, instance: str, deadline: Optional[float] = None,
+                         headers: Optional[dict] = None) -> Optional[FetchResult]:
+    """ Fetch content from specified URL
+    Connection errors, timeouts and retryable statuses are retried with
+    exponential backoff until 'deadline' seconds have passed, other statuses
+    are returned as is
+
+    Args:
+        url: str URL to fetch
+        job: Class name or other description of download type, used when
+        logging
+        instance: Specific software instance being downloaded, used when
+        logging
+        deadline: Optional seconds to keep retrying, defaults to
+        'UPSTREAM_DEADLINE_SECONDS'
+        headers: Optional dict of request headers
+
+    Returns:
+        'FetchResult' of the response, None when the URL couldn't be fetched
+    """
+    # Imported on first use, keeping startup fast
+    # pylint: disable=import-outside-toplevel
+    import tenacity
+    if deadline is None:
+        deadline = UPSTREAM_DEADLINE_SECONDS
+    count = 0
+    deadline_at = time.monotonic() + deadline
+    try:
+        async for attempt in tenacity.AsyncRetrying(
+                stop=tenacity.stop_after_delay(deadline),
+                retry=tenacity.retry_if_not_exception_type(RateLimitTimeout),
+                wait=backoff_until(deadline_at)):
+            with attempt:
+                count += 1
+                if count > 1:
+                    fastapi_logger.info('Fetching %s "%s" metadata (try %s)',
+                                        job, instance, count)
+                remaining = max(0.0, deadline_at - time.monotonic())
+                async with RATE_LIMITER.slot(timeout=remaining):
+                    session = await get_http_session()
+                    # Replaces the session's timeout, so its limits are repeated
+                    timeout = aiohttp.ClientTimeout(
+                        total=max(0.1, min(UPSTREAM_ATTEMPT_TIMEOUT, remaining)),
+                        connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+                    metrics = update_base_metrics()
+                    with metrics['upstream_in_flight'].track_inprogress():
+                        # Fetch latest JSON from Ansible Galaxy API
+                        async with session.get(url, headers=headers, timeout=timeout) as response:
+                            if response.status == 429:
+                                RATE_LIMITER.throttle(
+                                    parse_retry_after(response.headers.get('Retry-After')))
+                                metrics['upstream_throttled'].inc()
+                                raise UpstreamThrottled(response.status)
+                            if response.status in RETRYABLE_STATUSES:
+                                raise UpstreamStatusError(response.status)
+                            RATE_LIMITER.success()
+                            # Cache latest JSON
+                            return FetchResult(response.status, await response.read(),
+                                               response.headers.copy())
+    except RateLimitTimeout:
+        fastapi_logger.error('Rate limited fetching %s "%s" URL %s', job, instance, url)
+    except tenacity.RetryError:
+        fastapi_logger.exception('Error fetching %s "%s" URL %s', job,
+                                 instance, url)
+    finally:
+        update_base_metrics()['upstream_attempts'].observe(count)
+    return None
+
+
+def set_collection_metrics(collection: Collection) -> Collection:
+    """ Set Prometheus metric values on the supplied 'Collection' instance based
+    on metrics defined within the 'Collection' instance
+
+    Args:
+        collection: 'Collection' class instance
+
+    Returns:
+        The supplied 'Collection' class instance
+    """
+    collection.values = dict(
+        community_score=float(collection.metric__community_score()),
+        community_survey=float(collection.metric__community_surveys()),
+        created=float(collection.metric__created()),
+        dependency=float(collection.metric__dependencies()),
+        download=float(collection.metric__downloads()),
+        modified=float(collection.metric__modified()),
+        quality_score=float(collection.metric__quality_score()),
+        version=collection.metric__version(),
+        versions=float(collection.metric__versions()),
+    )
+    return collection
+
+
+def set_role_metrics(role: Role) -> Role:
+    """ Set Prometheus metric values on the supplied 'Role' instance based on
+    metrics defined within the 'Role' instance
+
+    Args:
+        role: 'Role' class instance
+
+    Returns:
+        The supplied 'Role' class instance
+    """
+    role.values = dict(
+        community_score=float(role.metric__community_score()),
+        community_survey=float(role.metric__community_surveys()),
+        created=float(role.metric__created()),
+        download=float(role.metric__downloads()),
+        fork=float(role.metric__forks()),
+        imported=float(role.metric__imported()),
+        modified=float(role.metric__modified()),
+        open_issue=float(role.metric__open_issues()),
+        quality_score=float(role.metric__quality_score()),
+        star=float(role.metric__stars()),
+        version=role.metric__version(),
+        versions=float(role.metric__versions()),
+        watchers=float(role.metric__watchers()),
+    )
+    return role
+
+
+def build_snapshot() -> dict:
+    """ Build a snapshot of the cached collections and roles
+
+    Returns:
+        dict of json serializable cache data
+    """
+    snapshot: Dict[str, object] = dict(version=SNAPSHOT_VERSION)
+    for module, cache in (('collections', COLLECTIONS), ('roles', ROLES)):
+        snapshot[module] = [
+            dict(name=instance.name, digest=instance.digest, etag=instance.etag,
+                 last_modified=instance.last_modified,
+                 last_update=instance.last_update.timestamp(),
+                 record=instance.data.to_dict())
+            for instance in cache.values()
+            if isinstance(instance.data, GalaxyRecord) and instance.last_update is not None
+        ]
+    return snapshot
+
+
+def write_snapshot(path: str, snapshot: dict) -> None:
+    """ Atomically write a cache snapshot to disk
+
+    Args:
+        path: Path of the snapshot file
+        snapshot: Snapshot built by 'build_snapshot'
+    """
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as snapshot_file:
+        json.dump(snapshot, snapshot_file, separators=(',', ':'))
+    os.replace(temporary, path)
+
+
+def save_snapshot(path: str) -> None:
+    """ Write a snapshot of the cached collections and roles to disk
+
+    Args:
+        path: Path of the snapshot file
+    """
+    write_snapshot(path, build_snapshot())
+
+
+def snapshot_instance(cls: Type['GalaxyData'], entry: dict, now: float,
+                      cache_seconds: int) -> 'GalaxyData':
+    """ Create a collection or role from a snapshot entry
+
+    Args:
+        cls: 'Collection' or 'Role'
+        entry: Snapshot entry built by 'build_snapshot'
+        now: Epoch seconds the snapshot is loaded at
+        cache_seconds: Maximum allowed age of data cache
+
+    Raises:
+        KeyError: A required value is missing
+        TypeError: A value has the wrong type or 'cls' keeps no records
+        ValueError: The name is malformed or the data is older than
+            'MAX_STALENESS_SECONDS'
+
+    Returns:
+        'Collection' or 'Role' instance
+    """
+    if not isinstance(entry, dict):
+        raise TypeError('Snapshot entries must be dicts')
+    name = entry['name']
+    if not isinstance(name, str) or not valid_target(cls.__name__.lower(), name):
+        raise ValueError(f'Invalid name {name!r}')
+    if not isinstance(entry['digest'], str):
+        raise TypeError('digest must be a str')
+    last_update = entry['last_update']
+    if isinstance(last_update, bool) or not isinstance(last_update, (int, float)):
+        raise TypeError('last_update must be a number')
+    age = now - last_update
+    if MAX_STALENESS_SECONDS and age > MAX_STALENESS_SECONDS:
+        raise ValueError(f'Data is older than {MAX_STALENESS_SECONDS} seconds')
+    if cls.record_class is None:
+        raise TypeError(f'{cls.__name__} data is not stored in snapshots')
+    instance = cls(name)
+    instance.data = cls.record_class.from_dict(entry['record'])
+    instance.digest = entry['digest']
+    instance.etag = entry.get('etag')
+    instance.last_modified = entry.get('last_modified')
+    instance.last_update = datetime.fromtimestamp(last_update)
+    if age > cache_seconds:
+        instance.next_refresh = datetime.fromtimestamp(now + random.uniform(0, cache_seconds))
+    instance.record_sample(last_update)
+    return instance
+
+
+def load_snapshot(path: str, cache_seconds: int = CACHE_SECONDS) -> int:
+    """ Populate the collection and role caches from a snapshot on disk.
+    Data that has expired is refreshed at a random time within
+    'cache_seconds', so refreshes are spread out instead of all happening on
+    the first scrape. Snapshots in another format are ignored, and invalid
+    entries and data older than 'MAX_STALENESS_SECONDS' are skipped
+
+    Args:
+        path: Path of the snapshot file
+        cache_seconds: Maximum allowed age of data cache
+
+    Returns:
+        int number of collections and roles loaded
+    """
+    try:
+        with open(path, 'r') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError):
+        fastapi_logger.warning('Unable to load cache snapshot %s', path)
+        return 0
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        fastapi_logger.warning('Ignoring cache snapshot %s, its version is not %s',
+                               path, SNAPSHOT_VERSION)
+        return 0
+    loaded = 0
+    now = time.time()
+    for module, cache, cls in (('collections', COLLECTIONS, Collection),
+                               ('roles', ROLES, Role)):
+        entries = snapshot.get(module, [])
+        if not isinstance(entries, list):
+            fastapi_logger.warning('Skipping cache snapshot %s %s, not a list', path, module)
+            continue
+        for index, entry in enumerate(entries):
+            try:
+                instance = snapshot_instance(cls, entry, now, cache_seconds)
+            except (KeyError, TypeError, ValueError) as error:
+                fastapi_logger.warning('Skipping cache snapshot %s %s entry %s: %s %s',
+                                       path, module, index, type(error).__name__, error)
+                continue
+            if instance.name in cache:
+                continue
+            cache[instance.name] = instance
+            loaded += 1
+    fastapi_logger.info('Loaded %s cached collections and roles from %s', loaded, path)
+    return loaded
+
+
+async def snapshot_periodically(path: str, interval: int) -> None:
+    """ Write cache snapshots to disk every 'interval' seconds
+
+    Args:
+        path: Path of the snapshot file
+        interval: Seconds between snapshots
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, write_snapshot, path, build_snapshot())
+        except OSError:
+            fastapi_logger.exception('Unable to write cache snapshot %s', path)
+
+
+def valid_target(module: str, name: str) -> bool:
+    """ Check the format of a target's name, collections and roles are
+    named in author.project format and namespaces are a single word of
+    letters, digits, underscores and hyphens
+
+    Args:
+        module: One of 'collection', 'namespace' or 'role'
+        name: The name of the collection, namespace or role
+
+    Returns:
+        bool: Is 'name' valid for 'module'
+    """
+    if module == 'namespace':
+        return RE_NAMESPACE.fullmatch(name) is not None
+    author, _, project = name.partition('.')
+    return bool(author) and bool(project) and '.' not in project
+
+
+def load_targets(path: str) -> List[tuple]:
+    """ Read the collections, namespaces and roles listed in a targets file,
+    in YAML format when its name ends in '.yml' or '.yaml', otherwise in json
+    format. Example:
+
+        collections:
+          - community.kubernetes
+        namespaces:
+          - mesaguy
+        roles:
+          - mesaguy.prometheus
+
+    Args:
+        path: Path of the targets file
+
+    Returns:
+        list of unique (module, name) tuples, module is one of 'collection',
+        'namespace' or 'role'. Names in an invalid format are left out
+    """
+    try:
+        with open(path, 'r') as targets_file:
+            if path.endswith(('.yml', '.yaml')):
+                # Optional, only imported when a YAML file is used
+                import yaml  # type: ignore  # pylint: disable=import-outside-toplevel
+                try:
+                    config = yaml.safe_load(targets_file)
+                except yaml.YAMLError as error:
+                    raise ValueError(str(error)) from error
+            else:
+                config = json.load(targets_file)
+        targets = [(module, str(name))
+                   for module, key in (('namespace', 'namespaces'),
+                                       ('collection', 'collections'), ('role', 'roles'))
+                   for name in (config or dict()).get(key) or list()]
+    except (ImportError, OSError, ValueError, AttributeError, TypeError):
+        fastapi_logger.exception('Unable to load targets file %s', path)
+        return list()
+    for module, name in targets:
+        if not valid_target(module, name):
+            fastapi_logger.warning('Skipping invalid %s "%s" in targets file %s', module, name,
+                                   path)
+    return list(dict.fromkeys(pair for pair in targets if valid_target(*pair)))
+
+
+async def prefetch(targets: List[tuple], concurrency: int = PREFETCH_CONCURRENCY,
+                   spacing: float = PREFETCH_SPACING_SECONDS) -> None:
+    """ Fetch collections, namespaces and roles into the cache. At most
+    'concurrency' are fetched at once, each after a random pause of up to
+    'spacing' seconds, so Galaxy isn't asked for all of them at once.
+    Namespaces are listed first, then their collections and roles are
+    fetched with the others. A target that can't be fetched doesn't stop
+    the others
+
+    Args:
+        targets: list of (module, name) tuples, module is one of
+        'collection', 'namespace' or 'role'
+        concurrency: Maximum number of targets fetched at once
+        spacing: Maximum random seconds each fetch is delayed
+    """
+    getters = dict(collection=get_collection, namespace=get_namespace, role=get_role)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(module: str, name: str):
+        if not valid_target(module, name):
+            fastapi_logger.warning('Unable to prefetch %s %s: invalid name', module, name)
+            return None
+        async with semaphore:
+            await asyncio.sleep(random.uniform(0, spacing))
+            try:
+                return await getters[module](name)
+            except HTTPException as error:
+                fastapi_logger.warning('Unable to prefetch %s %s: %s', module, name,
+                                       error.detail)
+                return None
+    namespaces = await asyncio.gather(*[fetch(module, name) for module, name in targets
+                                        if module == 'namespace'])
+    pairs = [pair for pair in targets if pair[0] != 'namespace']
+    for namespace in namespaces:
+        if namespace is not None:
+            pairs.extend([('collection', name) for name in namespace.collections])
+            pairs.extend([('role', name) for name in namespace.roles])
+    pairs = list(dict.fromkeys(pairs))
+    await asyncio.gather(*[fetch(module, name) for module, name in pairs])
+    fastapi_logger.info('Prefetched %s collections and roles', len(pairs))
+
+
+@app.on_event('startup')
+async def startup() -> None:
+    """ Open the shared HTTP connection pool, load the cache snapshot and
+    start prefetching the targets file's targets when the application starts
+    """
+    await get_http_session()
+    if SNAPSHOT_PATH:
+        load_snapshot(SNAPSHOT_PATH)
+        if SNAPSHOT_INTERVAL > 0:
+            BACKGROUND_TASKS['snapshot'] = asyncio.ensure_future(
+                snapshot_periodically(SNAPSHOT_PATH, SNAPSHOT_INTERVAL))
+    if TARGETS_FILE:
+        task = asyncio.ensure_future(prefetch(load_targets(TARGETS_FILE)))
+        task.add_done_callback(log_background_failure)
+        BACKGROUND_TASKS['prefetch'] = task
+
+
+@app.on_event('shutdown')
+async def shutdown() -> None:
+    """ Close the shared HTTP connection pool and write the cache snapshot
+    when the application stops
+    """
+    for task in BACKGROUND_TASKS.values():
+        task.cancel()
+    BACKGROUND_TASKS.clear()
+    if SNAPSHOT_PATH:
+        try:
+            save_snapshot(SNAPSHOT_PATH)
+        except OSError:
+            fastapi_logger.exception('Unable to write cache snapshot %s', SNAPSHOT_PATH)
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+    await close_http_session()
+
+
+def metrics_response(content: bytes, encoding: Encoding = TEXT_ENCODING) -> Response:
+    """ Response of metrics in Prometheus' exposition format
+
+    Args:
+        content: bytes of metrics in Prometheus' exposition format
+        encoding: 'Encoding' of 'content'
+
+    Returns:
+        'Response' with the content type and encoding of 'content'
+    """
+    update_base_metrics()['response_bytes'].observe(len(content))
+    store_gauge_functions()
+    headers = {'Vary': 'Accept, Accept-Encoding'}
+    if encoding.compress:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(content, headers=headers, media_type=encoding.content_type)
+
+
+@app.get("/", response_class=HTMLResponse)
+async def root() -> str:
+    """ Generate root HTML page
+
+    Returns:
+        str HTML base index page
+    """
+    from galaxy_exporter import pages  # pylint: disable=import-outside-toplevel
+    return pages.ROOT_HTML
+
+
+@app.get('/ready', response_class=PlainTextResponse)
+async def ready() -> str:
+    """ Report whether this exporter is ready to be scraped, which is once
+    the targets file's targets have been prefetched
+
+    Returns:
+        str 'OK' when ready
+
+    Raises:
+        HTTPException: 503 while targets are being prefetched, 500 when
+        prefetching failed
+    """
+    task = BACKGROUND_TASKS.get('prefetch')
+    if task is None:
+        return 'OK'
+    if not task.done():
+        raise HTTPException(status_code=503, detail='Prefetching targets')
+    if not task.cancelled() and task.exception() is not None:
+        raise HTTPException(status_code=500, detail='Prefetching targets failed')
+    return 'OK'
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def process_metrics() -> str:
+    """ Fetch this exporter's own Prometheus metrics. In multiprocess mode
+    metrics of all worker processes are aggregated
+
+    Returns:
+        str in Prometheus' exporter format of this exporters metrics
+    """
+    metrics = update_base_metrics()
+    if not MULTIPROCESS:
+        return generate_latest()
+    store_gauge_functions()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    # Metrics that aren't kept in files are reported by this worker
+    registry.register(metrics['version'])
+    registry.register(metrics['negative_cache'])
+    return generate_latest(registry)
+
+
+@app.get('/metrics/targets', response_class=StreamingResponse)
+async def targets_metrics(request: Request) -> StreamingResponse:
+    """ Stream the Prometheus metrics of all cached collections and roles,
+    one metric family at a time. Only cached data is used, Galaxy is never
+    asked, not even for expired data
+
+    Args:
+        request: FastAPI request, its headers select the response format
+
+    Returns:
+        StreamingResponse in Prometheus' exporter format of all cached
+        collections and roles' metrics
+    """
+    encoding = negotiate(request)
+    instances = [instance for cache in (COLLECTIONS, ROLES) for instance in cache.values()
+                 if instance.is_usable()]
+
+    async def stream() -> AsyncIterator[bytes]:
+        size = 0
+        # Gzip container around a single deflate stream
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16) \
+            if encoding.compress else None
+        for instance in instances:
+            instance.sync_metrics()
+        for family in GalaxyCollector(instances).collect():
+            chunk = encode(FamilyCollector([family]), encoding, final=False)
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            size += len(chunk)
+            yield chunk
+            # Let other requests run between families
+            await asyncio.sleep(0)
+        # The OpenMetrics end marker, nothing in text format
+        chunk = encode(FamilyCollector([]), encoding)
+        if compressor is not None:
+            chunk = compressor.compress(chunk) + compressor.flush()
+        size += len(chunk)
+        yield chunk
+        update_base_metrics()['response_bytes'].observe(size)
+    headers = {'Vary': 'Accept, Accept-Encoding'}
+    if encoding.compress:
+        headers['Content-Encoding'] = 'gzip'
+    return StreamingResponse(stream(), headers=headers, media_type=encoding.content_type)
+
+
+@app.get('/collection/{collection_name}', response_class=HTMLResponse)
+async def collection_base(collection_name: str) -> str:
     """ Generate collection base HTML page
 
     Args:
@@ -621,52 +2329,138 @@ async def collection_base(collection_name: str) -> str:
     Returns:
         str HTML of an index page listing URLs available for collection metrics
     """
-    return COLLECTION_HTML.format(collection_name=collection_name)
+    from galaxy_exporter import pages  # pylint: disable=import-outside-toplevel
+    return pages.COLLECTION_HTML.format(collection_name=collection_name)
 
 
-@app.get('/probe', response_class=PlainTextResponse)
-async def probe(module: str, target: str) -> str:
+@app.get('/probe', response_class=Response)
+async def probe(request: Request, module: str, target: str) -> Response:
     """ Generate collection or role's Prometheus metrics
     URLs must be in the Prometheus "Multi Target Exporter" format, example:
     /probe?module=role&target=mesaguy.prometheus
 
+    The 'namespace' module returns the metrics of all collections and roles
+    of a namespace, example: /probe?module=namespace&target=mesaguy
+
     Args:
-        module: One of 'collection' or 'role'
-        target: The name of the collection or role, ie: 'mesaguy.prometheus'
+        request: FastAPI request, its headers select the response format
+        module: One of 'collection', 'namespace' or 'role'
+        target: The name of the collection or role, ie: 'mesaguy.prometheus',
+        or of the namespace, ie: 'mesaguy'
 
     Returns:
-        str in Prometheus' exporter format of specified collection or
-        role's metrics
+        Response in Prometheus' exporter format of specified collection or
+        role's metrics, in OpenMetrics format and gzip compressed when
+        requested
     """
-    if module not in ['collection', 'role']:
+    if module not in ['collection', 'namespace', 'role']:
         raise HTTPException(status_code=404,
                             detail=f'Unknown module {module}, use '
-                            '"collection" or "role"')
+                            '"collection", "namespace" or "role"')
+    encoding = negotiate(request)
+    if module == 'namespace':
+        namespace = await get_namespace(target)
+        return await probe_targets([('collection', name) for name in namespace.collections] +
+                                   [('role', name) for name in namespace.roles], encoding)
     if module == 'collection':
         collection = await get_collection(target)
-        collection = set_collection_metrics(collection)
-        return generate_latest(registry=collection.registry)
+        return metrics_response(collection.render(encoding), encoding)
     role = await get_role(target)
-    role = set_role_metrics(role)
-    return generate_latest(registry=role.registry)
+    return metrics_response(role.render(encoding), encoding)
+
+
+@app.get('/probe/batch', response_class=Response)
+async def probe_batch(request: Request, target: List[str] = Query(...)) -> Response:
+    """ Generate the Prometheus metrics of many collections and roles at once.
+    Targets are in 'module:name' format, example:
+    /probe/batch?target=role:mesaguy.prometheus&target=collection:community.kubernetes
+
+    Targets missing from the cache are fetched concurrently, at most
+    'BATCH_CONCURRENCY' at a time
+
+    Args:
+        request: FastAPI request, its headers select the response format
+        target: List of targets in 'module:name' format, module is one of
+        'collection' or 'role'
+
+    Returns:
+        Response in Prometheus' exporter format of the merged metrics of all
+        targets
 
+    Raises:
+        HTTPException: 404 for unknown modules, 422 for names that aren't in
+        author.project format
+    """
+    pairs = list()
+    for pair in dict.fromkeys(target):
+        module, _, name = pair.partition(':')
+        if module not in ('collection', 'role') or not name:
+            raise HTTPException(status_code=404,
+                                detail=f'Unknown target {pair}, use '
+                                '"collection:NAME" or "role:NAME"')
+        if not valid_target(module, name):
+            raise HTTPException(status_code=422,
+                                detail=f'Invalid target {pair}, names are in '
+                                'author.project format')
+        pairs.append((module, name))
+    return await probe_targets(pairs, negotiate(request))
+
+
+async def probe_targets(pairs: List[tuple], encoding: Encoding = TEXT_ENCODING) -> Response:
+    """ Generate the merged Prometheus metrics of many collections and roles.
+    Targets missing from the cache are fetched concurrently, at most
+    'BATCH_CONCURRENCY' at a time, unavailable targets are left out
+
+    Args:
+        pairs: List of (module, name) tuples, module is one of 'collection' or
+        'role'
+        encoding: 'Encoding' of the response
 
-@app.get('/collection/{collection_name}/{metric}', response_class=PlainTextResponse)
-async def collection_metric(collection_name: str, metric: str) -> str:
+    Returns:
+        Response in Prometheus' exporter format of the merged metrics of all
+        targets
+    """
+    getters = dict(collection=get_collection, role=get_role)
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def limited_get(module: str, name: str) -> Optional[GalaxyData]:
+        async with semaphore:
+            try:
+                return await getters[module](name)
+            except HTTPException:
+                # Unavailable targets are left out
+                return None
+    instances = [instance for instance in await asyncio.gather(
+        *[limited_get(module, name) for module, name in pairs]) if instance is not None]
+    for instance in instances:
+        instance.sync_metrics()
+    with update_base_metrics()['render_seconds'].time():
+        content = encode(GalaxyCollector(instances), encoding)
+        if encoding.compress:
+            content = gzip_finish(gzip_start(b''), content)
+    return metrics_response(content, encoding)
+
+
+@app.get('/collection/{collection_name}/{metric}', response_class=PlainTextResponse,
+         response_model=None)
+async def collection_metric(request: Request, collection_name: str,
+                           metric: str) -> Union[Response, str]:
     """ Generate collection's Prometheus metrics
 
     Args:
+        request: FastAPI request, its headers select the response format
         collection_name: The name of a collection
         metric: The name of a specific metric or 'metrics' for all Prometheus
         metrics
 
     Returns:
-        str in Prometheus' exporter format of specified collection's metrics
+        Response in Prometheus' exporter format of specified collection's
+        metrics, or str of the specified metric
     """
     collection = await get_collection(collection_name)
     if metric == 'metrics':
-        collection = set_collection_metrics(collection)
-        return generate_latest(registry=collection.registry)
+        encoding = negotiate(request)
+        return metrics_response(collection.render(encoding), encoding)
     return getattr(collection, f'metric__{metric}')()
 
 
@@ -680,36 +2474,57 @@ async def role_base(role_name: str) -> str:
     Returns:
         str HTML of an index page listing URLs available for role metrics
     """
-    return ROLE_HTML.format(role_name=role_name)
+    from galaxy_exporter import pages  # pylint: disable=import-outside-toplevel
+    return pages.ROLE_HTML.format(role_name=role_name)
 
 
-@app.get('/role/{role_name}/{metric}', response_class=PlainTextResponse)
-async def role_metric(role_name: str, metric: str) -> str:
+@app.get('/role/{role_name}/{metric}', response_class=PlainTextResponse,
+         response_model=None)
+async def role_metric(request: Request, role_name: str,
+                     metric: str) -> Union[Response, str]:
     """ Generate role's Prometheus metrics
 
     Args:
+        request: FastAPI request, its headers select the response format
         role_name: The name of a role
         metric: The name of a specific metric or 'metrics' for all Prometheus
         metrics
 
     Returns:
-        str in Prometheus' exporter format of specified role's metrics
+        Response in Prometheus' exporter format of specified role's metrics,
+        or str of the specified metric
     """
     role = await get_role(role_name)
     if metric == 'metrics':
-        role = set_role_metrics(role)
-        return generate_latest(registry=role.registry)
+        encoding = negotiate(request)
+        return metrics_response(role.render(encoding), encoding)
     return getattr(role, f'metric__{metric}')()
 
 
-def update_base_metrics(increment: bool = False) -> dict:
-    """ Update this exporter's own Prometheus metrics
+def set_gauge_function(gauge: Gauge, function) -> None:
+    """ Report the value returned by 'function' from 'gauge'. Multiprocess
+    mode keeps gauge values in files, there values are stored whenever this
+    worker renders metrics
 
     Args:
-        increment: Increment the count of total Ansible Galaxy API calls by one
+        gauge: 'prometheus_client.Gauge' without labels, or a labelled child
+        function: Function returning the gauge's value
+    """
+    if MULTIPROCESS:
+        GAUGE_FUNCTIONS.append((gauge, function))
+    else:
+        gauge.set_function(function)
 
-    Returns:
-        Dict containing base metrics
+
+def store_gauge_functions() -> None:
+    """ Store the values of function gauges in multiprocess mode
+    """
+    for gauge, function in GAUGE_FUNCTIONS:
+        gauge.set(function())
+
+
+def setup_request_metrics() -> None:
+    """ Create the metrics of requests, their cache hits and their timings
     """
     if 'version' not in METRICS:
         METRICS['version'] = Info('ansible_galaxy_exporter_version',
@@ -718,11 +2533,369 @@ def update_base_metrics(increment: bool = False) -> dict:
     if 'api_call_count' not in METRICS:
         METRICS['api_call_count'] = Counter('ansible_galaxy_exporter_api_call_count',
                                             'API calls to Ansible Galaxy')
+    if 'cache_hits' not in METRICS:
+        METRICS['cache_hits'] = Counter('ansible_galaxy_exporter_cache_hits',
+                                        'Requests answered from cached data', ['module'])
+        METRICS['cache_misses'] = Counter('ansible_galaxy_exporter_cache_misses',
+                                          'Requests that waited for Ansible Galaxy', ['module'])
+        for module in ('collection', 'role'):
+            METRICS['cache_hits'].labels(module=module)
+            METRICS['cache_misses'].labels(module=module)
+    if 'upstream_latency' not in METRICS:
+        METRICS['upstream_latency'] = Histogram(
+            'ansible_galaxy_exporter_upstream_latency_seconds',
+            'Seconds spent fetching data from Ansible Galaxy, including retries')
+    if 'upstream_in_flight' not in METRICS:
+        METRICS['upstream_in_flight'] = Gauge('ansible_galaxy_exporter_upstream_in_flight',
+                                              'Ansible Galaxy requests in flight',
+                                              multiprocess_mode='livesum')
+    if 'decode_seconds' not in METRICS:
+        METRICS['decode_seconds'] = Histogram(
+            'ansible_galaxy_exporter_decode_seconds',
+            'Seconds spent decoding Ansible Galaxy responses', buckets=FAST_BUCKETS)
+    if 'set_metrics_seconds' not in METRICS:
+        METRICS['set_metrics_seconds'] = Histogram(
+            'ansible_galaxy_exporter_set_metrics_seconds',
+            'Seconds spent setting metric values from Ansible Galaxy data',
+            buckets=FAST_BUCKETS)
+    if 'render_seconds' not in METRICS:
+        METRICS['render_seconds'] = Histogram(
+            'ansible_galaxy_exporter_render_seconds',
+            'Seconds spent rendering metrics per request', buckets=FAST_BUCKETS)
+    if 'response_bytes' not in METRICS:
+        METRICS['response_bytes'] = Histogram(
+            'ansible_galaxy_exporter_response_bytes',
+            'Bytes of metrics responses',
+            buckets=(512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+    if 'coalesced_requests' not in METRICS:
+        METRICS['coalesced_requests'] = Counter(
+            'ansible_galaxy_exporter_coalesced_requests',
+            'Requests that awaited an in-flight Ansible Galaxy lookup', ['module'])
+        for module in ('collection', 'role'):
+            METRICS['coalesced_requests'].labels(module=module)
+
+
+def setup_cache_metrics() -> None:
+    """ Create the metrics of cached and negatively cached collections and roles
+    """
+    if 'cache_entries' not in METRICS:
+        METRICS['cache_entries'] = Gauge('ansible_galaxy_exporter_cache_entries',
+                                         'Cached roles and collections', ['module'],
+                                         multiprocess_mode='livesum')
+        set_gauge_function(METRICS['cache_entries'].labels(module='collection'),
+                           lambda: len(COLLECTIONS))
+        set_gauge_function(METRICS['cache_entries'].labels(module='role'), lambda: len(ROLES))
+    if 'cache_evictions' not in METRICS:
+        METRICS['cache_evictions'] = Counter('ansible_galaxy_exporter_cache_evictions',
+                                             'Roles and collections evicted from cache',
+                                             ['module', 'reason'])
+    if 'cache_retained_bytes' not in METRICS:
+        METRICS['cache_retained_bytes'] = Gauge(
+            'ansible_galaxy_exporter_cache_retained_bytes',
+            'Estimated bytes of Ansible Galaxy data retained in cache', ['module'],
+            multiprocess_mode='livesum')
+        set_gauge_function(METRICS['cache_retained_bytes'].labels(module='collection'),
+                           COLLECTIONS.retained_bytes)
+        set_gauge_function(METRICS['cache_retained_bytes'].labels(module='role'),
+                           ROLES.retained_bytes)
+    if 'negative_cache' not in METRICS:
+        METRICS['negative_cache'] = NegativeCacheCollector()
+        REGISTRY.register(METRICS['negative_cache'])
+
+
+def setup_upstream_metrics() -> None:
+    """ Create the metrics of Ansible Galaxy calls and the rate limiter
+    """
+    if 'upstream_responses' not in METRICS:
+        METRICS['upstream_responses'] = Counter(
+            'ansible_galaxy_exporter_upstream_responses',
+            'Ansible Galaxy responses by HTTP status, 304 responses were not modified',
+            ['module', 'status'])
+        for module in ('collection', 'role'):
+            for status in ('200', '304'):
+                METRICS['upstream_responses'].labels(module=module, status=status)
+    if 'upstream_bytes' not in METRICS:
+        METRICS['upstream_bytes'] = Counter('ansible_galaxy_exporter_upstream_bytes',
+                                            'Bytes of Ansible Galaxy response bodies as '
+                                            'transferred, before decompression',
+                                            ['module'])
+        for module in ('collection', 'role'):
+            METRICS['upstream_bytes'].labels(module=module)
+    if 'upstream_attempts' not in METRICS:
+        METRICS['upstream_attempts'] = Histogram(
+            'ansible_galaxy_exporter_upstream_attempts',
+            'Attempts made per Ansible Galaxy fetch',
+            buckets=(1, 2, 3, 5, 8, 13))
+    if 'upstream_queue_depth' not in METRICS:
+        METRICS['upstream_queue_depth'] = Gauge(
+            'ansible_galaxy_exporter_upstream_queue_depth',
+            'Ansible Galaxy calls waiting for the rate limiter', multiprocess_mode='livesum')
+        set_gauge_function(METRICS['upstream_queue_depth'], lambda: RATE_LIMITER.waiting)
+    if 'upstream_rate' not in METRICS:
+        METRICS['upstream_rate'] = Gauge(
+            'ansible_galaxy_exporter_upstream_rate_limit',
+            'Ansible Galaxy calls allowed per second after adapting to throttling',
+            multiprocess_mode='liveall')
+        set_gauge_function(METRICS['upstream_rate'], lambda: RATE_LIMITER.current_rate)
+    if 'upstream_wait_seconds' not in METRICS:
+        METRICS['upstream_wait_seconds'] = Counter(
+            'ansible_galaxy_exporter_upstream_wait_seconds',
+            'Seconds Ansible Galaxy calls spent waiting for the rate limiter')
+    if 'upstream_throttled' not in METRICS:
+        METRICS['upstream_throttled'] = Counter(
+            'ansible_galaxy_exporter_upstream_throttled',
+            'Ansible Galaxy calls answered with 429 Too Many Requests')
+
+
+def setup_http_pool_metrics() -> None:
+    """ Create the metrics of the shared HTTP connection pool
+    """
+    if 'http_pool_limit' not in METRICS:
+        METRICS['http_pool_limit'] = Gauge('ansible_galaxy_exporter_http_pool_limit',
+                                           'Maximum connections per host in the HTTP pool',
+                                           multiprocess_mode='max')
+        METRICS['http_pool_limit'].set(HTTP_POOL_LIMIT_PER_HOST)
+    if 'http_pool_acquired' not in METRICS:
+        METRICS['http_pool_acquired'] = Gauge(
+            'ansible_galaxy_exporter_http_pool_acquired_connections',
+            'HTTP pool connections currently in use', multiprocess_mode='livesum')
+        set_gauge_function(METRICS['http_pool_acquired'], lambda: http_pool_usage()['acquired'])
+    if 'http_pool_idle' not in METRICS:
+        METRICS['http_pool_idle'] = Gauge(
+            'ansible_galaxy_exporter_http_pool_idle_connections',
+            'HTTP pool connections kept alive for reuse', multiprocess_mode='livesum')
+        set_gauge_function(METRICS['http_pool_idle'], lambda: http_pool_usage()['idle'])
+
+
+def update_base_metrics(increment: bool = False) -> dict:
+    """ Update this exporter's own Prometheus metrics, creating them when
+    first used
+
+    Args:
+        increment: Increment the count of total Ansible Galaxy API calls by one
+
+    Returns:
+        Dict containing base metrics
+    """
+    if 'http_pool_idle' not in METRICS:
+        setup_request_metrics()
+        setup_cache_metrics()
+        setup_upstream_metrics()
+        setup_http_pool_metrics()
     if increment:
         METRICS['api_call_count'].inc()
     return METRICS
 
 
+def inflight_refresh(module: str, name: str, refresh) -> asyncio.Future:
+    """ Start 'refresh' unless a refresh of the same target is already in
+    flight, in which case the in-flight refresh is returned instead
+
+    Args:
+        module: One of 'collection' or 'role'
+        name: The name of the collection or role
+        refresh: Coroutine function performing the refresh
+
+    Returns:
+        asyncio task of the target's in-flight refresh
+    """
+    key = (module, name)
+    task = INFLIGHT.get(key)
+    if task is not None and task.get_loop() is asyncio.get_event_loop():
+        update_base_metrics()['coalesced_requests'].labels(module=module).inc()
+        return task
+    task = asyncio.ensure_future(refresh())
+    INFLIGHT[key] = task
+
+    def forget(done):
+        if INFLIGHT.get(key) is done:
+            del INFLIGHT[key]
+    task.add_done_callback(forget)
+    return task
+
+
+async def single_flight(module: str, name: str, refresh) -> None:
+    """ Run 'refresh' unless a refresh of the same target is already in
+    flight, in which case wait for the in-flight refresh to finish instead
+
+    Args:
+        module: One of 'collection' or 'role'
+        name: The name of the collection or role
+        refresh: Coroutine function performing the refresh
+    """
+    task = inflight_refresh(module, name, refresh)
+    # Shield the shared refresh so a cancelled caller doesn't cancel the others
+    await asyncio.shield(task)
+
+
+def log_background_failure(task: asyncio.Future) -> None:
+    """ Log the exception of a background refresh nobody awaits
+
+    Args:
+        task: Finished asyncio task
+    """
+    if not task.cancelled() and task.exception() is not None:
+        fastapi_logger.error('Background refresh failed', exc_info=task.exception())
+
+
+async def refresh_shared(instance: GalaxyData, shared: SharedCache) -> None:
+    """ Refresh a collection or role through a 'SharedCache'. Data another
+    worker fetched recently is adopted, otherwise the worker holding the
+    lease fetches from Galaxy while the other workers wait for its data.
+    SQLite calls run in the default executor, a busy database doesn't block
+    the event loop
+
+    Args:
+        instance: 'Collection' or 'Role' instance
+        shared: 'SharedCache' of the workers, usually 'SHARED_CACHE'
+    """
+    import sqlite3  # pylint: disable=import-outside-toplevel
+    loop = asyncio.get_event_loop()
+    module = instance.labels['category']
+    # Leases outlive a fetch, even when it is retried until its deadline
+    lease_seconds = UPSTREAM_DEADLINE_SECONDS * 2 + 1
+
+    async def adopt() -> bool:
+        row = await loop.run_in_executor(None, shared.lookup, module, instance.name)
+        return shared.apply(instance, row, CACHE_SECONDS)
+
+    async def acquire() -> bool:
+        return await loop.run_in_executor(None, shared.acquire, module, instance.name,
+                                          lease_seconds)
+    try:
+        if await adopt():
+            return
+        give_up = time.monotonic() + lease_seconds
+        leased = await acquire()
+        while not leased and time.monotonic() < give_up:
+            await asyncio.sleep(0.05)
+            if await adopt():
+                return
+            leased = await acquire()
+    except sqlite3.Error:
+        fastapi_logger.exception('Shared cache %s is unavailable', shared.path)
+        await instance.refresh()
+        return
+    try:
+        last_update = instance.last_update
+        await instance.refresh()
+        if instance.last_update != last_update:
+            await loop.run_in_executor(None, shared.store, instance)
+    except sqlite3.Error:
+        fastapi_logger.exception('Unable to share %s %s', module, instance.name)
+    finally:
+        if leased:
+            try:
+                await loop.run_in_executor(None, shared.release, module, instance.name)
+            except sqlite3.Error:
+                fastapi_logger.exception('Unable to release lease of %s %s', module,
+                                         instance.name)
+
+
+def unavailable_error(instance: GalaxyData) -> HTTPException:
+    """ Error returned for a collection or role without usable data
+
+    Args:
+        instance: 'Collection' or 'Role' instance
+
+    Returns:
+        'HTTPException', 404 when Galaxy doesn't know the collection or role,
+        otherwise 502
+    """
+    module = instance.labels['category']
+    if instance.failure == 'not_found':
+        return HTTPException(status_code=404,
+                             detail=f'Unknown {module} {instance.name}')
+    return HTTPException(status_code=502,
+                         detail=f'Unable to fetch {module} {instance.name} from Ansible Galaxy')
+
+
+async def get_galaxy_data(cache: TargetCache, cls, name: str):
+    """ Fetch a cached collection or role instance, refreshing its data from
+    Galaxy when the cache is out of date. When 'STALE_WHILE_REVALIDATE' is
+    enabled, expired data is returned immediately and refreshed in the
+    background, only first-ever lookups wait for Galaxy. When refreshing
+    fails, the last data is returned for up to 'MAX_STALENESS_SECONDS'
+
+    Args:
+        cache: 'TargetCache' of instances, either 'COLLECTIONS' or 'ROLES'
+        cls: Class of the cached instances, either 'Collection' or 'Role'
+        name: The name of a collection or role, in author.project format
+
+    Returns:
+        A 'cls' class instance
+
+    Raises:
+        HTTPException: When the collection or role has no data, immediately
+        while the collection or role is negatively cached. 422 when 'name'
+        isn't in author.project format
+    """
+    if not valid_target(cache.module, name):
+        raise HTTPException(status_code=422,
+                            detail=f'Invalid {cache.module} {name}, names are in '
+                            'author.project format')
+    metrics = update_base_metrics()
+    instance = cache.get(name)
+    if instance is None:
+        instance = cls(name)
+        cache[name] = instance
+    module = instance.labels['category']
+    if instance.negative_cache_remaining():
+        metrics['cache_hits'].labels(module=module).inc()
+        raise unavailable_error(instance)
+    # After a failed refresh, the last data is served until Galaxy is retried
+    if instance.needs_update() and not instance.failure_remaining():
+        if SHARED_CACHE is None:
+            refresh = instance.refresh
+        else:
+            refresh = functools.partial(refresh_shared, instance, SHARED_CACHE)
+        if STALE_WHILE_REVALIDATE and instance.is_usable():
+            metrics['cache_hits'].labels(module=module).inc()
+            inflight_refresh(module, name, refresh).add_done_callback(log_background_failure)
+        else:
+            metrics['cache_misses'].labels(module=module).inc()
+            await single_flight(module, name, refresh)
+    else:
+        metrics['cache_hits'].labels(module=module).inc()
+    if not instance.is_usable():
+        raise unavailable_error(instance)
+    return instance
+
+
+async def get_namespace(namespace_name: str) -> Namespace:
+    """ Fetch the roles and collections of a namespace, refreshing them from
+    Galaxy when the listing is older than 'NAMESPACE_CACHE_SECONDS'. When
+    refreshing fails, the previous listing is returned and Galaxy isn't asked
+    again until 'FAILED_CACHE_SECONDS' pass
+
+    Args:
+        namespace_name: The name of a namespace, ie: 'mesaguy'
+
+    Returns:
+        A 'Namespace' class instance
+
+    Raises:
+        HTTPException: When the namespace couldn't be listed. 422 when
+        'namespace_name' isn't a valid namespace name
+    """
+    if not valid_target('namespace', namespace_name):
+        raise HTTPException(status_code=422,
+                            detail=f'Invalid namespace {namespace_name}, names are '
+                            'letters, digits, underscores and hyphens')
+    namespace = NAMESPACES.get(namespace_name)
+    if namespace is None:
+        namespace = Namespace(namespace_name)
+        NAMESPACES[namespace_name] = namespace
+    if namespace.needs_update() and not namespace.failure_remaining():
+        await single_flight('namespace', namespace_name, namespace.refresh)
+    if not namespace.is_usable():
+        if namespace.failure == 'not_found':
+            raise HTTPException(status_code=404, detail=f'Unknown namespace {namespace_name}')
+        raise HTTPException(status_code=502, detail=f'Unable to list namespace '
+                            f'{namespace_name} from Ansible Galaxy')
+    return namespace
+
+
 async def get_collection(collection_name: str) -> Collection:
     """ Fetch collection information and populate a Collection instance
 
@@ -732,14 +2905,7 @@ async def get_collection(collection_name: str) -> Collection:
     Returns:
         A 'Collection' class instance
     """
-    update_base_metrics(increment=True)
-    if collection_name not in COLLECTIONS:
-        COLLECTIONS[collection_name] = Collection(collection_name)
-    collection = COLLECTIONS[collection_name]
-    if collection.needs_update():
-        data = await collection.update()
-        collection.data = data
-    return collection
+    return await get_galaxy_data(COLLECTIONS, Collection, collection_name)
 
 
 async def get_role(role_name: str) -> Role:
@@ -751,11 +2917,4 @@ async def get_role(role_name: str) -> Role:
     Returns:
         A 'Role' class instance
     """
-    update_base_metrics(increment=True)
-    if role_name not in ROLES:
-        ROLES[role_name] = Role(role_name)
-    role = ROLES[role_name]
-    if role.needs_update():
-        data = await role.update()
-        role.data = data['data']['repository']
-    return role
+    return await get_galaxy_data(ROLES, Role, role_name)
@@ -0,0 +1,115 @@
+""" HTML pages of galaxy-exporter
+"""
+
+from galaxy_exporter import __version__
+
+# Root Collection HTML page
+COLLECTION_HTML = """<html>
+    <head>
+        <title>Ansible Galaxy collection {collection_name} statistics index</title>
+    </head>
+    <body>
+        <p>
+            <a href="/collection/{collection_name}/metrics">Prometheus Metrics for {collection_name}</a>
+        </p>
+        <p>
+            Simple metrics for {collection_name}
+            <ul>
+                <li>Raw <a href="/collection/{collection_name}/community_score">Community score </a> count</li>
+                <li>Raw <a href="/collection/{collection_name}/community_surveys">Community surveys</a> count</li>
+                <li>Raw <a href="/collection/{collection_name}/created">Created </a> epoch format datetime</li>
+                <li>Raw <a href="/collection/{collection_name}/dependencies">Dependencies </a> count</li>
+                <li>Raw <a href="/collection/{collection_name}/downloads">Download </a> count</li>
+                <li>Raw <a href="/collection/{collection_name}/modified">Modified </a> epoch format datetime</li>
+                <li>Raw <a href="/collection/{collection_name}/quality_score">Quality score </a> count</li>
+                <li>Raw <a href="/collection/{collection_name}/version">Version </a> current version</li>
+                <li>Raw <a href="/collection/{collection_name}/versions">Versions </a> count</li>
+            </ul>
+        </p>
+    </body>
+</html>
+"""
+# Root Role HTML page
+ROLE_HTML = """<html>
+    <head>
+        <title>Ansible Galaxy role {role_name} statistics index</title>
+    </head>
+    <body>
+        <p>
+            <a href="/role/{role_name}/metrics">Prometheus Metrics for {role_name}</a>
+        </p>
+        <p>
+            Simple metrics for {role_name}
+            <ul>
+                <li>Raw <a href="/role/{role_name}/community_score">Community score </a> count</li>
+                <li>Raw <a href="/role/{role_name}/community_surveys">Community surveys</a> count</li>
+                <li>Raw <a href="/role/{role_name}/created">Created </a> epoch format datetime</li>
+                <li>Raw <a href="/role/{role_name}/downloads">Download </a> count</li>
+                <li>Raw <a href="/role/{role_name}/forks">Forks </a> count</li>
+                <li>Raw <a href="/role/{role_name}/imported">Imported </a> epoch format datetime</li>
+                <li>Raw <a href="/role/{role_name}/modified">Modified </a> epoch format datetime</li>
+                <li>Raw <a href="/role/{role_name}/open_issues">Open Issues </a> count</li>
+                <li>Raw <a href="/role/{role_name}/quality_score">Quality score </a> count</li>
+                <li>Raw <a href="/role/{role_name}/stars">Star </a> count</li>
+                <li>Raw <a href="/role/{role_name}/version">Version </a> current version</li>
+                <li>Raw <a href="/role/{role_name}/versions">Versions </a> count</li>
+                <li>Raw <a href="/role/{role_name}/watchers">Watcher </a> count</li>
+            </ul>
+        </p>
+    </body>
+</html>
+"""
+# Index HTML page
+ROOT_HTML = f"""<html>
+    <head>
+        <title>Ansible Galaxy Exporter v{__version__} statistics index</title>
+    </head>
+    <body>
+        <h1>Usage</h1>
+        <p>
+            <a href="/metrics">Prometheus exporter process metrics</a>
+        </p>
+        <p>
+        All role and collection names must be in the format for AUTHOR.ROLE or AUTHOR.COLLECTION
+        </p>
+        <p>
+            Go to /role/ROLE_NAME/metrics for Prometheus Metrics
+        </p>
+        <p>
+            For simple metrics, go to:
+            <ul>
+                <li>/role/ROLE_NAME/community_score for a raw community score count</li>
+                <li>/role/ROLE_NAME/community_surveys for a raw community survey count</li>
+                <li>/role/ROLE_NAME/created for a raw created datetime in epoch format</li>
+                <li>/role/ROLE_NAME/downloads for a raw download count</li>
+                <li>/role/ROLE_NAME/forks for a raw forks count</li>
+                <li>/role/ROLE_NAME/imported for a raw imported datetime in epoch format</li>
+                <li>/role/ROLE_NAME/modified for a raw modified datetime in epoch format</li>
+                <li>/role/ROLE_NAME/open_issues for a raw open issues count</li>
+                <li>/role/ROLE_NAME/quality_score for a raw quality score count</li>
+                <li>/role/ROLE_NAME/stars for a raw stars count</li>
+                <li>/role/ROLE_NAME/version for a raw version number</li>
+                <li>/role/ROLE_NAME/versions for a raw version count</li>
+                <li>/role/ROLE_NAME/watchers for a raw watcher count</li>
+            </ul>
+        </p>
+        <p>
+            Go to /role/COLLECTION_NAME/metrics for Prometheus Metrics
+        </p>
+        <p>
+            For simple metrics, go to:
+            <ul>
+                <li>/role/COLLECTION_NAME/community_score for a raw community score count</li>
+                <li>/role/COLLECTION_NAME/community_surveys for a raw community survey count</li>
+                <li>/role/COLLECTION_NAME/created for a raw created datetime in epoch format</li>
+                <li>/role/COLLECTION_NAME/dependencies for a raw dependency count</li>
+                <li>/role/COLLECTION_NAME/downloads for a raw download count</li>
+                <li>/role/COLLECTION_NAME/modified for a raw modified datetime in epoch format</li>
+                <li>/role/COLLECTION_NAME/quality_score for a raw quality score count</li>
+                <li>/role/COLLECTION_NAME/version for a raw version number</li>
+                <li>/role/COLLECTION_NAME/versions for a raw version count</li>
+            </ul>
+        </p>
+    </body>
+</html>
+"""
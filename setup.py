@@ -40,15 +40,27 @@ setup(
     author_email="mesaguy@mesaguy.com",
     name=__myname__,
     description=__description__,
+    extras_require={
+        # Reading YAML targets files
+        "yaml": ["PyYAML"],
+    },
+    entry_points={
+        "console_scripts": [
+            "galaxy-exporter=galaxy_exporter.__main__:main",
+        ],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
     long_description=LONG_DESCRIPTION,
     long_description_content_type="text/markdown",
     packages=find_packages(),
-    python_requires=">=3.6",
+    python_requires=">=3.7",
     url="https://github.com/mesaguy/galaxy-exporter",
     version=__version__,
 )
@@ -1,20 +1,75 @@
+import asyncio
 from http.client import HTTPConnection
+import os
 import pytest
 from pytest_docker_tools import build, container
 import testinfra
 from fastapi.testclient import TestClient
 
 
-from galaxy_exporter.galaxy_exporter import app
+from galaxy_exporter.galaxy_exporter import FetchResult, app
 
 
 TEST_COLLECTION = 'community.kubernetes'
 TEST_ROLE = 'mesaguy.prometheus'
 
+FILES = os.path.join(os.path.dirname(__file__), 'files')
+
 
 client = TestClient(app)
 
 
+def read_file(name, mode='r'):
+    """ Contents of a sample file in 'tests/files' """
+    with open(os.path.join(FILES, name), mode) as source:
+        return source.read()
+
+
+def fake_fetch(calls=None, body=None, status=200, headers=None, delay=0.0, concurrency=None,
+               sent_headers=None):
+    """ Replacement of 'fetch_from_url' answering every request alike
+
+    Args:
+        calls (list): Appended the instance of every request
+        body (str or bytes): Response body, the sample role or collection
+            response matching the request's job when None
+        status (int): HTTP status of responses, None fails every request
+        headers (dict): Response headers. Requests with an 'If-None-Match'
+            header matching their 'ETag' are answered with 304
+        delay (float): Seconds each request takes
+        concurrency (list): Appended the number of requests in progress
+            when each request starts
+        sent_headers (list): Appended the headers of every request
+    """
+    response_headers = dict(headers or {})
+    active = list()
+
+    async def fetch(url, job, instance, headers=None, **kwargs):
+        if calls is not None:
+            calls.append(instance)
+        if sent_headers is not None:
+            sent_headers.append(dict(headers or {}))
+        active.append(instance)
+        if concurrency is not None:
+            concurrency.append(len(active))
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            active.remove(instance)
+        if status is None:
+            return None
+        if headers and 'ETag' in response_headers and \
+                headers.get('If-None-Match') == response_headers['ETag']:
+            return FetchResult(304, b'', dict(response_headers))
+        content = body
+        if content is None:
+            content = read_file('role.json' if job == 'Role' else 'collection.json')
+        if isinstance(content, str):
+            content = content.encode()
+        return FetchResult(status, content, dict(response_headers))
+    return fetch
+
+
 galaxy_exporter_image = build(
     nocache=False,
     scope='session',
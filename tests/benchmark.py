@@ -0,0 +1,150 @@
+""" Load benchmark of galaxy-exporter's /probe endpoint against a fake Ansible
+Galaxy. Each target is probed twice, first with an empty cache, then with a
+warm cache. Run directly for any number of targets:
+
+    python -m tests.benchmark --targets 10000 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import resource
+import time
+import uuid
+from typing import Dict, List
+from urllib.parse import urlencode
+
+
+import galaxy_exporter.galaxy_exporter
+from tests.fake_galaxy import FakeGalaxy
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def peak_rss() -> int:
+    """ Peak resident set size of this process in bytes """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ASGIClient:
+    """ Calls an ASGI application in process, without a network server """
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def get(self, path: str, params: dict) -> int:
+        """ Status code of a GET request to 'path' """
+        scope = dict(type='http', asgi=dict(version='3.0'), http_version='1.1',
+                     method='GET', scheme='http', path=path, raw_path=path.encode(),
+                     query_string=urlencode(params).encode(), root_path='',
+                     headers=[(b'host', b'exporter')], client=('127.0.0.1', 0),
+                     server=('exporter', 80))
+        status = 0
+        done = asyncio.Event()
+        requested = False
+
+        async def receive() -> dict:
+            nonlocal requested
+            if not requested:
+                requested = True
+                return dict(type='http.request', body=b'', more_body=False)
+            await done.wait()
+            return dict(type='http.disconnect')
+
+        async def send(message: dict) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                done.set()
+        await self.app(scope, receive, send)
+        done.set()
+        return status
+
+
+async def probe_round(client: ASGIClient, targets: List[tuple], concurrency: int,
+                      galaxy: FakeGalaxy) -> Dict[str, float]:
+    """ Probe every target once, at most 'concurrency' at a time """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+    calls_before = galaxy.calls
+
+    async def probe(module: str, name: str) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            status = await client.get('/probe', params=dict(module=module, target=name))
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+    started = time.perf_counter()
+    await asyncio.gather(*[probe(module, name) for module, name in targets])
+    elapsed = time.perf_counter() - started
+    return dict(p50=percentile(latencies, 0.5), p99=percentile(latencies, 0.99),
+                rps=len(targets) / elapsed, upstream_calls=galaxy.calls - calls_before,
+                errors=errors, rss=peak_rss())
+
+
+async def run_benchmark(targets: int, concurrency: int = 50, latency: float = 0.01,
+                        error_rate: float = 0.0, payload_size=None) -> Dict[str, dict]:
+    """ Probe 'targets' roles and collections, half of each, with an empty
+    and then a warm cache. Galaxy calls are neither rate limited nor
+    retried for long during the benchmark
+
+    Returns:
+        dict mapping 'cold' and 'warm' to the statistics of each round
+    """
+    module = galaxy_exporter.galaxy_exporter
+    prefix = uuid.uuid4().hex[:8]
+    pairs = [('role' if number % 2 else 'collection', f'bench{prefix}.target{number}')
+             for number in range(targets)]
+    saved = dict(GALAXY_URL=module.GALAXY_URL, RATE_LIMITER=module.RATE_LIMITER,
+                 UPSTREAM_DEADLINE_SECONDS=module.UPSTREAM_DEADLINE_SECONDS)
+    with FakeGalaxy(latency=latency, error_rate=error_rate, payload_size=payload_size) as galaxy:
+        module.GALAXY_URL = galaxy.url
+        module.RATE_LIMITER = module.RateLimiter(rate=0, burst=1, concurrency=concurrency)
+        module.UPSTREAM_DEADLINE_SECONDS = 1
+        try:
+            client = ASGIClient(module.app)
+            cold = await probe_round(client, pairs, concurrency, galaxy)
+            warm = await probe_round(client, pairs, concurrency, galaxy)
+        finally:
+            await module.close_http_session()
+            for name, value in saved.items():
+                setattr(module, name, value)
+            for cache in (module.COLLECTIONS, module.ROLES):
+                for name in cache:
+                    if name.startswith(f'bench{prefix}.'):
+                        del cache[name]
+    return dict(cold=cold, warm=warm)
+
+
+def format_report(targets: int, report: Dict[str, dict]) -> str:
+    lines = [f'{"targets":>8} {"round":>5} {"p50 ms":>8} {"p99 ms":>8} {"req/s":>8} '
+             f'{"upstream":>8} {"errors":>6} {"RSS MiB":>8}']
+    for name, stats in report.items():
+        lines.append(f'{targets:>8} {name:>5} {stats["p50"] * 1000:>8.2f} '
+                     f'{stats["p99"] * 1000:>8.2f} {stats["rps"]:>8.0f} '
+                     f'{stats["upstream_calls"]:>8} {stats["errors"]:>6} '
+                     f'{stats["rss"] / 1048576:>8.1f}')
+    return '\n'.join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--targets', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--payload-size', type=int, default=None)
+    args = parser.parse_args()
+    for targets in args.targets:
+        report = asyncio.run(run_benchmark(targets, args.concurrency, args.latency,
+                                           args.error_rate, args.payload_size))
+        print(format_report(targets, report))
+
+
+if __name__ == '__main__':
+    main()
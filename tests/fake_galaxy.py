@@ -0,0 +1,163 @@
+""" Stand-in for the Ansible Galaxy API endpoints used by galaxy-exporter,
+serving synthetic roles and collections
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import zlib
+from typing import Optional
+
+
+from aiohttp import web
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from tests import read_file
+
+
+class FakeGalaxy:
+    """Fake Ansible Galaxy server running in a background thread. Roles and
+    collections named 'missing' don't exist, every other name is answered
+    with synthetic data derived from the name
+
+    Args:
+        latency (float): Seconds each response is delayed
+        error_rate (float): Fraction of requests answered with a 503 error
+        payload_size (int): Number of versions in each response, adding
+            roughly 150 bytes per role version and 20 bytes per collection
+            version. The sample responses' versions are kept when None
+        seed (int): Seed of the random error selection
+
+    Attributes:
+        calls (int): Number of requests received
+        namespaces (dict): Maps namespace names to dicts of their
+            'collection' and 'repository' (role) names. Unlisted namespaces
+            don't exist
+        url (str): Base URL of the server, set once started
+    """
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0,
+                 payload_size: Optional[int] = None, seed: int = 0) -> None:
+        self.namespaces: dict = dict()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.payload_size = payload_size
+        self.calls = 0
+        self.url: Optional[str] = None
+        self._random = random.Random(seed)
+        self._role_template = read_file('role.json')
+        self._collection_template = read_file('collection.json')
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def role(self, namespace: str, name: str) -> dict:
+        """ Synthetic role repository detail """
+        data = json.loads(self._role_template)
+        repository = data['data']['repository']
+        repository['name'] = name
+        repository['download_count'] = zlib.crc32(f'{namespace}.{name}'.encode()) % 100000
+        repository['stargazers_count'] = len(name)
+        versions = repository['summary_fields']['versions']
+        if self.payload_size is not None:
+            repository['summary_fields']['versions'] = \
+                [dict(versions[0], name=f'{number}.0.0') for number in range(self.payload_size)]
+        return data
+
+    def collection(self, namespace: str, name: str) -> dict:
+        """ Synthetic collection detail """
+        data = json.loads(self._collection_template)
+        data['name'] = name
+        data['download_count'] = zlib.crc32(f'{namespace}.{name}'.encode()) % 100000
+        if self.payload_size is not None:
+            data['all_versions'] = [dict(data['all_versions'][0], version=f'{number}.0.0')
+                                    for number in range(self.payload_size)]
+        return data
+
+    def namespace(self, namespace: str, page: int, page_size: int) -> dict:
+        """ Page of a namespace's collections and roles """
+        start = (page - 1) * page_size
+        return {kind: dict(count=len(names),
+                           results=[dict(name=name) for name in names[start:start + page_size]])
+                for kind, names in self.namespaces[namespace].items()}
+
+    async def respond(self, name: str, build, *args) -> web.Response:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._random.random() < self.error_rate:
+            return web.Response(status=503, text='Service Unavailable')
+        if name == 'missing':
+            return web.json_response(dict(detail='Not found.'), status=404)
+        return web.json_response(build(*args))
+
+    async def handle_role(self, request: web.Request) -> web.Response:
+        namespace = request.query.get('namespace', '')
+        name = request.query.get('name', '')
+        return await self.respond(name, self.role, namespace, name)
+
+    async def handle_collection(self, request: web.Request) -> web.Response:
+        namespace = request.match_info['namespace']
+        name = request.match_info['name']
+        return await self.respond(name, self.collection, namespace, name)
+
+    async def handle_namespace(self, request: web.Request) -> web.Response:
+        namespace = request.query.get('namespace', '')
+        page = int(request.query.get('page', 1))
+        page_size = int(request.query.get('page_size', 10))
+        name = namespace if namespace in self.namespaces else 'missing'
+        return await self.respond(name, self.namespace, namespace, page, page_size)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/api/internal/ui/repo-or-collection-detail/', self.handle_role)
+        app.router.add_get('/api/internal/ui/repo-or-collection/', self.handle_namespace)
+        app.router.add_get('/api/internal/ui/collections/{namespace}/{name}/',
+                           self.handle_collection)
+        return app
+
+    def start(self) -> 'FakeGalaxy':
+        """ Start serving on a free local port """
+        started = threading.Event()
+
+        def run() -> None:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            runner = web.AppRunner(self.app(), access_log=None)
+            loop.run_until_complete(runner.setup())
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            loop.run_until_complete(site.start())
+            port = runner.addresses[0][1]
+            self.url = f'http://127.0.0.1:{port}'
+            self._loop = loop
+            started.set()
+            loop.run_forever()
+            loop.run_until_complete(runner.cleanup())
+            loop.close()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self) -> None:
+        """ Stop serving """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self) -> 'FakeGalaxy':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+@pytest.fixture
+def fake_galaxy(monkeypatch):
+    """ Fake Ansible Galaxy used by galaxy-exporter during a test """
+    with FakeGalaxy() as galaxy:
+        monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'GALAXY_URL', galaxy.url)
+        yield galaxy
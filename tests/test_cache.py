@@ -1,11 +1,12 @@
 import importlib
 import os
-import time
+from datetime import timedelta
 
 import galaxy_exporter.galaxy_exporter
 
 
 from tests import TEST_ROLE, client
+from tests.fake_galaxy import fake_galaxy  # noqa: F401
 
 
 def test_cacheseconds_env_parameter(monkeypatch):
@@ -23,7 +24,7 @@ def test_cacheseconds_env_parameter(monkeypatch):
     assert galaxy_exporter.galaxy_exporter.CACHE_SECONDS == 888
 
 
-def test_role_metrics_cache():
+def test_role_metrics_cache(fake_galaxy):  # noqa: F811
     response = client.get(f'/role/{TEST_ROLE}/metrics')
     assert response.status_code == 200
     print(f'Roles: {galaxy_exporter.galaxy_exporter.ROLES}')
@@ -33,8 +34,8 @@ def test_role_metrics_cache():
     # No update necessary, default CACHE_SECONDS is 15s
     assert role.needs_update() is False
 
-    # Sleep to make testing cache expiration times possible
-    time.sleep(2.1)
+    # Age the cached role to make testing cache expiration times possible
+    role.last_update -= timedelta(seconds=2.1)
 
     # If cache expires after 1s, an update is now needed
     assert role.needs_update(cache_seconds=1) is True
@@ -14,6 +14,7 @@ from galaxy_exporter.galaxy_exporter import app, update_base_metrics
 from galaxy_exporter.galaxy_exporter import Collection, set_collection_metrics
 import tests
 from tests import TEST_COLLECTION, client
+from tests.fake_galaxy import fake_galaxy  # noqa: F401
 
 
 @pytest.mark.asyncio
@@ -66,19 +67,22 @@ def check_collection_response(response):
                      response.text.strip('\n'))
 
 
-def test_collection_metrics_api_count_increments():
+def test_collection_metrics_api_count_increments(fake_galaxy):  # noqa: F811
     update_base_metrics()
+    # Only Ansible Galaxy calls are counted, ensure the collection isn't cached
+    if TEST_COLLECTION in galaxy_exporter.galaxy_exporter.COLLECTIONS:
+        del galaxy_exporter.galaxy_exporter.COLLECTIONS[TEST_COLLECTION]
     count_before = galaxy_exporter.galaxy_exporter.METRICS['api_call_count']._value.get()
     response = client.get(f'/collection/{TEST_COLLECTION}/metrics')
     print(f'Response collection metrics text:\n{response.text}')
     assert response.status_code == 200
-    assert len(response.text.split('\n')) == 28
+    assert len(response.text.split('\n')) == 34
     check_collection_response(response)
     # Ensure the API count has increased by 1
     assert galaxy_exporter.galaxy_exporter.METRICS['api_call_count']._value.get() - count_before == 1
 
 
-def test_collection_metrics():
+def test_collection_metrics(fake_galaxy):  # noqa: F811
     update_base_metrics()
     response = client.get(f'/collection/{TEST_COLLECTION}/metrics')
     print(f'Response collection metrics text:\n{response.text}')
@@ -87,7 +91,7 @@ def test_collection_metrics():
     print(f'Response collection metrics text:\n{response.text}')
 
 
-def test_collection_metrics_equal_probe_collection_metrics():
+def test_collection_metrics_equal_probe_collection_metrics(fake_galaxy):  # noqa: F811
     update_base_metrics()
     response1 = client.get(f'/collection/{TEST_COLLECTION}/metrics')
     print(f'Response collection metrics text:\n{response1.text}')
@@ -1,4 +1,11 @@
+import pytest
+
+
 from tests import TEST_COLLECTION, client
+from tests.fake_galaxy import fake_galaxy  # noqa: F401
+
+
+pytestmark = pytest.mark.usefixtures('fake_galaxy')
 
 
 def test_collection_community_score():
@@ -0,0 +1,90 @@
+import json
+import tracemalloc
+
+
+from prometheus_client import CollectorRegistry, Gauge, Info
+from prometheus_client.exposition import generate_latest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import GalaxyCollector, Role, set_role_metrics
+from tests import read_file
+
+
+TARGETS = 300
+
+
+def role_data():
+    return json.loads(read_file('role.json'))['data']['repository']
+
+
+def registry_per_target(name, data):
+    # How metrics were stored before 'GalaxyCollector', one registry and one
+    # metric instance per metric for every target
+    role = Role(name)
+    role.data = data
+    set_role_metrics(role)
+    registry = CollectorRegistry()
+    for key, spec in role.metrics.items():
+        if spec.live:
+            continue
+        if spec.kind == 'info':
+            Info(spec.name, spec.documentation, role.labels.keys(), registry=registry)\
+                .labels(**role.labels).info({'version': role.values[key]})
+        else:
+            Gauge(spec.name, spec.documentation, role.labels.keys(), registry=registry)\
+                .labels(**role.labels).set(role.values[key])
+    role.values = None
+    return role, registry
+
+
+def collector_per_target(name, data):
+    role = Role(name)
+    role.data = data
+    set_role_metrics(role)
+    return role
+
+
+def allocated(factory):
+    data = role_data()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    targets = [factory(f'memory.role{index}', data) for index in range(TARGETS)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del targets
+    return size
+
+
+def test_collector_memory_comparison():
+    registry_bytes = allocated(registry_per_target)
+    collector_bytes = allocated(collector_per_target)
+    print(f'{TARGETS} targets: {registry_bytes} bytes with a registry per target, '
+          f'{collector_bytes} bytes with a shared collector')
+    assert collector_bytes * 4 < registry_bytes
+
+
+def test_collector_merges_targets():
+    data = role_data()
+    roles = [collector_per_target(f'merged.role{index}', data) for index in range(3)]
+    text = generate_latest(registry=GalaxyCollector(roles)).decode()
+    assert text.count('# HELP ansible_galaxy_role_stars ') == 1
+    for index in range(3):
+        assert f'ansible_galaxy_role_stars{{category="role",maintainer="merged",' \
+            f'project="role{index}"}} 22.0' in text
+    # Registered collectors serve every target from a single registry
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(GalaxyCollector(lambda: roles))
+    assert generate_latest(registry=registry).decode() == text
+
+
+def test_collector_live_metrics(monkeypatch):
+    role = collector_per_target('live.role', role_data())
+    assert 'data_age_seconds' not in generate_latest(registry=GalaxyCollector([role])).decode()
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'STALE_WHILE_REVALIDATE', True)
+    live = generate_latest(registry=GalaxyCollector([role], live=True)).decode()
+    assert live.startswith('# HELP ansible_galaxy_role_data_age_seconds ')
+    assert 'ansible_galaxy_role_stars' not in live
+    assert 'data_age_seconds' not in \
+        generate_latest(registry=GalaxyCollector([role], live=False)).decode()
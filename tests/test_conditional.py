@@ -0,0 +1,70 @@
+import asyncio
+import gzip
+
+
+from aiohttp import web
+from aiohttp import test_utils
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import Role, fetch_from_url, transferred_bytes
+from galaxy_exporter.galaxy_exporter import update_base_metrics
+from tests import fake_fetch, read_file
+
+
+def test_not_modified_keeps_data(monkeypatch):
+    """ A 304 response only extends the age of the cached data """
+    requests = list()
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(headers={'ETag': '"v1"',
+                                            'Last-Modified': 'Wed, 01 Jan 2025 00:00:00 GMT'},
+                                   sent_headers=requests))
+    metrics = update_base_metrics()
+    not_modified = metrics['upstream_responses'].labels(module='role', status='304')
+    transferred = metrics['upstream_bytes'].labels(module='role')
+    before_304 = not_modified._value.get()
+    before_bytes = transferred._value.get()
+
+    role = Role('mesaguy.prometheus')
+    asyncio.run(role.refresh())
+    assert requests[0] == dict()
+    assert role.etag == '"v1"'
+    data, digest, updated = role.data, role.digest, role.last_update
+    assert transferred._value.get() - before_bytes == len(read_file('role.json').encode())
+
+    def fail_decode(body):
+        raise AssertionError('a 304 response must not be decoded')
+    monkeypatch.setattr(role, 'decode', fail_decode)
+    asyncio.run(role.refresh())
+    assert requests[1] == {'If-None-Match': '"v1"',
+                           'If-Modified-Since': 'Wed, 01 Jan 2025 00:00:00 GMT'}
+    assert role.data is data
+    assert role.digest == digest
+    assert role.last_update > updated
+    assert not_modified._value.get() - before_304 == 1
+
+
+def test_transferred_bytes_are_compressed_size():
+    """ Compressed responses count the bytes received, not the decompressed body """
+    body = read_file('role.json', 'rb')
+    compressed = gzip.compress(body)
+
+    async def handler(request):
+        return web.Response(body=compressed, headers={'Content-Encoding': 'gzip'},
+                            content_type='application/json')
+
+    async def main():
+        app = web.Application()
+        app.router.add_get('/', handler)
+        server = test_utils.TestServer(app)
+        await server.start_server()
+        try:
+            return await fetch_from_url(str(server.make_url('/')), 'Role', 'test.test')
+        finally:
+            await server.close()
+            await galaxy_exporter.galaxy_exporter.close_http_session()
+    result = asyncio.run(main())
+    assert result.body == body
+    assert transferred_bytes(result) == len(compressed) < len(body)
+    # Without a length the body's size is counted
+    assert transferred_bytes(result._replace(headers={})) == len(body)
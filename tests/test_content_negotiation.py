@@ -0,0 +1,80 @@
+import zlib
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import gzip_accepted, gzip_finish
+from tests import client, fake_fetch
+
+
+OPENMETRICS = {'Accept': 'application/openmetrics-text; version=1.0.0',
+               'Accept-Encoding': 'identity'}
+TEXT = {'Accept': 'text/plain', 'Accept-Encoding': 'identity'}
+GZIP = {'Accept': 'text/plain', 'Accept-Encoding': 'gzip'}
+
+
+def test_openmetrics(monkeypatch):
+    """ OpenMetrics is returned when requested """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch())
+    response = client.get('/probe?module=role&target=negotiate.openmetrics',
+                          headers=OPENMETRICS)
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/openmetrics-text')
+    assert 'content-encoding' not in response.headers
+    assert 'ansible_galaxy_role_refresh_failures_total{category="role",' \
+        'maintainer="negotiate",project="openmetrics"} 0.0\n' in response.text
+    # The end marker follows the live metrics, only once
+    assert response.text.endswith('# EOF\n')
+    assert response.text.count('# EOF') == 1
+
+    response = client.get('/probe?module=role&target=negotiate.openmetrics', headers=TEXT)
+    assert response.headers['content-type'].startswith('text/plain; version=')
+    assert '# EOF' not in response.text
+
+
+def test_gzip_accepted():
+    """ Gzip is used when 'Accept-Encoding' allows it """
+    assert gzip_accepted('gzip')
+    assert gzip_accepted('br, GZIP;q=0.5')
+    assert not gzip_accepted('')
+    assert not gzip_accepted('identity, deflate')
+    assert not gzip_accepted('gzip;q=0')
+    assert not gzip_accepted('gzip;q=0.0, br')
+    assert not gzip_accepted('gzip;q=high')
+
+
+def test_gzip_is_cached(monkeypatch):
+    """ Gzip compressed responses are cached per target """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch())
+    text = client.get('/probe?module=role&target=negotiate.gzip', headers=TEXT).text
+    response = client.get('/probe?module=role&target=negotiate.gzip', headers=GZIP)
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.num_bytes_downloaded < len(response.content)
+    assert response.text == text
+
+    role = galaxy_exporter.galaxy_exporter.ROLES['negotiate.gzip']
+    prefix = role.gzip_expositions[response.headers['content-type']]
+    response = client.get('/role/negotiate.gzip/metrics', headers=GZIP)
+    assert response.text == text
+    assert role.gzip_expositions[response.headers['content-type']] is prefix
+    # Responses are a single gzip member, readable by any gzip decoder
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    body = gzip_finish(prefix, b'live\n')
+    assert decompressor.decompress(body) == text.encode()[:prefix.size] + b'live\n'
+    assert decompressor.eof and decompressor.unused_data == b''
+
+
+def test_gzip_batch_and_targets(monkeypatch):
+    """ Batch and all-targets responses are compressed and in OpenMetrics """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch())
+    headers = dict(OPENMETRICS, **{'Accept-Encoding': 'gzip'})
+    for url in ('/probe/batch?target=role:negotiate.batch', '/metrics/targets'):
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        assert response.headers['content-encoding'] == 'gzip'
+        assert 'ansible_galaxy_role_stars{category="role",maintainer="negotiate",' \
+            'project="batch"} 22.0\n' in response.text
+        assert response.text.endswith('# EOF\n')
+        assert response.text.count('# EOF') == 1
@@ -0,0 +1,122 @@
+import json
+
+
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import Collection, CollectionRecord, Role, RoleRecord
+from galaxy_exporter.galaxy_exporter import decode_json
+from tests import read_file
+
+
+def test_decode_json_backends(monkeypatch):
+    body = read_file('collection.json', 'rb')
+    expected = json.loads(body)
+    assert decode_json(body) == expected
+    # The standard library is used when orjson isn't installed
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'orjson', None)
+    assert decode_json(body) == expected
+
+
+def test_stream_collection_record():
+    pytest.importorskip('ijson')
+    body = read_file('collection.json', 'rb')
+    record = CollectionRecord.from_stream(body)
+    assert record == CollectionRecord.from_data(json.loads(body))
+    assert record.versions == len(json.loads(body)['all_versions'])
+
+
+def test_stream_role_record():
+    pytest.importorskip('ijson')
+    body = read_file('role.json', 'rb')
+    record = RoleRecord.from_stream(body)
+    assert record == RoleRecord.from_data(json.loads(body)['data']['repository'])
+    assert record.version == '0.12.14'
+
+
+def test_stream_counts_dependencies():
+    pytest.importorskip('ijson')
+    jdata = json.loads(read_file('collection.json', 'rb'))
+    jdata['latest_version']['metadata']['dependencies'] = {'a.b': '>=1.0', 'c.d': '*'}
+    body = json.dumps(jdata).encode()
+    assert CollectionRecord.from_stream(body).dependencies == 2
+
+
+def test_decode_uses_streaming(monkeypatch):
+    pytest.importorskip('ijson')
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'JSON_STREAMING', True)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'decode_json', None)
+    role = Role('mesaguy.prometheus')
+    assert role.decode(read_file('role.json', 'rb')).stars == 22
+    collection = Collection('community.kubernetes')
+    assert collection.decode(read_file('collection.json', 'rb')).dependencies == 0
+
+
+def outcome(function, *args):
+    """ The record a function returns, or the type of error it raises """
+    try:
+        return function(*args)
+    except (KeyError, IndexError, TypeError) as error:
+        return type(error)
+
+
+ROLE_EDGE_CASES = {
+    'no versions': lambda repository: repository['summary_fields'].update(versions=[]),
+    'null versions': lambda repository: repository['summary_fields'].update(versions=None),
+    'missing versions': lambda repository: repository['summary_fields'].pop('versions'),
+    'unnamed version': lambda repository: repository['summary_fields'].update(versions=[{}]),
+    'missing downloads': lambda repository: repository.pop('download_count'),
+    'null downloads': lambda repository: repository.update(download_count=None),
+    'null created': lambda repository: repository.update(created=None),
+    'null import': lambda repository: repository['summary_fields'].update(latest_import=None),
+    'listed import': lambda repository: repository['summary_fields'].update(latest_import=[]),
+    'missing summary': lambda repository: repository.pop('summary_fields'),
+}
+
+COLLECTION_EDGE_CASES = {
+    'no versions': lambda collection: collection.update(all_versions=[]),
+    'missing versions': lambda collection: collection.pop('all_versions'),
+    'null dependencies': lambda collection: collection['latest_version']['metadata'].update(
+        dependencies=None),
+    'missing latest version': lambda collection: collection.pop('latest_version'),
+    'missing version': lambda collection: collection['latest_version'].pop('version'),
+    'null modified': lambda collection: collection.update(modified=None),
+}
+
+
+@pytest.mark.parametrize('case', sorted(ROLE_EDGE_CASES))
+def test_stream_role_record_parity(case):
+    """ Streamed role records match or fail like decoded role records """
+    pytest.importorskip('ijson')
+    jdata = json.loads(read_file('role.json', 'rb'))
+    ROLE_EDGE_CASES[case](jdata['data']['repository'])
+    expected = outcome(RoleRecord.from_data, jdata['data']['repository'])
+    assert outcome(RoleRecord.from_stream, json.dumps(jdata).encode()) == expected
+
+
+@pytest.mark.parametrize('case', sorted(COLLECTION_EDGE_CASES))
+def test_stream_collection_record_parity(case):
+    """ Streamed collection records match or fail like decoded ones """
+    pytest.importorskip('ijson')
+    jdata = json.loads(read_file('collection.json', 'rb'))
+    COLLECTION_EDGE_CASES[case](jdata)
+    expected = outcome(CollectionRecord.from_data, jdata)
+    assert outcome(CollectionRecord.from_stream, json.dumps(jdata).encode()) == expected
+
+
+def test_streamed_role_without_versions_fails(monkeypatch):
+    """ Decoding roles without versions fails when streaming too """
+    pytest.importorskip('ijson')
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'JSON_STREAMING', True)
+    jdata = json.loads(read_file('role.json', 'rb'))
+    jdata['data']['repository']['summary_fields']['versions'] = []
+    with pytest.raises(IndexError):
+        Role('mesaguy.prometheus').decode(json.dumps(jdata).encode())
+
+
+def test_stream_invalid_json():
+    """ Invalid json raises ValueError when streaming too """
+    pytest.importorskip('ijson')
+    with pytest.raises(ValueError):
+        RoleRecord.from_stream(b'{"data": ')
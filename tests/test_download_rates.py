@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+
+from prometheus_client.utils import floatToGoString
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import SampleRing
+from tests import client, fake_fetch, read_file
+
+
+def test_ring_wraps():
+    """ Samples are kept in a flat array of at most 'size' samples """
+    ring = SampleRing(('downloads', 'stars'), size=3, interval=0, coverage=0)
+    assert len(ring) == 0
+    assert ring.rate('downloads', 3600) is None
+    for number in range(5):
+        ring.append(number * 60, (number * 10, 1))
+    assert len(ring) == 3
+    assert ring.count == 5
+    assert ring._samples.typecode == 'd'
+    assert len(ring._samples) == 9
+    assert [ring.value(index, 'downloads') for index in range(2, 5)] == [20, 30, 40]
+
+
+def test_ring_keeps_spaced_samples():
+    """ Samples closer than 'interval' replace the newest sample """
+    ring = SampleRing(('downloads',), size=4, interval=600, coverage=0)
+    ring.append(0, (0,))
+    ring.append(60, (1,))
+    ring.append(120, (2,))
+    assert ring.count == 2
+    assert ring.value(1, 'timestamp') == 120
+    ring.append(660, (11,))
+    assert ring.count == 3
+
+
+def test_ring_rates():
+    """ Rates start from the newest sample at least 'window' seconds older """
+    ring = SampleRing(('downloads',), size=10, interval=0, coverage=0.5)
+    ring.append(0, (0,))
+    ring.append(900, (5,))
+    # Not exported while the samples span less than 'coverage' of 'window'
+    assert ring.rate('downloads', 3600) is None
+    ring.coverage = 0.25
+    assert ring.rate('downloads', 3600) == 20
+    ring.coverage = 0.5
+    ring.append(1800, (10,))
+    # Extrapolated while fewer than 'window' seconds are sampled
+    assert ring.rate('downloads', 3600) == 20
+    ring.append(3600, (40,))
+    ring.append(5400, (100,))
+    assert ring.rate('downloads', 3600) == 90
+    assert ring.rate('downloads', 86400) is None
+    ring.coverage = 0
+    assert ring.rate('downloads', 86400) == 100 / 5400 * 86400
+    # Same increase, or none, over identical timestamps
+    ring.append(5400, (100,))
+    assert ring.rate('downloads', 3600) == 90
+    # The start follows samples dropped by the ring
+    small = SampleRing(('downloads',), size=2, interval=0, coverage=0)
+    for number in range(4):
+        small.append(number * 7200, (number * 2,))
+    assert small.rate('downloads', 86400) == 24
+
+
+def test_download_rate_metrics(monkeypatch):
+    """ Download rates are exported once the samples span enough time """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch())
+    response = client.get('/probe?module=role&target=rates.role')
+    assert response.status_code == 200
+    assert 'downloads_per_hour' not in response.text
+
+    role = galaxy_exporter.galaxy_exporter.ROLES['rates.role']
+    assert role.samples.count == 1
+    # Age the cached data and its sample by half a day, enough for both rates
+    role.last_update -= timedelta(seconds=43200)
+    role.samples._samples[0] -= 43200
+    text = read_file('role.json').replace('"download_count":1824', '"download_count":1924')
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(body=text))
+    response = client.get('/probe?module=role&target=rates.role')
+    assert response.status_code == 200
+    assert len(role.samples) == 2
+    assert role.rates['downloads_per_day'] == pytest.approx(200, rel=0.01)
+    for key in ('downloads_per_hour', 'downloads_per_day'):
+        assert f'ansible_galaxy_role_{key}{{category="role",maintainer="rates",' \
+            f'project="role"}} {floatToGoString(role.rates[key])}\n' in response.text
+
+
+def test_record_sample_needs_data():
+    role = galaxy_exporter.galaxy_exporter.Role('test.test')
+    role.record_sample(0)
+    assert role.samples.count == 0
+    role.data = galaxy_exporter.galaxy_exporter.RoleRecord(downloads=1)
+    # Data without a fetch time isn't sampled unless a timestamp is given
+    role.record_sample()
+    assert role.samples.count == 0
+    role.record_sample(0)
+    assert role.samples.count == 1
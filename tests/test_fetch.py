@@ -5,12 +5,16 @@ import pytest
 
 
 from galaxy_exporter.galaxy_exporter import fetch_from_url
+from tests.fake_galaxy import fake_galaxy  # noqa: F401
 
 
 @pytest.mark.asyncio
-async def test_fetch_from_url():
+async def test_fetch_from_url(fake_galaxy):  # noqa: F811
+    fake_galaxy.error_rate = 1
     starttime = time.time()
     # Ensure fetch returns None
-    assert await fetch_from_url('fail.example.org', 'collection', 'test.test') is None
-    # Ensure retries occurred for 5 seconds
-    assert time.time() - starttime >= 5
+    assert await fetch_from_url(f'{fake_galaxy.url}/api/internal/ui/collections/test/test/',
+                                'collection', 'test.test', deadline=0.5) is None
+    # Ensure retries occurred until the deadline
+    assert time.time() - starttime >= 0.5
+    assert fake_galaxy.calls > 1
@@ -0,0 +1,49 @@
+import re
+
+
+import aiohttp
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import close_http_session, get_http_session
+from galaxy_exporter.galaxy_exporter import http_pool_usage
+from tests import client
+
+
+@pytest.mark.asyncio
+async def test_http_session_is_shared():
+    session = await get_http_session()
+    # The same session is reused between calls
+    assert await get_http_session() is session
+    connector = galaxy_exporter.galaxy_exporter.HTTP_SESSION['connector']
+    assert connector.limit_per_host == galaxy_exporter.galaxy_exporter.HTTP_POOL_LIMIT_PER_HOST
+    assert http_pool_usage() == dict(acquired=0, idle=0)
+    await close_http_session()
+    assert session.closed
+    assert http_pool_usage() == dict(acquired=0, idle=0)
+    # A new session is created once the previous one is closed
+    new_session = await get_http_session()
+    assert new_session is not session
+    await close_http_session()
+
+
+@pytest.mark.asyncio
+async def test_http_session_without_aiodns(monkeypatch):
+    def no_aiodns():
+        raise RuntimeError('Resolver requires aiodns library')
+    monkeypatch.setattr(aiohttp, 'AsyncResolver', no_aiodns)
+    await close_http_session()
+    session = await get_http_session()
+    assert isinstance(session.connector._resolver, aiohttp.DefaultResolver)
+    await close_http_session()
+
+
+def test_http_pool_metrics():
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert re.search(r'ansible_galaxy_exporter_http_pool_limit (\d+(\.\d*)?)', response.text)
+    assert re.search(r'ansible_galaxy_exporter_http_pool_acquired_connections (\d+(\.\d*)?)',
+                     response.text)
+    assert re.search(r'ansible_galaxy_exporter_http_pool_idle_connections (\d+(\.\d*)?)',
+                     response.text)
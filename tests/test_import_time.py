@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+
+
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter import pages
+
+
+# Maximum seconds importing galaxy_exporter may add to importing the
+# frameworks it is built on, roughly twice the measured time
+IMPORT_BUDGET_SECONDS = float(os.environ.get('GALAXY_EXPORTER_IMPORT_BUDGET', 0.2))
+# Frameworks imported by galaxy_exporter, excluded from its budget
+FRAMEWORKS = ('aiohttp', 'fastapi', 'prometheus_client')
+# Modules only imported when they are used
+LAZY_MODULES = ('dateutil.parser', 'galaxy_exporter.pages', 'ijson', 'sqlite3', 'tenacity',
+                'uvicorn', 'yaml')
+
+
+def import_times():
+    """ Cumulative import microseconds of each module imported by
+    galaxy_exporter, as reported by 'python -X importtime' """
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    command = [sys.executable, '-X', 'importtime', '-c', 'import galaxy_exporter.galaxy_exporter']
+    # The first import compiles bytecode, the second measures a normal start
+    subprocess.run(command, env=env, check=True, capture_output=True)
+    stderr = subprocess.run(command, env=env, check=True, capture_output=True,
+                            text=True).stderr
+    times = dict()
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, module = line.split('|')
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+    return times
+
+
+def imported_modules():
+    """ Modules in 'sys.modules' after a fresh interpreter imports
+    galaxy_exporter """
+    script = 'import sys\nimport galaxy_exporter.galaxy_exporter\nprint("\\n".join(sys.modules))\n'
+    stdout = subprocess.run([sys.executable, '-c', script], check=True, capture_output=True,
+                            text=True).stdout
+    return set(stdout.splitlines())
+
+
+def test_import_time():
+    times = import_times()
+    own = times['galaxy_exporter.galaxy_exporter'] - sum(times.get(module, 0)
+                                                         for module in FRAMEWORKS)
+    print(f'galaxy_exporter adds {own / 1000000:.3f}s to importing {", ".join(FRAMEWORKS)}')
+    assert own / 1000000 < IMPORT_BUDGET_SECONDS
+    for module in LAZY_MODULES:
+        assert module not in times
+
+
+def test_lazy_modules():
+    modules = imported_modules()
+    assert 'galaxy_exporter.galaxy_exporter' in modules
+    for module in LAZY_MODULES:
+        assert module not in modules
+
+
+def test_pages_are_module_attributes():
+    assert galaxy_exporter.galaxy_exporter.ROOT_HTML == pages.ROOT_HTML
+    with pytest.raises(AttributeError):
+        getattr(galaxy_exporter.galaxy_exporter, 'MISSING_HTML')
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+
+import galaxy_exporter.galaxy_exporter
+from tests import client, fake_fetch
+
+
+def expire(name):
+    role = galaxy_exporter.galaxy_exporter.ROLES[name]
+    role.last_update = datetime.now() - timedelta(seconds=3600)
+    return role
+
+
+def test_failed_refresh_keeps_data(monkeypatch):
+    """ Failed refreshes serve the last data until 'MAX_STALENESS_SECONDS' """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch())
+    response = client.get('/probe?module=role&target=lkg.role')
+    assert response.status_code == 200
+    assert 'ansible_galaxy_role_refresh_failures_total{category="role",maintainer="lkg",' \
+        'project="role"} 0.0' in response.text
+    assert 'ansible_galaxy_role_last_success_timestamp{' in response.text
+
+    calls = list()
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, status=None))
+    role = expire('lkg.role')
+    data = role.data
+    for _ in range(2):
+        response = client.get('/probe?module=role&target=lkg.role')
+        assert response.status_code == 200
+        assert 'ansible_galaxy_role_stars{category="role",maintainer="lkg",' \
+            'project="role"} 22.0' in response.text
+        assert 'ansible_galaxy_role_refresh_failures_total{category="role",maintainer="lkg",' \
+            'project="role"} 1.0' in response.text
+    assert role.data is data
+    # Galaxy isn't asked again until 'FAILED_CACHE_SECONDS' pass
+    assert len(calls) == 1
+
+    # Data older than 'MAX_STALENESS_SECONDS' is no longer served
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'MAX_STALENESS_SECONDS', 1800)
+    response = client.get('/probe?module=role&target=lkg.role')
+    assert response.status_code == 502
+    assert len(calls) == 1
+
+
+def test_live_values():
+    role = galaxy_exporter.galaxy_exporter.Role('test.test')
+    assert role.live_value('last_success') == 0.0
+    assert role.live_value('refresh_failures') == 0.0
+    assert role.live_value('unknown') is None
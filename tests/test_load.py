@@ -0,0 +1,55 @@
+import os
+
+
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from tests import client
+from tests.benchmark import format_report, run_benchmark
+from tests.fake_galaxy import fake_galaxy  # noqa: F401
+
+
+def test_probe_fake_galaxy(fake_galaxy):  # noqa: F811
+    """ Probes are answered from the fake Galaxy """
+    response = client.get('/probe?module=role&target=fake.role')
+    assert response.status_code == 200
+    download_count = fake_galaxy.role('fake', 'role')['data']['repository']['download_count']
+    assert 'ansible_galaxy_role_downloads{category="role",maintainer="fake",' \
+        f'project="role"}} {download_count:.1f}' in response.text
+
+    response = client.get('/probe?module=collection&target=fake.collection')
+    assert response.status_code == 200
+    assert fake_galaxy.calls == 2
+
+    response = client.get('/probe?module=collection&target=fake.missing')
+    assert response.status_code == 404
+    del galaxy_exporter.galaxy_exporter.COLLECTIONS['fake.missing']
+
+
+def test_probe_fake_galaxy_errors(fake_galaxy, monkeypatch):  # noqa: F811
+    """ Galaxy errors are answered with a 502 """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'UPSTREAM_DEADLINE_SECONDS', 0.5)
+    fake_galaxy.error_rate = 1
+    response = client.get('/probe?module=role&target=fake.errors')
+    assert response.status_code == 502
+    assert fake_galaxy.calls >= 1
+    del galaxy_exporter.galaxy_exporter.ROLES['fake.errors']
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('targets', [
+    100,
+    pytest.param(1000, marks=pytest.mark.skipif(
+        not os.environ.get('GALAXY_EXPORTER_BENCHMARK'), reason='GALAXY_EXPORTER_BENCHMARK unset')),
+    pytest.param(10000, marks=pytest.mark.skipif(
+        not os.environ.get('GALAXY_EXPORTER_BENCHMARK'), reason='GALAXY_EXPORTER_BENCHMARK unset')),
+])
+async def test_benchmark(targets):
+    """ Each target is fetched once, then served from the cache """
+    report = await run_benchmark(targets, latency=0.001)
+    print(format_report(targets, report))
+    assert report['cold']['upstream_calls'] == targets
+    assert report['cold']['errors'] == 0
+    assert report['warm']['upstream_calls'] == 0
+    assert report['warm']['errors'] == 0
@@ -0,0 +1,18 @@
+import uvicorn
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.__main__ import main
+
+
+def test_main(monkeypatch):
+    """ The console script serves the application with uvicorn """
+    calls = list()
+    monkeypatch.setattr(uvicorn, 'run', lambda *args, **kwargs: calls.append((args, kwargs)))
+    main(['--port', '9999'])
+    assert calls == [((galaxy_exporter.galaxy_exporter.app,), dict(host='0.0.0.0', port=9999))]
+
+    calls.clear()
+    main(['--workers', '2'])
+    assert calls == [(('galaxy_exporter.galaxy_exporter:app',),
+                      dict(host='0.0.0.0', port=9654, workers=2))]
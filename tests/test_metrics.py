@@ -1,14 +1,50 @@
 import re
 
 
+from prometheus_client.parser import text_string_to_metric_families
+
+
+from galaxy_exporter import __version__
+import galaxy_exporter.galaxy_exporter
 from tests import client
 
 
+EXPORTER_METRICS = (
+    'api_call_count',
+    'cache_hits',
+    'cache_misses',
+    'upstream_latency_seconds',
+    'upstream_in_flight',
+    'decode_seconds',
+    'set_metrics_seconds',
+    'render_seconds',
+    'response_bytes',
+    'coalesced_requests',
+    'cache_entries',
+    'cache_evictions',
+    'cache_retained_bytes',
+    'upstream_responses',
+    'upstream_bytes',
+    'upstream_attempts',
+    'upstream_queue_depth',
+    'upstream_rate_limit',
+    'upstream_wait_seconds',
+    'upstream_throttled',
+    'negative_cache_seconds',
+    'http_pool_limit',
+    'http_pool_acquired_connections',
+    'http_pool_idle_connections',
+    'version_info',
+)
+
+
 def test_role_metrics():
     response = client.get(f'/metrics')
     assert response.status_code == 200
     print(f'Response text:\n{response.text}')
-    assert len(response.text.split('\n')) == 46
+    families = {family.name: family for family in text_string_to_metric_families(response.text)}
+    for name in EXPORTER_METRICS:
+        assert f'ansible_galaxy_exporter_{name}' in families
     assert re.search(r'process_cpu_seconds_total (\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?',
                      response.text.strip('\n'))
     assert re.search(r'process_open_fds (\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?',
@@ -17,5 +53,8 @@ def test_role_metrics():
                      response.text.strip('\n'))
     assert re.search(r'ansible_galaxy_exporter_api_call_count_total (\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?',
                      response.text.strip('\n'))
-    assert re.search(r'ansible_galaxy_exporter_version_info{version=\"[0-9.a-z-]*\"} '
-                     r'(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?', response.text.strip('\n'))
+    version = families['ansible_galaxy_exporter_version_info'].samples
+    assert [(sample.labels, sample.value) for sample in version] == [(dict(version=__version__), 1)]
+    pool_limit = families['ansible_galaxy_exporter_http_pool_limit'].samples
+    assert [sample.value for sample in pool_limit] == \
+        [galaxy_exporter.galaxy_exporter.HTTP_POOL_LIMIT_PER_HOST]
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+
+import galaxy_exporter.galaxy_exporter
+from tests import client, fake_fetch
+
+
+def test_metrics_targets(monkeypatch):
+    """ All cached collections and roles are streamed without asking Galaxy """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch())
+    assert client.get('/probe?module=role&target=streamed.role').status_code == 200
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch())
+    assert client.get('/probe?module=collection&target=streamed.collection').status_code == 200
+
+    calls = list()
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, status=None))
+    # Expired data is streamed as is
+    role = galaxy_exporter.galaxy_exporter.ROLES['streamed.role']
+    role.last_update = datetime.now() - timedelta(seconds=3600)
+    response = client.get('/metrics/targets')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    assert 'ansible_galaxy_role_stars{category="role",maintainer="streamed",' \
+        'project="role"} 22.0' in response.text
+    assert 'ansible_galaxy_collection_downloads{category="collection",' \
+        'maintainer="streamed",project="collection"}' in response.text
+    # Each metric family is described once, with all its collections or roles
+    assert response.text.count('# TYPE ansible_galaxy_role_stars gauge\n') == 1
+    assert calls == []
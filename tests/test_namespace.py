@@ -0,0 +1,111 @@
+from datetime import timedelta
+import time
+
+
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import Namespace, get_namespace
+from tests import client, fake_fetch
+from tests.fake_galaxy import fake_galaxy  # noqa: F401
+
+
+def test_probe_namespace(fake_galaxy, monkeypatch):  # noqa: F811
+    """ Namespace probes return the metrics of every collection and role """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'NAMESPACE_PAGE_SIZE', 2)
+    fake_galaxy.namespaces['nsprobe'] = dict(collection=['first', 'second'],
+                                             repository=['one', 'two', 'three'])
+    response = client.get('/probe?module=namespace&target=nsprobe')
+    assert response.status_code == 200
+    for name in ('first', 'second'):
+        assert 'ansible_galaxy_collection_downloads{category="collection",maintainer="nsprobe",' \
+            f'project="{name}"}}' in response.text
+    for name in ('one', 'two', 'three'):
+        assert 'ansible_galaxy_role_downloads{category="role",maintainer="nsprobe",' \
+            f'project="{name}"}}' in response.text
+    # Two listing pages and five collections and roles
+    assert fake_galaxy.calls == 7
+
+    # The listing and its collections and roles are cached
+    response = client.get('/probe?module=namespace&target=nsprobe')
+    assert response.status_code == 200
+    assert fake_galaxy.calls == 7
+    namespace = galaxy_exporter.galaxy_exporter.NAMESPACES['nsprobe']
+    assert namespace.collections == ['nsprobe.first', 'nsprobe.second']
+    assert namespace.roles == ['nsprobe.one', 'nsprobe.two', 'nsprobe.three']
+
+
+def test_probe_unknown_namespace(fake_galaxy):  # noqa: F811
+    """ Unknown namespaces return a 404 """
+    response = client.get('/probe?module=namespace&target=nsunknown')
+    assert response.status_code == 404
+    # Galaxy isn't asked again until 'NOT_FOUND_CACHE_SECONDS' pass
+    response = client.get('/probe?module=namespace&target=nsunknown')
+    assert response.status_code == 404
+    assert fake_galaxy.calls == 1
+
+
+def test_probe_invalid_namespace(fake_galaxy):  # noqa: F811
+    """ Invalid namespace names are rejected without asking Galaxy """
+    for target in ('', 'mesaguy%26page_size%3D100000', 'mesa.guy'):
+        response = client.get(f'/probe?module=namespace&target={target}')
+        assert response.status_code == 422
+    assert fake_galaxy.calls == 0
+    assert 'mesaguy&page_size=100000' not in galaxy_exporter.galaxy_exporter.NAMESPACES
+
+
+def test_namespace_url_is_escaped():
+    url = Namespace('name&page_size=1').url(2)
+    assert url.endswith('?format=json&namespace=name%26page_size%3D1&page=2&page_size='
+                        f'{galaxy_exporter.galaxy_exporter.NAMESPACE_PAGE_SIZE}')
+
+
+@pytest.mark.asyncio
+async def test_namespace_page_errors(monkeypatch):
+    """ Pages with an unexpected status or body raise RuntimeError """
+    namespace = Namespace('nserrors')
+    assert repr(namespace) == "Namespace('nserrors')"
+    for body, status in ((b'', 500), (b'<html>', 200), (b'{"collection": {}}', 200)):
+        monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                            fake_fetch(body=body, status=status))
+        with pytest.raises(RuntimeError):
+            await namespace.fetch_page(1)
+
+
+def test_failed_namespace_keeps_listing(fake_galaxy, monkeypatch):  # noqa: F811
+    """ Failed listings return the previous listing, or a 502 without one """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'UPSTREAM_DEADLINE_SECONDS', 0.5)
+    fake_galaxy.namespaces['nsfailed'] = dict(collection=[], repository=['kept'])
+    fake_galaxy.error_rate = 1
+    response = client.get('/probe?module=namespace&target=nsfailed')
+    assert response.status_code == 502
+
+    fake_galaxy.error_rate = 0
+    namespace = galaxy_exporter.galaxy_exporter.NAMESPACES['nsfailed']
+    namespace.failure_time -= 3600
+    response = client.get('/probe?module=namespace&target=nsfailed')
+    assert response.status_code == 200
+    assert 'project="kept"' in response.text
+
+    fake_galaxy.error_rate = 1
+    namespace.last_update -= timedelta(seconds=7200)
+    response = client.get('/probe?module=namespace&target=nsfailed')
+    assert response.status_code == 200
+    assert 'project="kept"' in response.text
+    assert namespace.failure == 'failed'
+
+
+@pytest.mark.asyncio
+async def test_namespace_pages_fetched_concurrently(fake_galaxy, monkeypatch):  # noqa: F811
+    """ Pages after the first are fetched concurrently """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'NAMESPACE_PAGE_SIZE', 1)
+    fake_galaxy.namespaces['nspages'] = dict(collection=['a', 'b', 'c', 'd', 'e'],
+                                             repository=[])
+    fake_galaxy.latency = 0.2
+    started = time.monotonic()
+    namespace = await get_namespace('nspages')
+    assert time.monotonic() - started < 0.8
+    assert len(namespace.collections) == 5
+    assert fake_galaxy.calls == 5
+    await galaxy_exporter.galaxy_exporter.close_http_session()
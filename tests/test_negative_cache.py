@@ -0,0 +1,60 @@
+import galaxy_exporter.galaxy_exporter
+from tests import client, fake_fetch
+
+
+def test_not_found_is_cached(monkeypatch):
+    """ Unknown roles are answered with 404 without asking Galaxy again """
+    calls = list()
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, b'{"detail": "Not found."}', status=404))
+    for _ in range(3):
+        response = client.get('/probe?module=role&target=negative.notfound')
+        assert response.status_code == 404
+    assert calls == ['negative.notfound']
+
+    metrics = client.get('/metrics').text
+    assert 'ansible_galaxy_exporter_negative_cache_seconds{module="role",' \
+        'reason="not_found",target="negative.notfound"}' in metrics
+
+
+def test_missing_data_is_not_found(monkeypatch):
+    """ Galaxy responses without role data mean the role doesn't exist """
+    calls = list()
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, b'{"data": {}}'))
+    response = client.get('/probe?module=role&target=negative.nodata')
+    assert response.status_code == 404
+
+
+def test_invalid_response_is_failure(monkeypatch):
+    """ Galaxy responses that aren't json are failed fetches """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(list(), b'<html>'))
+    response = client.get('/probe?module=role&target=negative.invalid')
+    assert response.status_code == 502
+
+
+def test_failure_is_cached(monkeypatch):
+    """ Failed fetches are answered with 502 until 'FAILED_CACHE_SECONDS' pass """
+    calls = list()
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, status=None))
+    for _ in range(2):
+        response = client.get('/probe?module=collection&target=negative.failed')
+        assert response.status_code == 502
+    assert len(calls) == 1
+
+    # Once the negative cache entry expires, Galaxy is asked again
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'FAILED_CACHE_SECONDS', 0)
+    response = client.get('/probe?module=collection&target=negative.failed')
+    assert response.status_code == 502
+    assert len(calls) == 2
+
+
+def test_batch_skips_unavailable(monkeypatch):
+    """ Batch probes leave out unavailable targets """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(list(), b'', status=404))
+    response = client.get('/probe/batch?target=role:negative.batch')
+    assert response.status_code == 200
+    assert 'negative.batch' not in response.text
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+
+
+from fastapi.testclient import TestClient
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import app, load_targets, prefetch
+from tests import fake_fetch
+from tests.fake_galaxy import fake_galaxy  # noqa: F401
+
+
+def test_load_targets(tmp_path):
+    """ Targets files are read in json format """
+    path = tmp_path / 'targets.json'
+    path.write_text(json.dumps(dict(roles=['prefetch.one'])))
+    assert load_targets(str(path)) == [('role', 'prefetch.one')]
+    # Invalid or missing files list no targets
+    path.write_text('[')
+    assert load_targets(str(path)) == []
+    assert load_targets(str(tmp_path / 'missing.json')) == []
+
+
+def test_load_yaml_targets(tmp_path):
+    """ Targets files are read in YAML format when PyYAML is installed """
+    pytest.importorskip('yaml')
+    path = tmp_path / 'targets.yml'
+    path.write_text('roles:\n  - prefetch.one\n  - prefetch.one\n'
+                    'collections:\n  - prefetch.two\nnamespaces:\n  - prefetch\n')
+    assert load_targets(str(path)) == [('namespace', 'prefetch'),
+                                       ('collection', 'prefetch.two'),
+                                       ('role', 'prefetch.one')]
+    path.write_text('roles: [prefetch.one\n')
+    assert load_targets(str(path)) == []
+
+
+def test_load_targets_skips_invalid_names(tmp_path):
+    """ Names in an invalid format are left out """
+    path = tmp_path / 'targets.json'
+    path.write_text(json.dumps(dict(roles=['typo', 'prefetch.one', 'a.b.c', '.b'],
+                                    namespaces=['prefetch.ns'])))
+    assert load_targets(str(path)) == [('role', 'prefetch.one')]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_is_bounded(monkeypatch):
+    """ At most 'concurrency' targets are fetched at once """
+    peak = list()
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(delay=0.05, concurrency=peak))
+    targets = [('role', f'prefetch.bounded{number}') for number in range(6)]
+    await prefetch(targets, concurrency=2, spacing=0.01)
+    assert max(peak) == 2
+    assert len(peak) == 6
+    for _, name in targets:
+        assert galaxy_exporter.galaxy_exporter.ROLES[name].is_usable()
+
+
+@pytest.mark.asyncio
+async def test_prefetch_skips_invalid_names(monkeypatch):
+    """ Invalid names don't stop the other targets from being fetched """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(delay=0.05))
+    await prefetch([('role', 'typo'), ('namespace', 'prefetch.typo'),
+                    ('role', 'prefetch.valid')], spacing=0)
+    assert galaxy_exporter.galaxy_exporter.ROLES['prefetch.valid'].is_usable()
+    assert 'typo' not in galaxy_exporter.galaxy_exporter.ROLES
+
+
+@pytest.mark.asyncio
+async def test_prefetch_namespaces(fake_galaxy):  # noqa: F811
+    """ The collections and roles of namespaces are prefetched """
+    fake_galaxy.namespaces['prefetchns'] = dict(collection=['first'], repository=['one'])
+    await prefetch([('namespace', 'prefetchns'), ('role', 'prefetchns.one'),
+                    ('namespace', 'missing')], spacing=0)
+    assert 'prefetchns.first' in galaxy_exporter.galaxy_exporter.COLLECTIONS
+    assert 'prefetchns.one' in galaxy_exporter.galaxy_exporter.ROLES
+    # Listing, unknown namespace, collection and role
+    assert fake_galaxy.calls == 4
+    await galaxy_exporter.galaxy_exporter.close_http_session()
+
+
+def test_ready_after_prefetch(monkeypatch, tmp_path):
+    """ The exporter is ready once targets are prefetched """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(delay=0.5))
+    path = tmp_path / 'targets.json'
+    path.write_text(json.dumps(dict(roles=['prefetch.ready'])))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'TARGETS_FILE', str(path))
+    with TestClient(app) as client:
+        assert client.get('/ready').status_code == 503
+        give_up = time.monotonic() + 5
+        while client.get('/ready').status_code != 200:
+            assert time.monotonic() < give_up
+            time.sleep(0.05)
+        assert 'prefetch.ready' in galaxy_exporter.galaxy_exporter.ROLES
+    assert TestClient(app).get('/ready').text == 'OK'
+
+
+def test_ready_after_failed_prefetch(monkeypatch, tmp_path):
+    """ The exporter reports failed prefetching """
+    async def failing_prefetch(targets):
+        await asyncio.sleep(0.1)
+        raise RuntimeError('Prefetch failed')
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'prefetch', failing_prefetch)
+    path = tmp_path / 'targets.json'
+    path.write_text(json.dumps(dict(roles=['prefetch.failed'])))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'TARGETS_FILE', str(path))
+    with TestClient(app) as client:
+        give_up = time.monotonic() + 5
+        while client.get('/ready').status_code == 503:
+            assert time.monotonic() < give_up
+            time.sleep(0.05)
+        assert client.get('/ready').status_code == 500
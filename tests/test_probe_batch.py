@@ -0,0 +1,75 @@
+import asyncio
+
+
+import galaxy_exporter.galaxy_exporter
+from tests import client, fake_fetch
+
+
+def test_probe_batch_merges_targets(monkeypatch):
+    calls = []
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, delay=0.05))
+    response = client.get('/probe/batch?target=role:batch.one&target=role:batch.two'
+                          '&target=collection:batch.three&target=role:batch.one')
+    assert response.status_code == 200
+    text = response.text
+    # Families shared by targets are described once
+    assert text.count('# HELP ansible_galaxy_role_stars ') == 1
+    assert text.count('# TYPE ansible_galaxy_collection_dependencies ') == 1
+    assert 'ansible_galaxy_role_stars{category="role",maintainer="batch",project="one"} 22.0' in text
+    assert 'ansible_galaxy_role_stars{category="role",maintainer="batch",project="two"} 22.0' in text
+    assert 'ansible_galaxy_collection_dependencies{category="collection",maintainer="batch",' \
+        'project="three"} 0.0' in text
+    # Duplicate targets are only fetched once
+    assert sorted(calls) == ['batch.one', 'batch.three', 'batch.two']
+
+
+def test_probe_batch_matches_probe(monkeypatch):
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(delay=0.05))
+    response1 = client.get('/probe/batch?target=collection:batch.single')
+    response2 = client.get('/probe?module=collection&target=batch.single')
+    assert response1.text == response2.text
+
+
+def test_probe_batch_concurrency_limit(monkeypatch):
+    concurrency = []
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'BATCH_CONCURRENCY', 2)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(delay=0.05, concurrency=concurrency))
+    targets = '&'.join(f'target=role:limit.role{index}' for index in range(6))
+    response = client.get(f'/probe/batch?{targets}')
+    assert response.status_code == 200
+    assert len(concurrency) == 6
+    assert max(concurrency) == 2
+
+
+def test_probe_batch_invalid_target():
+    response = client.get('/probe/batch?target=test:test.test')
+    assert response.status_code == 404
+    response = client.get('/probe/batch?target=role')
+    assert response.status_code == 404
+
+
+def test_probe_batch_malformed_target(monkeypatch):
+    """ Names that aren't in author.project format are rejected """
+    calls = []
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, delay=0.05))
+    response = client.get('/probe/batch?target=role:batch.malformed&target=role:typo')
+    assert response.status_code == 422
+    assert 'role:typo' in response.json()['detail']
+    assert calls == []
+    for url in ('/probe?module=role&target=typo', '/probe?module=collection&target=a.b.c',
+                '/role/typo/metrics'):
+        assert client.get(url).status_code == 422
+
+
+def test_probe_targets_skips_malformed_names(monkeypatch):
+    """ Malformed names, such as those listed in a namespace, are left out """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(delay=0.05))
+    response = asyncio.run(galaxy_exporter.galaxy_exporter.probe_targets(
+        [('role', 'batch.listed'), ('role', 'typo')]))
+    assert response.status_code == 200
+    assert b'project="listed"' in response.body
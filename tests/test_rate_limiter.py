@@ -0,0 +1,145 @@
+import asyncio
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import time
+
+
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import RateLimiter, parse_retry_after
+
+
+def test_token_bucket_rate():
+    """ Calls beyond the burst wait for tokens at the configured rate """
+    limiter = RateLimiter(rate=100, burst=2, concurrency=0)
+    waits = [limiter.reserve() for _ in range(4)]
+    assert waits[:2] == [0, 0]
+    assert waits[2] == pytest.approx(0.01, abs=0.002)
+    assert waits[3] == pytest.approx(0.02, abs=0.002)
+
+
+def test_unlimited_rate():
+    """ A rate of 0 never waits """
+    limiter = RateLimiter(rate=0, burst=1, concurrency=0)
+    assert [limiter.reserve() for _ in range(100)] == [0] * 100
+
+
+def test_throttle_adapts_rate():
+    """ Throttling pauses calls and halves the rate until calls succeed """
+    limiter = RateLimiter(rate=10, burst=10, concurrency=0)
+    limiter.throttle(2)
+    assert limiter.current_rate == 5
+    assert limiter.reserve() == pytest.approx(2, abs=0.05)
+    for _ in range(100):
+        limiter.success()
+    assert limiter.current_rate == 10
+
+
+def test_slot_limits_concurrency():
+    """ No more than 'concurrency' calls hold a slot at once """
+    limiter = RateLimiter(rate=0, burst=1, concurrency=2)
+    active = list()
+    peak = list()
+
+    async def call():
+        async with limiter.slot():
+            active.append(1)
+            peak.append(len(active))
+            await asyncio.sleep(0.02)
+            active.pop()
+
+    async def main():
+        await asyncio.gather(*[call() for _ in range(6)])
+    asyncio.run(main())
+    assert max(peak) == 2
+    assert limiter.waiting == 0
+
+
+def test_slot_reports_wait():
+    """ The seconds each call waited are passed to 'on_wait' """
+    waits = list()
+    limiter = RateLimiter(rate=100, burst=1, concurrency=0, on_wait=waits.append)
+
+    async def call():
+        async with limiter.slot():
+            pass
+
+    async def main():
+        await call()
+        await call()
+    asyncio.run(main())
+    assert len(waits) == 2
+    assert waits[1] == pytest.approx(0.01, abs=0.01)
+
+
+def test_slot_timeout():
+    """ Calls that would wait past their deadline fail immediately """
+    limiter = RateLimiter(rate=1, burst=1, concurrency=0)
+    limiter.throttle(30)
+
+    async def call():
+        async with limiter.slot(timeout=1):
+            pass
+    started = time.monotonic()
+    with pytest.raises(galaxy_exporter.galaxy_exporter.RateLimitTimeout):
+        asyncio.run(call())
+    assert time.monotonic() - started < 1
+
+
+def test_slot_timeout_waiting_for_slot():
+    """ Calls fail at their deadline while every slot stays busy """
+    limiter = RateLimiter(rate=100, burst=1, concurrency=1)
+
+    async def hold():
+        async with limiter.slot():
+            await asyncio.sleep(3)
+
+    async def main():
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0.05)
+        tokens = limiter._tokens
+        started = time.monotonic()
+        with pytest.raises(galaxy_exporter.galaxy_exporter.RateLimitTimeout):
+            async with limiter.slot(timeout=0.3):
+                pass
+        assert 0.3 <= time.monotonic() - started < 1
+        holder.cancel()
+        return tokens
+    tokens = asyncio.run(main())
+    # The token of the failed call was returned
+    assert limiter._tokens == pytest.approx(tokens + 1, abs=0.5)
+    assert limiter.waiting == 0
+
+
+def test_cancelled_slot_returns_token():
+    """ Calls cancelled while waiting return their token """
+    limiter = RateLimiter(rate=1, burst=1, concurrency=0)
+
+    async def call():
+        async with limiter.slot():
+            pass
+
+    async def main():
+        await call()
+        waiter = asyncio.ensure_future(call())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+    asyncio.run(main())
+    assert limiter._tokens == pytest.approx(0, abs=0.2)
+    assert limiter.waiting == 0
+
+
+def test_parse_retry_after():
+    """ Retry-After is either seconds or an HTTP date """
+    assert parse_retry_after('7') == 7
+    assert parse_retry_after(None) == 1
+    assert parse_retry_after('soon') == 1
+    when = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert parse_retry_after(when) == pytest.approx(60, abs=2)
+    # Dates without a timezone are UTC
+    when = format_datetime(datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=60))
+    assert parse_retry_after(when) == pytest.approx(60, abs=2)
@@ -0,0 +1,60 @@
+import json
+
+
+from galaxy_exporter.galaxy_exporter import Collection, CollectionRecord, Role, RoleRecord
+from galaxy_exporter.galaxy_exporter import GalaxyData, GalaxyRecord, deep_sizeof
+from tests import read_file
+
+
+def test_role_data_reduced_to_record():
+    jdata = json.loads(read_file('role.json'))
+    role = Role('mesaguy.prometheus')
+    role.data = jdata['data']['repository']
+    assert isinstance(role.data, RoleRecord)
+    assert role.data == RoleRecord.from_data(jdata['data']['repository'])
+    assert role.data.stars == 22
+    assert role.data.versions == 68
+    assert role.data.version == '0.12.14'
+    assert not hasattr(role.data, '__dict__')
+    # The record is a fraction of the size of the json data
+    assert role.data_size * 20 < deep_sizeof(jdata['data']['repository'])
+
+
+def test_collection_data_reduced_to_record():
+    jdata = json.loads(read_file('collection.json'))
+    collection = Collection('community.kubernetes')
+    collection.data = jdata
+    assert isinstance(collection.data, CollectionRecord)
+    assert collection.data.dependencies == 0
+    assert collection.data.versions == len(jdata['all_versions'])
+    assert collection.data.version == jdata['latest_version']['version']
+    assert collection.data.to_dict()['downloads'] == jdata['download_count']
+    assert collection.data_size * 5 < deep_sizeof(jdata)
+
+
+def test_base_classes_keep_no_record():
+    assert GalaxyRecord.from_data(dict()) == GalaxyRecord()
+    data = GalaxyData('test.test')
+    data.data = dict(name='test')
+    assert data.data == dict(name='test')
+
+
+def test_record_repr():
+    record = RoleRecord(stars=22)
+    assert repr(record).startswith('RoleRecord(community_score=None, ')
+    assert 'stars=22' in repr(record)
+
+
+def test_scores():
+    collection = Collection('test.test')
+    collection.data = CollectionRecord()
+    assert collection.metric__community_score() == '0'
+    assert collection.metric__quality_score() == '0'
+    collection.data = CollectionRecord(community_score=4.5, quality_score=3.0)
+    assert collection.metric__community_score() == '4.5'
+    assert collection.metric__quality_score() == '3.0'
+    role = Role('test.test')
+    role.data = RoleRecord()
+    assert role.metric__quality_score() == '0'
+    role.data = RoleRecord(quality_score=4.0)
+    assert role.metric__quality_score() == '4.0'
@@ -0,0 +1,57 @@
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import get_role
+from tests import client, fake_fetch, read_file
+
+
+@pytest.mark.asyncio
+async def test_render_is_cached_until_data_changes(monkeypatch):
+    set_calls = []
+    set_role_metrics = galaxy_exporter.galaxy_exporter.set_role_metrics
+
+    def counting_set_role_metrics(role):
+        set_calls.append(role.name)
+        return set_role_metrics(role)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'set_role_metrics',
+                        counting_set_role_metrics)
+    text = read_file('role.json')
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(body=text))
+    role = await get_role('render.role')
+    rendered = role.render()
+    exposition = role.exposition
+    assert b'ansible_galaxy_role_stars{category="role"' in exposition
+    assert rendered.startswith(exposition)
+    # Rendering again reuses the cached exposition
+    role.render()
+    assert role.exposition is exposition
+    assert set_calls == ['render.role']
+
+    # Refreshing with identical data keeps the cached exposition
+    await role.refresh()
+    role.render()
+    assert role.exposition is exposition
+    assert set_calls == ['render.role']
+
+    # Refreshing with different data renders again
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(body=text.replace('"stargazers_count":', '"stargazers_count":1')))
+    await role.refresh()
+    role.render()
+    assert role.exposition != exposition
+    assert set_calls == ['render.role', 'render.role']
+
+
+def test_probe_returns_cached_exposition(monkeypatch):
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch())
+    headers = {'Accept-Encoding': 'identity'}
+    response1 = client.get('/probe?module=role&target=render.probe', headers=headers)
+    assert response1.status_code == 200
+    assert response1.headers['content-type'].startswith('text/plain; version=')
+    response2 = client.get('/role/render.probe/metrics', headers=headers)
+    assert response2.content == response1.content
+    assert response1.content.startswith(
+        galaxy_exporter.galaxy_exporter.ROLES['render.probe'].exposition)
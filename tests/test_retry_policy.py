@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+
+import aiohttp
+from aiohttp import web
+from aiohttp import test_utils
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import RateLimiter, fetch_from_url, update_base_metrics
+
+
+def run_against(handler, path='/'):
+    """ Fetch 'path' from a local server answering with 'handler' """
+    async def main():
+        app = web.Application()
+        app.router.add_get(path, handler)
+        server = test_utils.TestServer(app)
+        await server.start_server()
+        try:
+            return await fetch_from_url(str(server.make_url(path)), 'Role', 'test.test',
+                                        deadline=2)
+        finally:
+            await server.close()
+            await galaxy_exporter.galaxy_exporter.close_http_session()
+    return asyncio.run(main())
+
+
+def attempts_observed():
+    histogram = update_base_metrics()['upstream_attempts']
+    return sum(bucket.get() for bucket in histogram._buckets)
+
+
+def test_retryable_status_is_retried():
+    """ Retryable statuses are retried until Galaxy answers """
+    calls = list()
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return web.Response(status=503)
+        return web.Response(body=b'{}')
+    before = attempts_observed()
+    result = run_against(handler)
+    assert result.status == 200
+    assert result.body == b'{}'
+    assert len(calls) == 3
+    assert attempts_observed() - before == 1
+
+
+def test_throttled_calls_wait(monkeypatch):
+    """ 429 responses pause calls for 'Retry-After' and halve the rate """
+    limiter = RateLimiter(rate=10, burst=10, concurrency=0)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'RATE_LIMITER', limiter)
+    throttled = update_base_metrics()['upstream_throttled']
+    before = throttled._value.get()
+    calls = list()
+
+    async def handler(request):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return web.Response(status=429, headers={'Retry-After': '1'})
+        return web.Response(body=b'{}')
+    result = run_against(handler)
+    assert result.status == 200
+    assert len(calls) == 2
+    # The retry waited for 'Retry-After'
+    assert calls[1] - calls[0] >= 1
+    assert throttled._value.get() - before == 1
+    # Halved to 5 calls per second, then recovering by 5% after the success
+    assert limiter.current_rate == pytest.approx(5.5)
+
+
+def test_terminal_status_is_returned():
+    """ Terminal statuses are returned without retrying """
+    calls = list()
+
+    async def handler(request):
+        calls.append(request)
+        return web.Response(status=404, body=b'Not found')
+    result = run_against(handler)
+    assert result.status == 404
+    assert len(calls) == 1
+
+
+def test_attempt_timeout(monkeypatch):
+    """ Slow attempts are abandoned and the fetch gives up at the deadline """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'UPSTREAM_ATTEMPT_TIMEOUT', 0.3)
+    calls = list()
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(5)
+        return web.Response(body=b'{}')
+    started = time.monotonic()
+    assert run_against(handler) is None
+    assert 2 <= time.monotonic() - started < 3
+    assert len(calls) > 1
+
+
+def test_attempt_timeout_keeps_session_limits(monkeypatch):
+    """ Attempts keep the connect and read timeouts of the shared session """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'HTTP_CONNECT_TIMEOUT', 1.5)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'HTTP_READ_TIMEOUT', 2.5)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'UPSTREAM_ATTEMPT_TIMEOUT', 1)
+    timeouts = list()
+    get = aiohttp.ClientSession.get
+
+    def recording_get(self, url, **kwargs):
+        timeouts.append(kwargs.get('timeout'))
+        return get(self, url, **kwargs)
+    monkeypatch.setattr(aiohttp.ClientSession, 'get', recording_get)
+
+    async def handler(request):
+        return web.Response(body=b'{}')
+    assert run_against(handler).status == 200
+    assert len(timeouts) == 1
+    assert timeouts[0].connect == 1.5
+    assert timeouts[0].sock_read == 2.5
+    assert 0.1 <= timeouts[0].total <= 1
+
+
+def test_deadline_covers_busy_slots(monkeypatch):
+    """ Fetches give up at their deadline while every call slot is busy """
+    limiter = RateLimiter(rate=0, burst=1, concurrency=1)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'RATE_LIMITER', limiter)
+
+    async def hold():
+        async with limiter.slot():
+            await asyncio.sleep(3)
+
+    async def main():
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        result = await fetch_from_url('http://127.0.0.1:9/', 'Role', 'test.test', deadline=0.5)
+        elapsed = time.monotonic() - started
+        holder.cancel()
+        return result, elapsed
+    result, elapsed = asyncio.run(main())
+    assert result is None
+    assert elapsed < 1
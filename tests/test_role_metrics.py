@@ -15,6 +15,7 @@ from galaxy_exporter.galaxy_exporter import app, update_base_metrics
 from galaxy_exporter.galaxy_exporter import Role, set_role_metrics
 import tests
 from tests import TEST_ROLE, client
+from tests.fake_galaxy import fake_galaxy  # noqa: F401
 
 
 @pytest.mark.asyncio
@@ -84,7 +85,7 @@ def check_role_response(response):
                      response.text.strip('\n'))
 
 
-def test_role_metrics_equal_probe_role_metrics():
+def test_role_metrics_equal_probe_role_metrics(fake_galaxy):  # noqa: F811
     update_base_metrics()
     response1 = client.get(f'/role/{TEST_ROLE}/metrics')
     print(f'Response role metrics text:\n{response1.text}')
@@ -95,13 +96,16 @@ def test_role_metrics_equal_probe_role_metrics():
     check_role_response(response1)
 
 
-def test_role_metrics_api_count_increments():
+def test_role_metrics_api_count_increments(fake_galaxy):  # noqa: F811
     update_base_metrics()
+    # Only Ansible Galaxy calls are counted, ensure the role isn't cached
+    if TEST_ROLE in galaxy_exporter.galaxy_exporter.ROLES:
+        del galaxy_exporter.galaxy_exporter.ROLES[TEST_ROLE]
     count_before = galaxy_exporter.galaxy_exporter.METRICS['api_call_count']._value.get()
     response = client.get(f'/role/{TEST_ROLE}/metrics')
     print(f'Response role metrics text:\n{response.text}')
     assert response.status_code == 200
-    assert len(response.text.split('\n')) == 40
+    assert len(response.text.split('\n')) == 46
     check_role_response(response)
     # Ensure the API count has increased by 1
     assert galaxy_exporter.galaxy_exporter.METRICS['api_call_count']._value.get() - count_before == 1
@@ -116,16 +120,14 @@ def test_role_metrics_from_cache():
     check_role_response(response)
 
 
-def bad_url():
-    return "http://bad.url/role/test"
-
-
 @pytest.mark.asyncio
-async def test_role_bad_url():
+async def test_role_bad_url(fake_galaxy, monkeypatch):  # noqa: F811
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'UPSTREAM_DEADLINE_SECONDS', 0.5)
+    fake_galaxy.error_rate = 1
     role = Role('missing.role')
-    role.url = bad_url
     starttime = time.time()
-    # Ensure using a bad URL returns None
+    # Ensure a failing URL returns None
     assert await role.update() is None
-    # Ensure bad URL is retried for 5 seconds
-    assert time.time() - starttime >= 5
+    # Ensure the failing URL is retried until the deadline
+    assert time.time() - starttime >= 0.5
+    assert fake_galaxy.calls > 1
@@ -1,4 +1,11 @@
+import pytest
+
+
 from tests import TEST_ROLE, client
+from tests.fake_galaxy import fake_galaxy  # noqa: F401
+
+
+pytestmark = pytest.mark.usefixtures('fake_galaxy')
 
 
 def test_role_community_score():
@@ -60,7 +67,8 @@ def test_role_stars():
     response = client.get(f'/role/{TEST_ROLE}/stars')
     assert response.status_code == 200
     assert response.text.isdigit()
-    assert int(response.text) > 20
+    # The fake Galaxy's star count is the length of the project name
+    assert int(response.text) == len('prometheus')
 
 
 def test_role_version():
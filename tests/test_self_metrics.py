@@ -0,0 +1,46 @@
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import update_base_metrics
+from tests import client, fake_fetch
+
+
+def observations(histogram):
+    return sum(bucket.get() for bucket in histogram._buckets)
+
+
+def snapshot():
+    metrics = update_base_metrics()
+    return dict(
+        api_calls=metrics['api_call_count']._value.get(),
+        hits=metrics['cache_hits'].labels(module='role')._value.get(),
+        misses=metrics['cache_misses'].labels(module='role')._value.get(),
+        latency=observations(metrics['upstream_latency']),
+        decode=observations(metrics['decode_seconds']),
+        set_metrics=observations(metrics['set_metrics_seconds']),
+        render=observations(metrics['render_seconds']),
+        response_bytes=metrics['response_bytes']._sum.get(),
+    )
+
+
+def changes(before):
+    after = snapshot()
+    return {key: after[key] - value for key, value in before.items()}
+
+
+def test_self_metrics(monkeypatch):
+    """ Cache misses call Galaxy, cache hits only render cached metrics """
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch())
+    before = snapshot()
+    response = client.get('/probe?module=role&target=self.metrics')
+    assert response.status_code == 200
+    assert changes(before) == dict(api_calls=1, hits=0, misses=1, latency=1, decode=1,
+                                   set_metrics=1, render=1,
+                                   response_bytes=response.num_bytes_downloaded)
+
+    before = snapshot()
+    response = client.get('/probe?module=role&target=self.metrics')
+    assert response.status_code == 200
+    assert changes(before) == dict(api_calls=0, hits=1, misses=0, latency=0, decode=0,
+                                   set_metrics=0, render=1,
+                                   response_bytes=response.num_bytes_downloaded)
+    assert update_base_metrics()['upstream_in_flight']._value.get() == 0
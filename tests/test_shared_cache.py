@@ -0,0 +1,154 @@
+import asyncio
+from datetime import datetime
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+
+from prometheus_client import Gauge
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import Role, SharedCache, get_role, process_metrics
+from galaxy_exporter.galaxy_exporter import refresh_shared, set_gauge_function, shutdown
+from tests import fake_fetch, read_file
+
+
+def test_lease_is_exclusive(tmp_path):
+    """ Only one worker holds the lease of a target until it expires """
+    cache = SharedCache(str(tmp_path / 'shared.db'))
+    connection = cache.connection()
+    # Another worker holds the lease
+    connection.execute("INSERT INTO leases VALUES ('role', 'lease.role', 1, ?)",
+                       (time.time() + 60,))
+    assert cache.acquire('role', 'lease.role', 10) is False
+    # Expired leases are taken over
+    connection.execute("UPDATE leases SET expires = ?", (time.time() - 1,))
+    assert cache.acquire('role', 'lease.role', 10) is True
+    assert cache.acquire('role', 'lease.role', 10) is True
+    cache.release('role', 'lease.role')
+    assert connection.execute('SELECT COUNT(*) FROM leases').fetchone()[0] == 0
+
+
+def test_apply_newer_data(tmp_path):
+    """ Shared data is only applied when it is newer and not expired """
+    cache = SharedCache(str(tmp_path / 'shared.db'))
+    role = Role('apply.role')
+    # Nothing is shared without data
+    cache.store(role)
+    assert cache.lookup('role', 'apply.role') is None
+    role.data = role.decode(read_file('role.json').encode())
+    role.last_update = datetime.now()
+    cache.store(role)
+    row = cache.lookup('role', 'apply.role')
+    assert SharedCache.apply(role, row, 60) is False
+    other = Role('apply.role')
+    assert SharedCache.apply(other, row, -1) is False
+    assert SharedCache.apply(other, None, 60) is False
+    assert SharedCache.apply(other, row, 60) is True
+    assert other.data == role.data
+
+
+@pytest.mark.asyncio
+async def test_workers_share_data(monkeypatch, tmp_path):
+    """ Data fetched by one worker is adopted by the others """
+    calls = []
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'SHARED_CACHE',
+                        SharedCache(str(tmp_path / 'shared.db')))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, delay=0.2))
+    role = await get_role('shared.role')
+    assert calls == ['shared.role']
+
+    # Another worker, with an empty cache, adopts the shared data
+    del galaxy_exporter.galaxy_exporter.ROLES['shared.role']
+    other = await get_role('shared.role')
+    assert other is not role
+    assert calls == ['shared.role']
+    assert other.data == role.data
+    assert other.digest == role.digest
+    assert abs(other.last_update.timestamp() - role.last_update.timestamp()) < 0.001
+
+
+@pytest.mark.asyncio
+async def test_worker_waits_for_lease_holder(monkeypatch, tmp_path):
+    """ Workers wait for the worker holding the lease instead of fetching """
+    calls = []
+    shared = SharedCache(str(tmp_path / 'shared.db'))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'SHARED_CACHE', shared)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, delay=0.2))
+    shared.connection().execute("INSERT INTO leases VALUES ('role', 'wait.role', 1, ?)",
+                                (time.time() + 60,))
+
+    async def other_worker():
+        await asyncio.sleep(0.2)
+        fetched = Role('wait.role')
+        fetched.data = fetched.decode(read_file('role.json').encode())
+        fetched.digest = 'other'
+        fetched.last_update = datetime.now()
+        shared.store(fetched)
+    task = asyncio.ensure_future(other_worker())
+    role = await get_role('wait.role')
+    await task
+    assert calls == []
+    assert role.digest == 'other'
+
+
+def test_multiprocess_metrics(tmp_path):
+    """ Exporter metrics of all worker processes are aggregated """
+    script = ('from fastapi.testclient import TestClient\n'
+              'from galaxy_exporter.galaxy_exporter import app, update_base_metrics\n'
+              'update_base_metrics(increment=True)\n'
+              'print(TestClient(app).get("/metrics").text)\n')
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    outputs = [subprocess.run([sys.executable, '-c', script], env=env, check=True,
+                              capture_output=True, text=True).stdout for _ in range(2)]
+    assert 'ansible_galaxy_exporter_api_call_count_total 1.0' in outputs[0]
+    assert 'ansible_galaxy_exporter_api_call_count_total 2.0' in outputs[1]
+    assert 'ansible_galaxy_exporter_version_info{' in outputs[1]
+    # Configuration isn't summed across workers
+    assert 'ansible_galaxy_exporter_http_pool_limit 20.0' in outputs[1]
+
+
+@pytest.mark.asyncio
+async def test_unavailable_shared_cache(monkeypatch, tmp_path):
+    """ Workers fetch from Galaxy themselves when the shared cache fails """
+    calls = []
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url', fake_fetch(calls))
+    shared = SharedCache(str(tmp_path / 'shared.db'))
+
+    def fail(*args):
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(shared, 'lookup', fail)
+    role = Role('unavailable.role')
+    await refresh_shared(role, shared)
+    assert calls == ['unavailable.role']
+    assert role.data is not None
+
+    # Data that can't be shared is still used by this worker
+    shared = SharedCache(str(tmp_path / 'other.db'))
+    for method in ('store', 'release'):
+        monkeypatch.setattr(shared, method, fail)
+    role = Role('unshared.role')
+    await refresh_shared(role, shared)
+    assert calls == ['unavailable.role', 'unshared.role']
+    assert role.data is not None
+
+
+@pytest.mark.asyncio
+async def test_multiprocess_gauge_functions(monkeypatch, tmp_path):
+    """ Function gauges are stored whenever a worker renders metrics """
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'MULTIPROCESS', True)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'GAUGE_FUNCTIONS', [])
+    gauge = Gauge('test_function_gauge', 'Gauge set from a function', registry=None)
+    set_gauge_function(gauge, lambda: 7)
+    assert gauge._value.get() == 0
+    text = await process_metrics()
+    assert gauge._value.get() == 7
+    assert b'ansible_galaxy_exporter_version_info{' in text
+    await shutdown()
@@ -0,0 +1,36 @@
+import asyncio
+
+
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import get_collection, get_role, update_base_metrics
+from tests import fake_fetch
+
+
+@pytest.mark.asyncio
+async def test_concurrent_role_lookups_are_coalesced(monkeypatch):
+    calls = []
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, delay=0.2))
+    coalesced = update_base_metrics()['coalesced_requests'].labels(module='role')
+    before = coalesced._value.get()
+    roles = await asyncio.gather(*[get_role('singleflight.role') for _ in range(5)])
+    # Only a single upstream call was made, all callers share its result
+    assert calls == ['singleflight.role']
+    assert all(role is roles[0] for role in roles)
+    assert roles[0].metric__stars().isdigit()
+    assert coalesced._value.get() - before == 4
+    assert galaxy_exporter.galaxy_exporter.INFLIGHT == dict()
+
+
+@pytest.mark.asyncio
+async def test_different_targets_are_not_coalesced(monkeypatch):
+    calls = []
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, delay=0.2))
+    await asyncio.gather(get_collection('singleflight.one'),
+                         get_collection('singleflight.two'),
+                         get_collection('singleflight.one'))
+    assert sorted(calls) == ['singleflight.one', 'singleflight.two']
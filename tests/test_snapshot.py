@@ -0,0 +1,187 @@
+import asyncio
+from datetime import datetime
+import json
+import time
+
+
+from fastapi.testclient import TestClient
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import TargetCache, app, get_role, load_snapshot
+from galaxy_exporter.galaxy_exporter import GalaxyData, save_snapshot, shutdown
+from galaxy_exporter.galaxy_exporter import snapshot_instance, snapshot_periodically
+from tests import fake_fetch
+
+
+TARGETS = [f'snapshot.role{index}' for index in range(20)]
+
+
+async def first_scrapes():
+    starttime = time.time()
+    for name in TARGETS:
+        (await get_role(name)).render()
+    return time.time() - starttime
+
+
+@pytest.mark.asyncio
+async def test_startup_with_and_without_snapshot(monkeypatch, tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    calls = []
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url', fake_fetch(calls, delay=0.05))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'ROLES', TargetCache('role'))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'COLLECTIONS', TargetCache('collection'))
+
+    # Without a snapshot every target's first scrape waits for Galaxy
+    cold = await first_scrapes()
+    assert calls == TARGETS
+    # Live metrics like the data age change between scrapes, compare the rest
+    expected = galaxy_exporter.galaxy_exporter.ROLES[TARGETS[0]].exposition
+    assert expected
+    save_snapshot(path)
+    assert len(json.load(open(path))['roles']) == len(TARGETS)
+
+    # Restart with a snapshot, targets are served without calling Galaxy
+    calls.clear()
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'ROLES', TargetCache('role'))
+    starttime = time.time()
+    assert load_snapshot(path) == len(TARGETS)
+    warm = time.time() - starttime + await first_scrapes()
+    print(f'First scrape of {len(TARGETS)} targets: {cold:.3f}s cold, {warm:.3f}s from snapshot')
+    assert calls == []
+    assert warm * 5 < cold
+    assert galaxy_exporter.galaxy_exporter.ROLES[TARGETS[0]].exposition == expected
+
+
+def test_load_missing_snapshot(tmp_path):
+    assert load_snapshot(str(tmp_path / 'missing.json')) == 0
+
+
+RECORD = dict(community_score=None, community_surveys=2, created=1535606991,
+              downloads=1824, forks=6, imported=1593289294, modified=1593468178,
+              open_issues=3, quality_score=None, stars=22, version='0.12.14',
+              versions=68, watchers=3)
+
+
+def test_load_snapshot_wrong_version(monkeypatch, tmp_path):
+    """ Snapshots in another format are ignored """
+    path = str(tmp_path / 'snapshot.json')
+    entry = dict(name='version.role', digest='digest', record=RECORD, last_update=time.time())
+    json.dump(dict(version=2, roles=[entry]), open(path, 'w'))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'ROLES', TargetCache('role'))
+    assert load_snapshot(path) == 0
+    json.dump([entry], open(path, 'w'))
+    assert load_snapshot(path) == 0
+    assert len(galaxy_exporter.galaxy_exporter.ROLES) == 0
+
+
+def test_load_snapshot_skips_invalid_entries(monkeypatch, tmp_path):
+    """ Truncated or malformed entries are skipped, valid ones are loaded """
+    path = str(tmp_path / 'snapshot.json')
+    now = time.time()
+    valid = dict(name='valid.role', digest='digest', record=RECORD, last_update=now)
+    truncated_record = {key: value for key, value in RECORD.items() if key != 'watchers'}
+    entries = [
+        dict(name='truncated.role', record=RECORD, last_update=now),
+        dict(valid, name='short.role', record=truncated_record),
+        dict(valid, name='unknown.role', record=dict(RECORD, unknown=1)),
+        dict(valid, name='string.role', record='record'),
+        dict(valid, name='digest.role', digest=None),
+        dict(valid, name='typo'),
+        dict(valid, name=['list.role']),
+        dict(valid, name='timestamp.role', last_update='yesterday'),
+        dict(valid, name='downloads.role', record=dict(RECORD, downloads='many')),
+        'entry',
+        valid,
+    ]
+    json.dump(dict(version=1, roles=entries, collections=dict()), open(path, 'w'))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'ROLES', TargetCache('role'))
+    assert load_snapshot(path) == 1
+    assert list(galaxy_exporter.galaxy_exporter.ROLES) == ['valid.role']
+    assert galaxy_exporter.galaxy_exporter.ROLES['valid.role'].data.watchers == 3
+
+
+def test_snapshot_spreads_expired_refreshes(monkeypatch, tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    # Snapshot data that is an hour old
+    fetched = time.time() - 3600
+    entries = [dict(name=f'spread.role{index}', digest='digest', record=RECORD,
+                    last_update=fetched) for index in range(50)]
+    json.dump(dict(version=1, roles=entries, collections=[]), open(path, 'w'))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'ROLES', TargetCache('role'))
+    assert load_snapshot(path, cache_seconds=600) == 50
+    roles = list(galaxy_exporter.galaxy_exporter.ROLES.values())
+    # The data keeps its age, only its refreshes are spread out
+    assert all(role.last_update.timestamp() == pytest.approx(fetched) for role in roles)
+    assert all(3600 <= role.data_age() <= 3601 for role in roles)
+    assert not any(role.needs_update(cache_seconds=600) for role in roles)
+    delays = [(role.next_refresh - datetime.now()).total_seconds() for role in roles]
+    assert all(0 <= delay <= 600 for delay in delays)
+    assert len({int(delay) for delay in delays}) > 10
+    roles[0].next_refresh = datetime.now()
+    assert roles[0].needs_update(cache_seconds=600)
+
+
+def test_snapshot_keeps_unexpired_data(monkeypatch, tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    entry = dict(name='fresh.role', digest='digest', record=RECORD, last_update=time.time() - 60)
+    json.dump(dict(version=1, roles=[entry], collections=[]), open(path, 'w'))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'ROLES', TargetCache('role'))
+    assert load_snapshot(path, cache_seconds=600) == 1
+    role = galaxy_exporter.galaxy_exporter.ROLES['fresh.role']
+    assert role.next_refresh is None
+    assert 60 <= role.data_age() <= 61
+    assert not role.needs_update(cache_seconds=600)
+    assert role.needs_update(cache_seconds=30)
+
+
+def test_snapshot_skips_stale_data(monkeypatch, tmp_path):
+    """ Data older than 'MAX_STALENESS_SECONDS' isn't served after a restart """
+    path = str(tmp_path / 'snapshot.json')
+    entries = [dict(name=name, digest='digest', record=RECORD, last_update=time.time() - age)
+               for name, age in (('stale.old', 10 * 86400), ('stale.recent', 3600))]
+    json.dump(dict(version=1, roles=entries, collections=[]), open(path, 'w'))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'ROLES', TargetCache('role'))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'MAX_STALENESS_SECONDS', 86400)
+    assert load_snapshot(path) == 1
+    assert list(galaxy_exporter.galaxy_exporter.ROLES) == ['stale.recent']
+    # Without a staleness limit all data is loaded
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'ROLES', TargetCache('role'))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'MAX_STALENESS_SECONDS', 0)
+    assert load_snapshot(path) == 2
+
+
+def test_snapshot_lifespan(monkeypatch, tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'SNAPSHOT_PATH', path)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url', fake_fetch(delay=0.05))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'ROLES', TargetCache('role'))
+    with TestClient(app) as client:
+        assert 'snapshot' in galaxy_exporter.galaxy_exporter.BACKGROUND_TASKS
+        assert client.get('/probe?module=role&target=lifespan.role').status_code == 200
+    # The snapshot is written on shutdown and loaded on startup
+    assert [entry['name'] for entry in json.load(open(path))['roles']] == ['lifespan.role']
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'ROLES', TargetCache('role'))
+    with TestClient(app):
+        assert 'lifespan.role' in galaxy_exporter.galaxy_exporter.ROLES
+
+
+def test_snapshot_instance_needs_records():
+    entry = dict(name='test.test', digest='x', last_update=time.time(), record=dict())
+    with pytest.raises(TypeError):
+        snapshot_instance(GalaxyData, entry, time.time(), 60)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_write_errors(monkeypatch, tmp_path):
+    """ Snapshots that can't be written are logged instead of stopping the
+    exporter """
+    path = str(tmp_path / 'missing' / 'snapshot.json')
+    task = asyncio.ensure_future(snapshot_periodically(path, 0))
+    await asyncio.sleep(0.05)
+    assert not task.done()
+    task.cancel()
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'SNAPSHOT_PATH', path)
+    await shutdown()
+    assert not (tmp_path / 'missing').exists()
@@ -0,0 +1,48 @@
+import asyncio
+from datetime import datetime, timedelta
+import time
+
+
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import get_role
+from tests import fake_fetch
+
+
+@pytest.mark.asyncio
+async def test_stale_data_served_while_revalidating(monkeypatch):
+    calls = []
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'STALE_WHILE_REVALIDATE', True)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(calls, delay=0.2))
+    # First-ever lookups wait for Galaxy
+    role = await get_role('stale.role')
+    assert calls == ['stale.role']
+    assert role.needs_update() is False
+
+    # Expired data is returned immediately and refreshed in the background
+    role.last_update = datetime.now() - timedelta(seconds=3600)
+    starttime = time.time()
+    assert await get_role('stale.role') is role
+    assert time.time() - starttime < 0.2
+    assert role.data_age() >= 3600
+    task = galaxy_exporter.galaxy_exporter.INFLIGHT[('role', 'stale.role')]
+    # Further scrapes join the in-flight background refresh
+    await get_role('stale.role')
+    await task
+    assert calls == ['stale.role', 'stale.role']
+    assert role.data_age() < 60
+
+
+@pytest.mark.asyncio
+async def test_data_age_metric(monkeypatch):
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'STALE_WHILE_REVALIDATE', True)
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch(delay=0.2))
+    role = await get_role('age.role')
+    role.last_update = datetime.now() - timedelta(seconds=120)
+    text = role.render().decode()
+    assert 'ansible_galaxy_role_data_age_seconds{category="role",maintainer="age",' \
+        'project="role"} 120.' in text
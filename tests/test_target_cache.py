@@ -0,0 +1,51 @@
+import pytest
+
+
+import galaxy_exporter.galaxy_exporter
+from galaxy_exporter.galaxy_exporter import Role, TargetCache, count_eviction, get_role
+from galaxy_exporter.galaxy_exporter import update_base_metrics
+from tests import fake_fetch, read_file
+
+
+def evictions(reason):
+    return update_base_metrics()['cache_evictions'].labels(module='role', reason=reason)._value.get()
+
+
+def test_target_cache_lru_eviction():
+    before = evictions('lru')
+    cache = TargetCache('role', max_entries=2, idle_seconds=0, on_evict=count_eviction)
+    cache['test.one'] = Role('test.one')
+    cache['test.two'] = Role('test.two')
+    # Requesting 'test.one' makes 'test.two' the least recently used entry
+    assert cache.get('test.one').name == 'test.one'
+    cache['test.three'] = Role('test.three')
+    assert len(cache) == 2
+    assert 'test.two' not in cache
+    assert list(cache) == ['test.one', 'test.three']
+    assert evictions('lru') - before == 1
+
+
+def test_target_cache_idle_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter.time, 'monotonic', lambda: now[0])
+    before = evictions('idle')
+    cache = TargetCache('role', max_entries=0, idle_seconds=60, on_evict=count_eviction)
+    cache['test.one'] = Role('test.one')
+    now[0] += 30
+    cache['test.two'] = Role('test.two')
+    now[0] += 45
+    # 'test.one' has been idle for 75 seconds, 'test.two' for 45 seconds
+    assert cache.get('test.three') is None
+    assert list(cache) == ['test.two']
+    assert evictions('idle') - before == 1
+
+
+@pytest.mark.asyncio
+async def test_target_cache_retained_bytes(monkeypatch):
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'ROLES', TargetCache('role'))
+    monkeypatch.setattr(galaxy_exporter.galaxy_exporter, 'fetch_from_url',
+                        fake_fetch())
+    assert galaxy_exporter.galaxy_exporter.ROLES.retained_bytes() == 0
+    role = await get_role('retained.role')
+    assert 0 < role.data_size < len(read_file('role.json'))
+    assert galaxy_exporter.galaxy_exporter.ROLES.retained_bytes() == role.data_size
@@ -0,0 +1,44 @@
+import json
+import timeit
+
+
+from dateutil.parser import parse as dateparse
+
+
+from galaxy_exporter.galaxy_exporter import Role, parse_epoch
+from tests import read_file
+
+
+def test_parse_epoch():
+    assert parse_epoch('2020-06-27T20:21:34.467988Z') == 1593289294
+    # Timezone offsets are applied
+    assert parse_epoch('2020-06-27T16:21:34.467988-04:00') == 1593289294
+    # Timestamps without a timezone are UTC
+    assert parse_epoch('2020-06-27T20:21:34') == 1593289294
+    # Non ISO-8601 timestamps fall back to dateutil
+    assert parse_epoch('Sat, 27 Jun 2020 20:21:34 GMT') == 1593289294
+
+
+def test_timestamp_microbenchmark():
+    repository = json.loads(read_file('role.json'))['data']['repository']
+    role = Role('mesaguy.prometheus')
+    role.data = repository
+    timestamps = (repository['created'], repository['modified'],
+                  repository['summary_fields']['latest_import']['finished'])
+
+    def parse_every_scrape():
+        # Timestamp handling before timestamps were parsed at ingest
+        return [str(dateparse(timestamp).strftime('%s')) for timestamp in timestamps]
+
+    def precomputed():
+        return [role.metric__created(), role.metric__modified(), role.metric__imported()]
+
+    number = 2000
+    before = min(timeit.repeat(parse_every_scrape, number=number, repeat=3)) / number
+    after = min(timeit.repeat(precomputed, number=number, repeat=3)) / number
+    ingest = min(timeit.repeat(lambda: [parse_epoch(timestamp) for timestamp in timestamps],
+                               number=number, repeat=3)) / number
+    print(f'Per scrape: {before * 1e6:.1f}us parsing, {after * 1e6:.1f}us precomputed; '
+          f'{ingest * 1e6:.1f}us once at ingest')
+    assert after * 10 < before
+    assert ingest * 5 < before